@@ -0,0 +1,184 @@
+import numpy as np
+
+from .rng import generators
+
+class Welford:
+    '''
+    Streaming mean and variance of a sequence of values (or of arrays of
+    values, element-wise), using Welford's algorithm.
+    '''
+    def __init__(self, shape=()):
+        self.n = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def update(self, x):
+        '''
+        Add the value `x` to the sequence.
+        '''
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def var(self):
+        '''
+        The sample variance of the values seen so far (nan for less than
+        two values).
+        '''
+        if (self.n < 2):
+            return np.full(self.mean.shape, np.nan)
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+class Aggregates:
+    '''
+    Monthly macro aggregates of a set of firms, computed from the firm
+    arrays as the simulation runs, so a run does not need to record the full
+    firm state:
+
+    - price_index:  the demand-weighted mean price, sum(p * d) / sum(d)
+    - mean_wage:    the mean wage
+    - employment:   the total workforce, sum(l)
+    - vacancy_rate: the open vacancies per job, sum(v) / (sum(l) + sum(v))
+    - price_std:    the standard deviation of prices across firms
+    - wage_std:     the standard deviation of wages across firms
+
+    Each series is stored per month (shape `(T,)`, or `(T, R)` with
+    replicates) and summarized over the months with streaming moments
+    (see `Welford`).  Quantiles of the price and wage distributions are
+    estimated each month from a random sample of `sample` firms, or
+    computed exactly over all firms if `exact` is `True`.
+
+    All other aggregates are accumulated in one pass over the firm arrays,
+    `chunk` firms at a time, into a chunk-sized work buffer, so recording
+    a month allocates no firm-sized arrays.  The slots of removed firms
+    (see `Firms.remove_firms`) are masked out of the reductions.
+
+    An `Aggregates` can be passed to `Economy.run` in place of a
+    `Recorder`.
+    '''
+    SERIES = ("price_index", "mean_wage", "employment", "vacancy_rate", "price_std", "wage_std")
+
+    # properties whose distribution is tracked with quantiles
+    DISTRIBUTIONS = ("p", "w")
+
+    def __init__(self, firms, T, quantiles=(0.1, 0.5, 0.9), sample=1024, exact=False, seed=None,
+                 chunk=2**14):
+        '''
+        Args:
+            firms (Firms): The firms to aggregate
+            T (int): The number of months that will be recorded
+            quantiles (optional): The quantiles of the price and wage
+                 distributions to track (none if empty)
+            sample (int, optional): The number of firms sampled each month
+                 to estimate the quantiles
+            exact (bool, optional): If `True` the quantiles are computed
+                 over all firms
+            seed (optional): Seed for the sampled firms
+            chunk (int, optional): The number of firms reduced at a time
+        '''
+        self.T = T
+        self.q = np.asarray(quantiles, dtype=np.float64)
+        self.sample = sample
+        self.exact = exact
+        self.rng = generators(seed)[0]
+        self.chunk = chunk
+        # work buffer of one chunk (see `record`)
+        self._buffer = np.empty(firms.shape[:-1] + (min(chunk, max(firms.shape[-1], 1)),))
+
+        # number of months recorded
+        self.month = 0
+        R = firms.shape[:-1]
+        self.series = {name: np.full((T,) + R, np.nan) for name in self.SERIES}
+        self.moments = {name: Welford(R) for name in self.SERIES}
+        self.quantiles = {}
+        if (len(self.q) > 0):
+            self.quantiles = {name: np.full((T,) + R + self.q.shape, np.nan) for name in self.DISTRIBUTIONS}
+
+    def record(self, firms):
+        '''
+        Compute the aggregates of the current state of `firms` (call once
+        per month).
+        '''
+        if (self.month >= self.T):
+            raise ValueError(f"Can not record more than {self.T} months")
+        t = self.month
+
+        p, w, d, l, v = (getattr(firms, name) for name in ("p", "w", "d", "l", "v"))
+        F = p.shape[-1]
+        # leave out the slots of removed firms (see `Firms.remove_firms`)
+        alive = None if firms.alive.all() else firms.alive
+        n = F if (alive is None) else np.count_nonzero(alive)
+
+        # the moments of prices and wages are accumulated over the values
+        # shifted by those of the first firm, which avoids the cancellation
+        # of the sum-of-squares formula
+        first = 0 if (alive is None) else int(np.argmax(alive))
+        shift = {"p": p[..., first].astype(np.float64), "w": w[..., first].astype(np.float64)} if n else {}
+
+        R = p.shape[:-1]
+        sums = {name: np.zeros(R) for name in ("d", "pd", "l", "v", "p1", "p2", "w1", "w2")}
+        if (self._buffer.shape[:-1] != R) or (self._buffer.shape[-1] < min(self.chunk, F)):
+            self._buffer = np.empty(R + (min(self.chunk, F),))
+        def add(name, values):
+            sums[name] += np.sum(values, axis=-1, dtype=np.float64, where=where)
+        for a in range(0, F if n else 0, self.chunk):
+            b = min(a + self.chunk, F)
+            where = True if (alive is None) else alive[a:b]
+            x = self._buffer[..., :b - a]
+            add("d", d[..., a:b])
+            add("l", l[..., a:b])
+            add("pd", np.multiply(p[..., a:b], d[..., a:b], out=x))
+            add("v", np.maximum(v[..., a:b], 0, out=x))
+            for name, values in (("p", p), ("w", w)):
+                np.subtract(values[..., a:b], shift[name][..., None], out=x)
+                add(name + "1", x)
+                add(name + "2", np.multiply(x, x, out=x))
+        p_mean, p_var = _moments(sums["p1"], sums["p2"], n, shift.get("p"))
+        w_mean, w_var = _moments(sums["w1"], sums["w2"], n, shift.get("w"))
+        l, v = sums["l"], sums["v"]
+
+        values = {
+            "price_index": _ratio(sums["pd"], sums["d"], p_mean),
+            "mean_wage": w_mean,
+            "employment": l,
+            "vacancy_rate": _ratio(v, l + v, 0.0),
+            "price_std": np.sqrt(p_var),
+            "wage_std": np.sqrt(w_var),
+        }
+        for name, value in values.items():
+            self.series[name][t] = value
+            self.moments[name].update(value)
+
+        if self.quantiles and n:
+            firms_ = slice(None) if (alive is None) else np.flatnonzero(alive)
+            if not self.exact and (n > self.sample):
+                chosen = np.sort(self.rng.choice(n, self.sample, replace=False))
+                firms_ = chosen if (alive is None) else firms_[chosen]
+            for name, out in self.quantiles.items():
+                x = getattr(firms, name)[..., firms_]
+                out[t] = np.moveaxis(np.quantile(x, self.q, axis=-1), 0, -1)
+
+        self.month += 1
+
+def _ratio(x, y, default):
+    '''
+    Return `x / y`, or `default` where `y` is zero.
+    '''
+    return np.where(y > 0, x / np.where(y > 0, y, 1), default)
+
+def _moments(s1, s2, n, shift):
+    '''
+    Return the mean and (population) variance of `n` values from the sums
+    `s1` and `s2` of the values shifted by `shift` and of their squares.
+    Both are nan if there are no values.
+    '''
+    if (n == 0):
+        return np.full(s1.shape, np.nan), np.full(s1.shape, np.nan)
+    mean = s1 / n
+    return shift + mean, np.maximum(s2 / n - mean * mean, 0)
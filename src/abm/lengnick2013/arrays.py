@@ -0,0 +1,37 @@
+import numpy as np
+
+def group_rank(keys):
+    '''
+    Return the position of each element within its run of equal keys.
+
+    Args:
+        keys (numpy.ndarray): A 1-dimensional array of sorted keys
+
+    Returns:
+        numpy.ndarray: For each element, the number of preceding elements
+            with the same key, e.g. [3, 3, 5, 7, 7, 7] -> [0, 1, 0, 0, 1, 2]
+    '''
+    n = len(keys)
+    idx = np.arange(n)
+    if (n == 0):
+        return idx
+    start = np.empty(n, dtype=bool)
+    start[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=start[1:])
+    # index of the first element of each run
+    first = np.maximum.accumulate(np.where(start, idx, 0))
+    return idx - first
+
+def shuffled_order(keys, rng):
+    '''
+    Return an ordering of `keys` that sorts them, with ties in random order.
+
+    Args:
+        keys (numpy.ndarray): A 1-dimensional array of keys
+        rng (numpy.random.Generator): The generator used to break ties
+
+    Returns:
+        numpy.ndarray: Indices that sort `keys`
+    '''
+    perm = rng.permutation(len(keys))
+    return perm[np.argsort(keys[perm], kind="stable")]
@@ -0,0 +1,223 @@
+'''
+Benchmarks of the firm updates.
+
+Times the monthly updates of `Firms` (and the property setters) for a range
+of firm counts and reports, for each case and size:
+
+- seconds:         median time of one call
+- updates_per_sec: firms updated per second
+- peak_bytes:      peak memory allocated during one call (`tracemalloc`)
+- net_bytes:       memory allocated by one call and still held after it
+
+Results can be saved as JSON baselines and compared against them to flag
+regressions.  Run from the command line:
+
+    python -m abm.lengnick2013.benchmark --sizes 100 10000 1000000 \\
+        --save baseline.json
+    python -m abm.lengnick2013.benchmark --sizes 100 10000 1000000 \\
+        --baseline baseline.json
+'''
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from . import firms as firms_module
+from .firms import Firms
+
+# the benchmarked calls
+CASES = {
+    "adjust_wages": lambda f, values: f.adjust_wages(),
+    "adjust_workforce": lambda f, values: f.adjust_workforce(),
+    "adjust_prices": lambda f, values: f.adjust_prices(),
+    "step_month": lambda f, values: f.step_month(),
+    "produce": lambda f, values: f.produce(),
+    "set_prop": lambda f, values: f.set_prop("p", values["p"]),
+    "set_props": lambda f, values: f.set_props(values),
+}
+
+# firm configurations (arguments of `Firms`)
+CONFIGS = {
+    "default": {},
+    "inplace": {"inplace": True},
+    "compact": {"inplace": True, "dtypes": "compact"},
+    "chunked": {"chunk": 2**14},
+    "active": {"inplace": True, "active": 0.25},
+}
+
+# firm counts from 10^2 to 10^7
+SIZES = [10**k for k in range(2, 8)]
+
+def setup(F, config="default", seed=0):
+    '''
+    Return firms in a random state (every branch of the updates is taken)
+    and a dict of new property values for the setters.
+    '''
+    f = Firms(F, seed=seed, **CONFIGS[config])
+    rng = np.random.default_rng(seed)
+    d = rng.uniform(1, 10, F)
+    f.set_props({"d": d, "i": d * rng.uniform(0, 1.5, F),
+                 "w": rng.uniform(0.5, 1.5, F), "p": rng.uniform(0.5, 1.5, F),
+                 "l": rng.integers(0, 3, F)})
+    values = {"p": rng.uniform(0.5, 1.5, F), "w": rng.uniform(0.5, 1.5, F)}
+    return f, values
+
+def measure(case, F, config="default", min_time=0.2, repeat=None):
+    '''
+    Benchmark one case.
+
+    Args:
+        case (str): The name of the case (see `CASES`)
+        F (int): The number of firms
+        config (str, optional): The firm configuration (see `CONFIGS`)
+        min_time (float, optional): The minimum total time of the timed calls
+        repeat (int, optional): The number of timed calls (chosen from
+             `min_time` if `None`)
+
+    Returns:
+        dict: The measurements (see the module documentation)
+    '''
+    call = CASES[case]
+    f, values = setup(F, config)
+    previous = firms_module.set_checked(False)
+    try:
+        # warm up - scratch buffers are allocated by the first call
+        start = time.perf_counter()
+        call(f, values)
+        first = time.perf_counter() - start
+
+        # memory of one call
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        call(f, values)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if repeat is None:
+            repeat = int(min(max(min_time / max(first, 1e-9), 3), 10000))
+        times = np.empty(repeat)
+        for k in range(repeat):
+            start = time.perf_counter()
+            call(f, values)
+            times[k] = time.perf_counter() - start
+    finally:
+        firms_module.set_checked(previous)
+
+    seconds = float(np.median(times))
+    return {"case": case, "config": config, "F": F, "seconds": seconds,
+            "updates_per_sec": F / seconds if (seconds > 0) else float("inf"),
+            "peak_bytes": peak - before, "net_bytes": current - before,
+            "repeat": repeat}
+
+def run(sizes=SIZES, cases=None, configs=("default",), min_time=0.2, out=None):
+    '''
+    Benchmark every case for every size and configuration.
+
+    Args:
+        out (file, optional): Stream the results are printed to as they are
+             measured
+
+    Returns:
+        dict: The results, with the versions and platform they were
+              measured on (see `save`)
+    '''
+    results = []
+    for config in configs:
+        for case in (CASES if (cases is None) else cases):
+            for F in sizes:
+                result = measure(case, F, config, min_time)
+                results.append(result)
+                if out is not None:
+                    print(format_result(result), file=out, flush=True)
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__,
+                     "machine": platform.machine(), "platform": platform.platform(),
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+def save(path, results):
+    '''
+    Write benchmark results (see `run`) to a JSON file.
+    '''
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=1)
+
+def load(path):
+    '''
+    Read benchmark results written by `save`.
+    '''
+    with open(path) as fh:
+        return json.load(fh)
+
+def compare(results, baseline, tolerance=0.2, slack=4096):
+    '''
+    Compare benchmark results with a baseline.
+
+    Args:
+        results (dict): The results (see `run`)
+        baseline (dict): The baseline results
+        tolerance (float, optional):
+             The relative increase of the time or of the peak memory of a
+             case that is flagged as a regression
+        slack (int, optional):
+             Increases of the peak memory of up to `slack` bytes are never
+             flagged
+
+    Returns:
+        list: A dict for each regression, with the case, configuration
+              and size, the measure ("seconds" or "peak_bytes"), its
+              baseline and current values and their ratio
+    '''
+    key = lambda r: (r["case"], r["config"], r["F"])
+    reference = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in results["results"]:
+        base = reference.get(key(r))
+        if base is None:
+            continue
+        checks = (("seconds", base["seconds"] * (1 + tolerance)),
+                  ("peak_bytes", base["peak_bytes"] * (1 + tolerance) + slack))
+        for measure_, limit in checks:
+            if (r[measure_] > limit):
+                regressions.append({"case": r["case"], "config": r["config"], "F": r["F"],
+                                    "measure": measure_, "baseline": base[measure_],
+                                    "current": r[measure_],
+                                    "ratio": r[measure_] / base[measure_] if base[measure_] else float("inf")})
+    return regressions
+
+def format_result(r):
+    # one line of the results table
+    return (f"{r['config']:>8} {r['case']:>16} F={r['F']:>9}  {r['seconds'] * 1e3:10.3f} ms"
+            f"  {r['updates_per_sec']:10.3e} updates/s"
+            f"  peak {r['peak_bytes'] / 2**20:9.2f} MiB  net {r['net_bytes'] / 2**20:8.2f} MiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the firm updates.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of firms")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="cases to run (all by default)")
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=["default"],
+                        help="firm configurations")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum timed seconds per case")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="flag regressions against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative regression threshold")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.cases, args.configs, args.min_time, out=sys.stdout)
+    if args.save:
+        save(args.save, results)
+    if args.baseline:
+        regressions = compare(results, load(args.baseline), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['config']} {r['case']} F={r['F']}: {r['measure']} "
+                  f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
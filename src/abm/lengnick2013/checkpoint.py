@@ -0,0 +1,131 @@
+'''
+Checkpoints: flat dicts of named arrays written either to an uncompressed
+`.npz` file or to a directory of `.npy` files (`<path>/<name>.npy`).
+
+Restoring a checkpoint memory-maps the arrays (copy-on-write) instead of
+reading them, so the time to restore is the time to touch the pages that
+are used.  Non-array values (sizes, scalar parameters, generator states)
+are stored as JSON in 0-d string arrays (see `encode`).
+'''
+
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+def save(path, arrays):
+    '''
+    Write the arrays to an uncompressed `.npz` file (if `path` ends with
+    ".npz") or to a directory of `.npy` files.
+
+    Args:
+        path (str): The file or directory to write
+        arrays (dict): Maps names to arrays
+    '''
+    if str(path).endswith(".npz"):
+        _save_npz(path, arrays)
+        return
+    os.makedirs(path, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(path, name + ".npy"), arr)
+
+def load(path, mmap=True):
+    '''
+    Read the arrays written by `save`.
+
+    Args:
+        path (str): The file or directory to read
+        mmap (bool, optional):
+             If `True` (the default) the arrays are copy-on-write memory
+             maps of the checkpoint: they can be modified without changing
+             the checkpoint.  If `False` the arrays are read into memory.
+
+    Returns:
+        dict: Maps names to arrays
+    '''
+    if str(path).endswith(".npz"):
+        if not mmap:
+            with np.load(path) as z:
+                return {name: z[name] for name in z.files}
+        return _map_npz(path)
+    arrays = {}
+    for f in sorted(os.listdir(path)):
+        if f.endswith(".npy"):
+            file = os.path.join(path, f)
+            if mmap:
+                with open(file, "rb") as fh:
+                    arrays[f[:-4]] = _map(file, fh)
+            else:
+                arrays[f[:-4]] = np.load(file)
+    return arrays
+
+def encode(value):
+    '''
+    Return a 0-d string array holding the JSON encoding of `value`.
+    '''
+    return np.array(json.dumps(value))
+
+def decode(arr):
+    '''
+    Return the value encoded by `encode`.
+    '''
+    return json.loads(str(arr[()]))
+
+def prefixed(arrays, prefix):
+    '''
+    Return the arrays whose name starts with `prefix`, without the prefix.
+    '''
+    return {name[len(prefix):]: arr for name, arr in arrays.items() if name.startswith(prefix)}
+
+# alignment of the array data in the .npz members
+_ALIGN = 64
+
+def _save_npz(path, arrays):
+    # write an uncompressed .npz file in which the data of each member
+    # starts at an aligned offset, so that it can be memory-mapped (the
+    # .npy header is padded to a multiple of 64 bytes, and the member is
+    # aligned with padding in the extra field of its local file header)
+    with open(path, "wb") as fh, zipfile.ZipFile(fh, "w", zipfile.ZIP_STORED) as zf:
+        for name, arr in arrays.items():
+            info = zipfile.ZipInfo(name + ".npy")
+            zip64 = (arr.nbytes + 2**16 > zipfile.ZIP64_LIMIT)
+            header = 30 + len(info.filename.encode()) + (20 if zip64 else 0) + 4
+            pad = -(fh.tell() + header) % _ALIGN
+            info.extra = struct.pack("<HH", 0xA11, pad) + bytes(pad)
+            with zf.open(info, "w", force_zip64=zip64) as member:
+                np.lib.format.write_array(member, np.asanyarray(arr), allow_pickle=False)
+
+def _map_npz(path):
+    # memory-map the members of an uncompressed .npz file
+    arrays = {}
+    with zipfile.ZipFile(path) as z, open(path, "rb") as fh:
+        for info in z.infolist():
+            if (info.compress_type != zipfile.ZIP_STORED):
+                raise ValueError(f"Can not memory-map compressed member '{info.filename}' of {path}")
+            # skip the local file header (30 bytes, the file name and the
+            # extra field) to the start of the .npy data
+            fh.seek(info.header_offset + 26)
+            n, m = struct.unpack("<HH", fh.read(4))
+            fh.seek(info.header_offset + 30 + n + m)
+            arrays[info.filename[:-4]] = _map(path, fh)
+    return arrays
+
+def _map(path, fh):
+    # memory-map the .npy array at the current position of `fh`
+    version = np.lib.format.read_magic(fh)
+    if (version == (1, 0)):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+    if dtype.hasobject:
+        raise ValueError(f"Can not restore an array of Python objects from {path}")
+    n = int(np.prod(shape))
+    if (n == 0) or (len(shape) == 0) or (fh.tell() % dtype.alignment != 0):
+        # nothing to map (or a misaligned member of a .npz file that was
+        # not written by `save`)
+        data = np.frombuffer(fh.read(n * dtype.itemsize), dtype=dtype)
+        return data.reshape(shape).copy()
+    order = "F" if fortran else "C"
+    return np.memmap(path, dtype=dtype, mode="c", offset=fh.tell(), shape=shape, order=order)
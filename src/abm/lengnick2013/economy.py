@@ -0,0 +1,285 @@
+import numpy as np
+
+from . import checkpoint
+from . import profiling
+from .firms import Firms
+from .goods import GoodsMarket
+from .households import Households
+from .labor import LaborMarket
+
+class Snapshot:
+    '''
+    The state of an economy after a number of months.
+
+    Attributes:
+        month (int): The number of months simulated
+        fields (dict):
+             Maps the field names to arrays: read-only views of the state
+             of the economy, or copies (see `Economy.snapshot`)
+    '''
+    __slots__ = ("month", "fields")
+
+    def __init__(self, month, fields):
+        self.month = month
+        self.fields = fields
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+class Economy:
+    '''
+    The economy of [Lengnick 2013]: firms, households and the labor and
+    goods markets, run on the monthly schedule of the model:
+
+    - firms adjust wages, vacancies and prices (`Firms.step_month`)
+    - the labor market matches households to vacancies (`LaborMarket`)
+    - firms produce and households buy on 21 trading days (`GoodsMarket`)
+    - firms pay wages and distribute profits (`pay`)
+    - households laid off with notice leave their firms
+      (`LaborMarket.separate`)
+    '''
+    # fields of a snapshot if none are requested - names without a prefix
+    # are firm properties, "households.<name>" are household properties
+    FIELDS = ("p", "w", "l", "i", "m", "d", "v")
+
+    def __init__(self, firms, households, seed=None, network=None):
+        '''
+        Args:
+            firms (Firms): The firms (without replicates)
+            households (Households): The households
+            seed (optional):
+                 Seed for the random draws of the markets (the firms draw
+                 from their own stream)
+            network (TradingNetwork, optional):
+                 The household-firm trading links (see `GoodsMarket`)
+        '''
+        self.firms = firms
+        self.households = households
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        seeds = seed.spawn(2)
+        self.labor = LaborMarket(firms, households, seeds[0])
+        self.goods = GoodsMarket(firms, households, network, seeds[1])
+
+        # share of the monthly wage bill firms keep as a buffer (chi)
+        self.buffer = 0.1 # [Lengnick 2013] sets this to 0.1
+
+        # number of months simulated
+        self.month = 0
+
+        # the workforce of each firm are the households it employs
+        self.labor.sync()
+
+    @classmethod
+    def create(cls, F, H, seed=None, params=None, liquidity=10.0, **options):
+        '''
+        Create an economy of `F` firms and `H` households in which every
+        household is employed (household `h` by firm `h % F`) and holds
+        `liquidity`.
+
+        Args:
+            F (int): The number of firms
+            H (int): The number of households
+            seed (optional):
+                 Seed for all random draws (an int or a
+                 `numpy.random.SeedSequence`); the firms and the markets
+                 draw from streams spawned from it
+            params (dict, optional):
+                 Firm parameters (see `Firms.set_props`)
+            liquidity (float, optional): The initial household liquidity
+            options: Further arguments for `Firms` (e.g. `inplace`)
+        '''
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        seeds = seed.spawn(2)
+        firms = Firms(F, seed=seeds[0], **options)
+        if params:
+            firms.set_props(params)
+        households = Households(H)
+        households.employer = np.arange(H) % F
+        households.m = np.full(H, float(liquidity))
+        return cls(firms, households, seeds[1])
+
+    def step(self):
+        '''
+        Run the economy for one month.
+        '''
+        with profiling.phase("economy.firms"):
+            self.firms.step_month()
+        with profiling.phase("economy.labor"):
+            self.labor.step()
+        with profiling.phase("economy.goods"):
+            self.goods.step_month()
+        with profiling.phase("economy.pay"):
+            self.pay()
+        with profiling.phase("economy.separations"):
+            self.labor.separate()
+        self.month += 1
+
+    def run(self, T, recorder=None):
+        '''
+        Run the economy for `T` months.
+
+        Args:
+            T (int): The number of months to run
+            recorder (Recorder, optional):
+                 Records the state of the firms at the end of every month
+
+        Returns:
+            Economy: This economy
+        '''
+        for t in range(T):
+            self.step()
+            if recorder is not None:
+                recorder.record(self.firms)
+        return self
+
+    def run_iter(self, T, every=1, fields=None, copy=False):
+        '''
+        Run the economy for `T` months, yielding a snapshot of its state
+        after every `every` months.
+
+        The run advances only as the snapshots are consumed, so a caller
+        can stop it early by no longer iterating.
+
+        Args:
+            T (int): The number of months to run
+            every (int, optional): The number of months between snapshots
+            fields (optional): The fields of the snapshots (see `snapshot`)
+            copy (bool, optional): If `True` the snapshots hold copies
+
+        Yields:
+            Snapshot
+        '''
+        if (every < 1):
+            raise ValueError(f"'every' must be at least 1, not {every}")
+        for t in range(T):
+            self.step()
+            if ((t + 1) % every == 0):
+                yield self.snapshot(fields, copy)
+
+    def snapshot(self, fields=None, copy=False):
+        '''
+        Return a snapshot of the current state.
+
+        Args:
+            fields (optional):
+                 The names of the fields to include (`Economy.FIELDS` if
+                 `None`): firm properties ("p") or household properties
+                 ("households.m").
+            copy (bool, optional):
+                 If `False` (the default) the snapshot holds read-only views
+                 of the state arrays, which are only valid until the economy
+                 is run again (the views follow in-place updates).  If
+                 `True` the snapshot holds copies.
+
+        Returns:
+            Snapshot
+        '''
+        arrays = {}
+        for name in (self.FIELDS if (fields is None) else fields):
+            owner, prop = name.split(".", 1) if ("." in name) else ("firms", name)
+            if owner not in ("firms", "households"):
+                raise ValueError(f"Unknown field '{name}'")
+            arr = getattr(getattr(self, owner), prop)
+            if copy:
+                arr = arr.copy()
+            else:
+                arr = arr.view()
+                arr.flags.writeable = False
+            arrays[name] = arr
+        return Snapshot(self.month, arrays)
+
+    def add_firms(self, n, **props):
+        '''
+        Add `n` firms to the economy (see `Firms.add_firms`).  The new firms
+        start without employees or trading links.
+
+        Returns:
+            numpy.ndarray: The ids of the new firms
+        '''
+        ids = self.firms.add_firms(n, **props)
+        self.labor.add_firms(ids)
+        self.goods.add_firms(ids)
+        return ids
+
+    def remove_firms(self, ids):
+        '''
+        Remove firms from the economy (see `Firms.remove_firms`): their
+        employees are laid off at once and the trading links of households
+        to them are replaced by links to other firms.
+
+        Returns:
+            numpy.ndarray: The ids of the removed firms
+        '''
+        ids = self.firms.remove_firms(ids)
+        self.labor.remove_firms(ids)
+        self.goods.remove_firms(ids)
+        return ids
+
+    def save(self, path):
+        '''
+        Write a checkpoint of the economy (all agents, both markets and
+        every generator) to an uncompressed `.npz` file (if `path` ends
+        with ".npz") or to a directory of `.npy` files.  A run resumed from
+        the checkpoint (see `load`) is identical to an uninterrupted run.
+        '''
+        arrays = {"meta": checkpoint.encode({"month": self.month, "buffer": self.buffer})}
+        for part in ("firms", "households", "labor", "goods"):
+            for name, arr in getattr(self, part).state().items():
+                arrays[f"{part}.{name}"] = arr
+        checkpoint.save(path, arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        '''
+        Return an economy restored from a checkpoint written by `save`.
+
+        Args:
+            path (str): The checkpoint file or directory
+            mmap (bool, optional):
+                 If `True` (the default) the arrays are copy-on-write memory
+                 maps of the checkpoint, read on first use
+        '''
+        arrays = checkpoint.load(path, mmap)
+        economy = cls.__new__(cls)
+        economy.firms = Firms.from_state(checkpoint.prefixed(arrays, "firms."))
+        economy.households = Households.from_state(checkpoint.prefixed(arrays, "households."))
+        economy.labor = LaborMarket.from_state(checkpoint.prefixed(arrays, "labor."),
+                                               economy.firms, economy.households)
+        economy.goods = GoodsMarket.from_state(checkpoint.prefixed(arrays, "goods."),
+                                               economy.firms, economy.households)
+        for name, value in checkpoint.decode(arrays["meta"]).items():
+            setattr(economy, name, value)
+        return economy
+
+    def pay(self):
+        '''
+        See section 2.2 of [Lengnick 2013] for details:
+
+        - Each firm pays its employees its wage (scaled down if the firm
+          can not afford the whole wage bill)
+        - Each firm keeps a buffer of `buffer` times its wage bill and
+          distributes the rest of its liquidity to the households, in
+          proportion to their liquidity
+        '''
+        f, h = self.firms, self.households
+
+        employed = np.flatnonzero(h.employer >= 0)
+        employer = h.employer[employed]
+
+        # wages
+        bill = f.w * f.l
+        paid = np.ones(f.F)
+        np.divide(np.maximum(f.m, 0), bill, out=paid, where=(bill > f.m))
+        h.m[employed] += (f.w * paid)[employer]
+        f.m -= bill * paid
+
+        # profits
+        profit = np.maximum(f.m - self.buffer * bill, 0)
+        total = profit.sum()
+        wealth = np.maximum(h.m, 0)
+        if (total > 0) and (wealth.sum() > 0):
+            f.m -= profit
+            h.m += total * (wealth / wealth.sum())
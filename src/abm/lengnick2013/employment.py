@@ -0,0 +1,161 @@
+import numpy as np
+
+from .arrays import group_rank
+
+class Employment:
+    '''
+    The employees of each firm, indexed for O(1) hiring and firing.
+
+    The employees of firm `f` are `members[start[f]:start[f] + count[f]]`
+    (in no particular order) and `position[h]` is the index of household `h`
+    in `members` (-1 if it is not employed).  The segment of each firm has
+    room for `capacity[f]` employees: a hire is appended to the segment of
+    its firm, and a separation moves the last employee of the segment into
+    the gap, so both take constant time per household and are vectorized
+    over households.  When a segment runs out of room all segments are laid
+    out again with twice the room they need, so the index is never sorted
+    again after it is built.
+    '''
+    # arrays of the index (see `state`)
+    _ARRAYS = ("firm", "count", "position", "start", "capacity", "members")
+
+    def __init__(self, employer, F):
+        '''
+        Args:
+            employer (numpy.ndarray):
+                 The id of the firm employing each household (-1 if it is
+                 unemployed), see `Households.employer`
+            F (int): The number of firms
+        '''
+        self.F = F
+        # employer of each household (-1 if unemployed)
+        self.firm = np.array(employer, dtype=np.int64)
+        # number of employees of each firm
+        self.count = np.bincount(self.firm[self.firm >= 0], minlength=F).astype(np.int64)
+        self.position = np.full(len(self.firm), -1, dtype=np.int64)
+        self._layout(self.count)
+
+        # the employees of each firm in order of their ids
+        employed = np.flatnonzero(self.firm >= 0)
+        employed = employed[np.argsort(self.firm[employed], kind="stable")]
+        firm = self.firm[employed]
+        pos = self.start[firm] + group_rank(firm)
+        self.members[pos] = employed
+        self.position[employed] = pos
+
+    def state(self):
+        '''
+        Return the index as a dict of arrays, without copying (see
+        `Firms.state`).
+        '''
+        return {name: getattr(self, name) for name in self._ARRAYS}
+
+    @classmethod
+    def from_state(cls, arrays):
+        '''
+        Return an index restored from a state returned by `state`.
+        '''
+        index = cls.__new__(cls)
+        for name in cls._ARRAYS:
+            setattr(index, name, arrays[name])
+        index.F = len(index.count)
+        return index
+
+    def resize(self, F):
+        '''
+        Extend the index to `F` firms: the new firms have no employees and
+        an empty segment at the end of `members` (laid out on their first
+        hire, see `add`).
+        '''
+        n = F - self.F
+        self.count = np.concatenate([self.count, np.zeros(n, dtype=np.int64)])
+        self.capacity = np.concatenate([self.capacity, np.zeros(n, dtype=np.int64)])
+        self.start = np.concatenate([self.start, np.full(n, len(self.members), dtype=np.int64)])
+        self.F = F
+
+    def employees(self, f):
+        '''
+        Return the ids of the households employed by firm `f`.
+        '''
+        return self.members[self.start[f]:self.start[f] + self.count[f]]
+
+    def add(self, households, firms):
+        '''
+        Register the (unemployed) `households` as employees of `firms`.
+        '''
+        if (len(households) == 0):
+            return
+        order = np.argsort(firms, kind="stable")
+        households, firms = households[order], firms[order]
+        hires = np.bincount(firms, minlength=self.F)
+        slot = self.count[firms] + group_rank(firms)
+        if (slot >= self.capacity[firms]).any():
+            self._layout(self.count + hires)
+        pos = self.start[firms] + slot
+        self.members[pos] = households
+        self.position[households] = pos
+        self.firm[households] = firms
+        self.count += hires
+
+    def remove(self, households):
+        '''
+        Unregister the employees `households` (households that are not
+        employed are ignored).  Each is replaced by the last employee of
+        its firm, one employee per firm at a time.
+        '''
+        households = households[self.firm[households] >= 0]
+        if (len(households) == 0):
+            return
+        firms = self.firm[households]
+        order = np.argsort(firms, kind="stable")
+        households, firms = households[order], firms[order]
+        rank = group_rank(firms)
+        for r in range(rank.max() + 1):
+            batch = (rank == r)
+            h, f = households[batch], firms[batch]
+            pos = self.position[h]
+            last = self.start[f] + self.count[f] - 1
+            moved = self.members[last]
+            self.members[pos] = moved
+            self.position[moved] = pos
+            self.members[last] = -1
+            self.position[h] = -1
+            self.firm[h] = -1
+            self.count[f] -= 1
+
+    def pick(self, firms, u, exclude=0):
+        '''
+        Return a randomly chosen employee of each of the (distinct) `firms`.
+
+        The employee is chosen with the uniform draws `u` from the first
+        `count - exclude` employees of the segment of its firm, and moved
+        behind them - so picking again with `exclude + 1` chooses another
+        employee.  The employees stay registered (see `remove`).
+        '''
+        n = self.count[firms] - exclude
+        end = self.start[firms] + n - 1
+        pos = self.start[firms] + np.minimum((u * n).astype(np.int64), n - 1)
+        chosen = self.members[pos]
+        other = self.members[end]
+        self.members[pos] = other
+        self.position[other] = pos
+        self.members[end] = chosen
+        self.position[chosen] = end
+        return chosen
+
+    def _layout(self, need):
+        '''
+        Lay out the segments of the firms again with room for twice `need`
+        employees each (at least 4), keeping the employees of every firm.
+        '''
+        capacity = np.maximum(2 * need, 4).astype(np.int64)
+        start = np.zeros(self.F, dtype=np.int64)
+        np.cumsum(capacity[:-1], out=start[1:])
+        members = np.full(int(capacity.sum()), -1, dtype=np.int64)
+        employed = np.flatnonzero(self.position >= 0)
+        if (len(employed) > 0):
+            firm = self.firm[employed]
+            pos = start[firm] + (self.position[employed] - self.start[firm])
+            members[pos] = employed
+            self.position[employed] = pos
+        self.start, self.capacity, self.members = start, capacity, members
@@ -1,55 +1,371 @@
+import concurrent.futures
 import numpy as np
 import numbers
+import os
+import weakref
+
+from . import checkpoint
+from . import jit
+from . import profiling
+from .rng import UniformStream
+
+# invariant checks (see `Firms.check_invariants`) run by the monthly
+# updates - set the environment variable ABM_CHECKED=0 or call
+# `set_checked(False)` to skip them in production runs
+_checked = (os.environ.get("ABM_CHECKED", "1") != "0")
+
+def set_checked(checked):
+    '''
+    Enable ("checked" mode) or disable ("fast" mode) the invariant checks
+    run by the monthly updates of all firms.
+
+    Returns:
+        bool: The previous setting
+    '''
+    global _checked
+    previous = _checked
+    _checked = bool(checked)
+    return previous
+
+def is_checked():
+    '''
+    Return `True` if the monthly updates check the firm invariants.
+    '''
+    return _checked
+
+class InvariantError(RuntimeError):
+    '''
+    Raised when the firm state violates one of the model invariants.
+
+    Attributes:
+        violations (dict):
+             Maps the name of each violated invariant to the violating
+             firms (see `Firms.check_invariants`).
+    '''
+    def __init__(self, message, violations):
+        super().__init__(message)
+        self.violations = violations
+
+class _Param:
+    '''
+    Descriptor for a firm parameter that is stored compactly.
+
+    A parameter that has the same value for every firm is stored as a 0-d
+    array, which the monthly updates broadcast against the firm arrays.
+    Reading the attribute then returns a read-only view of the firm shape
+    (`np.broadcast_to`); the parameter is only promoted to per-firm storage
+    when the value of some firms is set (see `set_prop`).
+    '''
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.name)
+        if (value.ndim == 0):
+            return np.broadcast_to(value, obj.shape)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.name, obj._cast(self.name[1:], value))
+
+class _Rows:
+    '''
+    The draws of one month for a view of the firms (see `Firms._run_sliced`),
+    handed out in order like a `UniformStream`.
+    '''
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursor = 0
+
+    def next(self):
+        row = self.rows[self.cursor]
+        self.cursor += 1
+        return row
 
 class Firms:
+    # firm state arrays that are rewritten by the monthly updates
+    _STATE = ("w", "p", "l", "v", "nv")
+
+    # initial state of the firms added by `add_firms` (see `__init__`)
+    _INITIAL = dict(m=0, i=5, d=5, w=1, p=1, l=1, v=0, nv=0)
+
+    # state of the slots of the firms removed by `remove_firms`: without
+    # demand, inventory or workforce a slot takes no branch of the monthly
+    # updates and produces nothing
+    _PARKED = dict(m=0, i=0, d=0, w=0, l=0, v=0, nv=0)
+
+    # random draws (per firm) used by each month:
+    # wage change, price change and price acceptance
+    DRAWS_PER_MONTH = 3
+
+    # model parameters - see [Lengnick 2013] Table 1
+    gamma = _Param()
+    delta = _Param()
+    i_phi_upper = _Param()
+    i_phi_lower = _Param()
+    nu = _Param()
+    p_phi_upper = _Param()
+    p_phi_lower = _Param()
+    theta = _Param()
+    t_lambda = _Param()
+    _PARAMS = ("gamma", "delta", "i_phi_upper", "i_phi_lower", "nu",
+               "p_phi_upper", "p_phi_lower", "theta", "t_lambda")
+
+    # model invariants (see `check_invariants`)
+    INVARIANTS = {
+        "l": "negative workforce (l < 0)",
+        "w": "negative wage (w < 0)",
+        "p": "negative price (p < 0)",
+        "v_nv": "an open vacancy AND vacancy-free months (v > 0 and nv > 0)",
+        "i_phi": "inventory lower bound above upper bound (i_phi_lower > i_phi_upper)",
+        "p_phi": "price lower bound above upper bound (p_phi_lower > p_phi_upper)",
+    }
+
+    # dtype policies for the firm properties
+    # - "compact" halves the memory traffic of the monthly updates:
+    #   single precision for all real values, 32-bit employment, a 16-bit
+    #   vacancy-free month counter and an 8-bit vacancy flag
+    DTYPES = {
+        "default": dict(gamma=np.int64, delta=np.float64, i_phi_upper=np.float64,
+                        i_phi_lower=np.float64, nu=np.float64, p_phi_upper=np.float64,
+                        p_phi_lower=np.float64, theta=np.float64, t_lambda=np.float64,
+                        m=np.float64, i=np.float64, d=np.float64, w=np.float64,
+                        p=np.float64, l=np.int64, v=np.int64, nv=np.int64),
+        "compact": dict(gamma=np.int16, delta=np.float32, i_phi_upper=np.float32,
+                        i_phi_lower=np.float32, nu=np.float32, p_phi_upper=np.float32,
+                        p_phi_lower=np.float32, theta=np.float32, t_lambda=np.float32,
+                        m=np.float32, i=np.float32, d=np.float32, w=np.float32,
+                        p=np.float32, l=np.int32, v=np.uint8, nv=np.int16),
+    }
+
     # initialize firms
-    def __init__(self, F):
+    def __init__(self, F, R=None, seed=None, block=None, inplace=False, dtypes="default", chunk=None,
+                 threads=None, engine="numpy", active=None):
+        '''
+        Args:
+            F (int): The number of firms
+            R (int, optional):
+                 The number of replicates (independent Monte Carlo runs) to
+                 simulate side by side.  If `None` (the default) every
+                 property is an array of shape `(F,)`; otherwise every
+                 property has shape `(R, F)` and the monthly updates act on
+                 all replicates at once.
+            seed (optional):
+                 Seed for the random draws: a `numpy.random.Generator`, a
+                 `numpy.random.SeedSequence` or any value accepted by
+                 `numpy.random.default_rng`.  With replicates, each
+                 replicate draws from its own stream spawned from this
+                 seed.  If `None` and `R` is `None` the draws come from the
+                 global `numpy.random` functions.
+            block (int, optional):
+                 If provided, the random draws for `block` months are
+                 generated at a time into a reusable buffer and consumed
+                 month by month.  The results are identical for every
+                 block size (including no block).  A seeded generator
+                 must be able to advance (see `UniformStream.seekable`).
+            inplace (bool, optional):
+                 If `True` the `adjust_*` methods update the firm state
+                 arrays in place and keep their temporaries in scratch
+                 buffers owned by this object, so steady-state months
+                 allocate no new arrays.  If `False` (the default) each
+                 update binds a freshly allocated array to the property.
+            dtypes (str or dict, optional):
+                 The dtype policy for the firm properties: the name of one
+                 of the policies in `Firms.DTYPES` ("default" or "compact")
+                 or a dict mapping property names to dtypes, which
+                 overrides the default policy for those properties.
+            chunk (int, optional):
+                 If provided, `step_month` and `produce` process the firms
+                 `chunk` at a time, running the whole wage, workforce and
+                 price pipeline on a chunk before moving on to the next, so
+                 the temporaries are chunk-sized and stay in cache.  The
+                 state arrays are updated in place and the results are
+                 identical to the unchunked updates.
+            threads (int, optional):
+                 If provided, the monthly updates and `produce` split the
+                 firms into `threads` slices that are updated in parallel
+                 threads (in chunks if `chunk` is provided), in place and
+                 without copying.  Each slice draws its part of the random
+                 stream with its own copy of the generators, so the
+                 results are identical for every number of threads.
+            engine (str, optional):
+                 The implementation of `step_month`: "numpy" (the default),
+                 "numba" for a compiled single-pass kernel that updates the
+                 firms in place (see `jit`), or "auto" for "numba" if Numba
+                 is installed and "numpy" otherwise.
+            active (float, optional):
+                 If provided, the wage and price updates gather the
+                 "active" firms - those whose wage rises or falls, and
+                 those whose inventory is outside its bounds - and run the
+                 wage and price arithmetic on these firms only whenever
+                 they are at most this fraction of the firms, scattering
+                 the results back into the state arrays.  The cost of
+                 these updates then grows with the number of active firms
+                 rather than with `F`.  The results are identical to the
+                 updates of all firms.  Ignored by the "numba" engine.
+        '''
 
-        # initialize number of firms
+        # initialize number of firms and replicates
         self.F = F
+        self.R = R
+        self.shape = (F,) if (R is None) else (R, F)
+
+        # random draws - one stream per replicate (see `_uniform`)
+        rows = 1 if (block is None) else block * self.DRAWS_PER_MONTH
+        self._draws = UniformStream(F, R, seed, rows)
+        if (block is not None) and (self._draws.rngs is not None) and not self._draws.seekable():
+            # buffered draws are returned to the generators when firms are
+            # added (see `UniformStream.resize`)
+            raise ValueError("'block' needs generators that can be advanced (e.g. PCG64)")
+
+        # dtype policy (see `_cast`)
+        policy = dtypes if isinstance(dtypes, dict) else self.DTYPES[dtypes]
+        self.dtypes = {name: np.dtype(dt) for name, dt in {**self.DTYPES["default"], **policy}.items()}
+        # dtype used for temporary real values
+        self._float = np.result_type(self.dtypes["w"], self.dtypes["p"])
+
+        # update mode and scratch buffers (see `_scratch`)
+        self.inplace = inplace
+        self._buffers = {}
+        self.chunk = chunk
+        self.threads = threads
+        self._pool = None
+        if (engine == "auto"):
+            engine = "numba" if jit.available() else "numpy"
+        if (engine not in ("numpy", "numba")):
+            raise ValueError(f"Unknown engine '{engine}'")
+        if (engine == "numba") and not jit.available():
+            raise ImportError("The numba engine needs Numba to be installed")
+        self.engine = engine
+        self.active = active
+
+        # firm slots (see `add_firms` and `remove_firms`): whether each slot
+        # holds a firm, the free slots (reused last in, first out) and the
+        # storage of the property arrays (see `_grow`)
+        self.alive = np.ones(F, dtype=bool)
+        self._free = []
+        self._storage = {}
+        self._capacity = F
         
         # initialize model parameters
         # - See [Lengnick 2013] Table 1:
+        # - parameters are stored as a single value until they are set
+        #   for individual firms (see `_Param`)
         # firm number of vacancy-free months before reducing wage rate (gamma_f)
-        self.gamma = np.full(self.F, 24) # [Lengnick 2013] sets this to 24
+        self.gamma = 24 # [Lengnick 2013] sets this to 24
         # firm wage max % change (delta_f)
-        self.delta = np.full(self.F,0.019) # [Lengnick 2013] sets this to 0.019
+        self.delta = 0.019 # [Lengnick 2013] sets this to 0.019
         # TODO: store inventory bounds as a 2-column matrix to allow both
         #       bounds to be calculated using matrix multiplication
         # firm inventory upper bound - percentage of previous demand
-        self.i_phi_upper = np.full(self.F, 1.0)  # [Lengnick 2013] sets this to 1
+        self.i_phi_upper = 1.0  # [Lengnick 2013] sets this to 1
         # firm inventory lower bound - percentage of previous demand
-        self.i_phi_lower = np.full(self.F, 0.25)  # [Lengnick 2013] sets this to 0.25
+        self.i_phi_lower = 0.25  # [Lengnick 2013] sets this to 0.25
         # firm price max % change (nu_f)
-        self.nu = np.full(self.F, 0.02)  # [Lengnick 2013] sets this to 0.02
+        self.nu = 0.02  # [Lengnick 2013] sets this to 0.02
         # TODO: store price bounds as a 2-column matrix to allow both
         #       bounds to be calculated using matrix multiplication
         # firm price upper bound - percentage of marginal costs
-        self.p_phi_upper = np.full(self.F, 1.15)  # [Lengnick 2013] sets this to 1.15
+        self.p_phi_upper = 1.15  # [Lengnick 2013] sets this to 1.15
         # firm price lower bound - percentage of marginal costs
-        self.p_phi_lower = np.full(self.F, 1.025)  # [Lengnick 2013] sets this to 1.025
+        self.p_phi_lower = 1.025  # [Lengnick 2013] sets this to 1.025
         # firm probability of accepting price change (theta_f)
-        self.theta = np.full(self.F, 0.75) # [Lengnick 2013] sets this to 0.75
+        self.theta = 0.75 # [Lengnick 2013] sets this to 0.75
         # firm technology level - units produced per employee
-        self.t_lambda = np.full(self.F, 3) # [Lengnick 2013] sets this to 3
+        self.t_lambda = 3 # [Lengnick 2013] sets this to 3
 
         # initial conditions (TBD)
         # firm liquidity (m_f) - current "bank account" balance
-        self.m = np.zeros(self.F) # bank balance is zero at start (?)
+        self.m = np.zeros(self.shape, self.dtypes["m"]) # bank balance is zero at start (?)
         # firm inventory (i_f) - current inventory levels
-        self.i = np.full(self.F, 5) # inventory set to 5 at start (?)
+        self.i = np.full(self.shape, 5, self.dtypes["i"]) # inventory set to 5 at start (?)
         # firm previous demand (d_f) - the demand for the previous month
-        self.d = np.full(self.F, 5) # set demand equal to inventory at start (?)
+        self.d = np.full(self.shape, 5, self.dtypes["d"]) # set demand equal to inventory at start (?)
         # firm wage (w_f) - current wage paid to employees
-        self.w = np.ones(self.F) # wage set to 1 at start (?)
+        self.w = np.ones(self.shape, self.dtypes["w"]) # wage set to 1 at start (?)
         # firm price (p_f) - current price
-        self.p = np.ones(self.F) # price set to 1 at start (?)
+        self.p = np.ones(self.shape, self.dtypes["p"]) # price set to 1 at start (?)
         # firm labor (l_f) - number of households currently employed by each firm
-        self.l = np.ones(self.F, dtype=int) # employees set to 1 at start (?)
+        self.l = np.ones(self.shape, self.dtypes["l"]) # employees set to 1 at start (?)
         # firm vacancies - current open positions
-        self.v = np.zeros(self.F, dtype=int) # every firm has zero vacancy at start
+        self.v = np.zeros(self.shape, self.dtypes["v"]) # every firm has zero vacancy at start
         # firm number of months without vacancy
-        self.nv = np.zeros(self.F, dtype=int) # no months w/o vacancy at start
+        self.nv = np.zeros(self.shape, self.dtypes["nv"]) # no months w/o vacancy at start
+
+    def state(self):
+        '''
+        Return the complete state of the firms as a dict of arrays, without
+        copying: every property and parameter (parameters shared by all
+        firms as 0-d arrays), the buffered random draws, and the sizes,
+        dtype policy, update mode and generator position (as JSON, see
+        `checkpoint.encode`).
+        '''
+        draws = self._draws.state()
+        arrays = {name: getattr(self, ("_" + name) if (name in self._PARAMS) else name)
+                  for name in self.dtypes}
+        arrays["draws"] = draws["buffer"]
+        arrays["alive"] = self.alive
+        arrays["free"] = np.asarray(self._free, dtype=np.int64)
+        arrays["meta"] = checkpoint.encode({
+            "F": self.F, "R": self.R, "inplace": self.inplace,
+            "chunk": self.chunk, "threads": self.threads, "engine": self.engine,
+            "active": self.active,
+            "dtypes": {name: dt.str for name, dt in self.dtypes.items()},
+            "draws": draws["position"]})
+        return arrays
+
+    @classmethod
+    def from_state(cls, arrays):
+        '''
+        Return firms restored from a state returned by `state`.  The arrays
+        are used as the firm properties without copying or conversion.
+        '''
+        meta = checkpoint.decode(arrays["meta"])
+        firms = cls.__new__(cls)
+        firms.F = meta["F"]
+        firms.R = meta["R"]
+        firms.shape = (firms.F,) if (firms.R is None) else (firms.R, firms.F)
+        firms._draws = UniformStream.from_state({"buffer": arrays["draws"], "position": meta["draws"]})
+        firms.dtypes = {name: np.dtype(dt) for name, dt in meta["dtypes"].items()}
+        firms._float = np.result_type(firms.dtypes["w"], firms.dtypes["p"])
+        firms.inplace = meta["inplace"]
+        firms._buffers = {}
+        firms.chunk = meta.get("chunk")
+        firms.threads = meta.get("threads")
+        firms._pool = None
+        firms.engine = meta.get("engine", "numpy")
+        firms.active = meta.get("active")
+        firms.alive = arrays["alive"] if ("alive" in arrays) else np.ones(firms.F, dtype=bool)
+        firms._free = [int(k) for k in arrays["free"]] if ("free" in arrays) else []
+        firms._storage = {}
+        firms._capacity = firms.F
+        for name in firms.dtypes:
+            setattr(firms, ("_" + name) if (name in cls._PARAMS) else name, arrays[name])
+        return firms
+
+    def save(self, path):
+        '''
+        Write a checkpoint of the firms to an uncompressed `.npz` file (if
+        `path` ends with ".npz") or to a directory of `.npy` files.  A run
+        resumed from the checkpoint (see `load`) is identical to an
+        uninterrupted run.
+        '''
+        checkpoint.save(path, self.state())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        '''
+        Return firms restored from a checkpoint written by `save`.
+
+        Args:
+            path (str): The checkpoint file or directory
+            mmap (bool, optional):
+                 If `True` (the default) the firm arrays are copy-on-write
+                 memory maps of the checkpoint, read on first use
+        '''
+        return cls.from_state(checkpoint.load(path, mmap))
 
     def set_prop(self, prop_name, value, id=None):
         '''
@@ -62,7 +378,7 @@ class Firms:
                  The `id` of the firm whose property should be updated. If
                  a value is specified for `id` then `array` must be equal
                  to `None`.
-            value (numbers.Number of numpy.ndarray):
+            value (numbers.Number or array-like):
                  The value to be set for the specified property.  If a value
                  for `id` is provided then `value` must be a `numbers.Number`.
                  If `id` is equal to `None` then the specified `value` s used
@@ -72,42 +388,381 @@ class Firms:
                  is provided then the number of elements in the array must equal
                  the number of firms and the array is used to set property
                  valuse for all the firms.
+
+        With replicates (`R` is not `None`) a firm `id` is updated in every
+        replicate, and `value` may also be an array of shape `(R, F)` giving
+        the values for each replicate.
+
+        See `set_props` to update several properties or many firms at once.
         '''
         # verify 'prop_name' is valid
-        if (not isinstance(prop_name, str)):
-            raise TypeError(f"'prop_name' must be a string, not '{type(prop_name).__name__}'")
-        if (not hasattr(self, prop_name)):
-            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{prop_name}'")
+        self._check_prop_name(prop_name)
 
         # verify that 'value' is valid
-        # TODO: allow the array argument to be "array-like" instead of a numpy array
-        if not (isinstance(value, numbers.Number) or isinstance(value, np.ndarray)):
-            raise TypeError(f"Argument 'value' must be a single numeric value or a 1-dimensional array of length {self.F}.")
+        if not isinstance(value, numbers.Number):
+            value = self._as_array(value)
 
         # attempt to set the value of the property
         if (id is None):
-            if isinstance(value, numbers.Number):
-                setattr(self, prop_name, np.full(self.F, value))
-            elif isinstance(value, np.ndarray):
-                if (value.ndim == 1 and len(value) == self.F):
-                    setattr(self, prop_name, np.full(self.F, value))
-                else:
-                    raise TypeError(f"Argument 'value' array must be 1-dimensional with length {self.F}.")
-            else:
-                raise RuntimeError(f"Expected 'value' to be a single numeric value or an array")
+            if (np.ndim(value) > 0) and not (value.shape in ((self.F,), self.shape)):
+                raise TypeError(f"Argument 'value' array must have shape {self._shape_desc()}.")
+            self._write(prop_name, self._cast(prop_name, value))
         else: # (id is not None)
             # verify that id is an integer
-            if (not isinstance(id, int)):
+            if (not isinstance(id, numbers.Integral)):
                 raise TypeError(f"'id' must be an int, not '{type(id).__name__}'")
             # verify that id is in bounds
             if (id < 0 or id >= self.F):
                 raise IndexError(f"'id' {id} is out of bounds: 0 <= 'id' < {self.F}")
             if isinstance(value, numbers.Number):
-                arr = getattr(self, prop_name)
-                arr[id] = value
+                # set the firm property in every replicate
+                self._write(prop_name, self._cast(prop_name, value), (..., int(id)))
             else:
                 raise TypeError(f"Argument 'value' must be a single numeric value")
 
+    def set_props(self, values, ids=None, copy=True):
+        '''
+        Set the values of several firm properties at once, either for all
+        firms or for a selection of firms.
+
+        All property names, values and the selection are validated before
+        any property is changed, and each property is updated with a single
+        vectorized assignment.
+
+        Args:
+            values (dict):
+                 Maps the names of the properties to update to their new
+                 values.  Each value is a single numeric value or an
+                 array-like that matches the selected firms: shape `(F,)`
+                 (or `(R, F)`) if `ids` is `None`, otherwise shape `(n,)`
+                 for `n` selected firms (or `(R, n)` with replicates).
+            ids (optional):
+                 The firms to update: an int, an array-like of firm ids, a
+                 boolean mask of shape `(F,)` (or `(R, F)` to select firms
+                 per replicate) or a slice.  If `None` (the default) all
+                 firms are updated.  Firm ids apply to every replicate.
+            copy (bool, optional):
+                 If `False` and `ids` is `None`, a value that is already an
+                 array with the full firm shape and the policy dtype of the
+                 property is used as the property array without copying.
+        '''
+        if not isinstance(values, dict):
+            raise TypeError(f"'values' must be a dict, not '{type(values).__name__}'")
+
+        # validate everything before changing anything
+        key = None if (ids is None) else self._select(ids)
+        updates = self._validate(values, None if (ids is None) else self._selection_shape(key))
+        for prop_name, value in updates:
+            self._write(prop_name, value, key, copy)
+
+    def add_firms(self, n, **props):
+        '''
+        Add `n` firms, in the free slots of removed firms (see
+        `remove_firms`) first and then in new slots at the end of the
+        property arrays.
+
+        The property arrays are views of storage arrays whose capacity
+        doubles when it runs out (see `_grow`), so in `inplace` mode adding
+        firms takes amortised constant time per firm; replacing removed
+        firms needs no new storage at all.  Outside of `inplace` mode the
+        monthly updates rebind the state arrays, and the first call after
+        an update that needs new slots copies them back into storage - it
+        costs O(F), so add firms in batches.
+
+        Args:
+            n (int): The number of firms to add
+            props: The properties of the new firms (see `set_props`), for
+                 example `w=1.2` or `p=np.array([...])` with one value per
+                 new firm.  Properties that are not provided start out
+                 with their initial value (see `__init__`); parameters set
+                 per firm must be provided.
+
+        Returns:
+            numpy.ndarray: The ids of the new firms (their slots)
+        '''
+        if not isinstance(n, numbers.Integral) or (n < 0):
+            raise ValueError(f"'n' must be a non-negative int, not {n!r}")
+        missing = [name for name in self._PARAMS if (getattr(self, "_" + name).ndim > 0) and (name not in props)]
+        if missing:
+            raise ValueError(f"Parameters set per firm must be provided for new firms: {', '.join(missing)}")
+        values = {**self._INITIAL, **props}
+        updates = self._validate(values, self.shape[:-1] + (n,))
+
+        k = min(n, len(self._free))
+        start = self.F
+        if (n > k):
+            self._grow(self.F + n - k)
+        reused = self._free[len(self._free) - k:]
+        del self._free[len(self._free) - k:]
+        ids = np.concatenate([np.array(reused, dtype=np.intp), np.arange(start, self.F, dtype=np.intp)])
+
+        self.alive[ids] = True
+        for prop_name, value in updates:
+            self._write(prop_name, value, (..., ids))
+        return ids
+
+    def remove_firms(self, ids):
+        '''
+        Remove firms (e.g. bankrupt firms): their slots are parked in a
+        state that takes no branch of the monthly updates (see `_PARKED`)
+        and reused by `add_firms`.  The ids of the other firms do not
+        change.
+
+        Args:
+            ids: The firms to remove: an int, an array-like of firm ids or
+                 a boolean mask of shape `(F,)`
+
+        Returns:
+            numpy.ndarray: The ids of the removed firms
+        '''
+        ids = np.asarray(ids)
+        if (ids.dtype.kind == "b"):
+            if (ids.shape != (self.F,)):
+                raise TypeError(f"Boolean 'ids' mask must have shape ({self.F},).")
+            ids = np.flatnonzero(ids)
+        ids = np.atleast_1d(ids)
+        if (ids.dtype.kind not in "iu") or (ids.ndim != 1):
+            raise TypeError("'ids' must be an int, a 1-dimensional array of ints or a boolean mask")
+        if (ids.size > 0) and ((ids.min() < 0) or (ids.max() >= self.F)):
+            raise IndexError(f"'ids' are out of bounds: 0 <= 'id' < {self.F}")
+        if (np.unique(ids).size != ids.size):
+            raise ValueError("'ids' contains duplicate firms")
+        dead = ids[~self.alive[ids]]
+        if (dead.size > 0):
+            raise ValueError(f"Removed {self._ids_desc(dead)} can not be removed again")
+
+        self.set_props(self._PARKED, ids=ids)
+        self.alive[ids] = False
+        self._free.extend(ids.tolist())
+        return ids
+
+    def _grow(self, F):
+        '''
+        Extend the firm slots to `F` (the new slots are not initialized).
+
+        Each property array becomes a view of the first `F` slots of a
+        storage array; the storage is only reallocated, with twice the
+        capacity, when it runs out.  A property that was rebound to a new
+        array (e.g. by the updates outside of `inplace` mode) is copied
+        back into its storage.
+        '''
+        if (F > self._capacity):
+            self._capacity = max(F, 2 * self._capacity)
+        for name in (*self.dtypes, "alive"):
+            attr = ("_" + name) if (name in self._PARAMS) else name
+            value = getattr(self, attr)
+            if (value.ndim == 0):
+                continue
+            storage = self._storage.get(name)
+            if (storage is None) or (storage.shape[-1] != self._capacity) or (storage.dtype != value.dtype):
+                storage = self._storage[name] = np.empty(value.shape[:-1] + (self._capacity,), value.dtype)
+                storage[..., :self.F] = value
+            elif (value.base is not storage):
+                storage[..., :self.F] = value
+            setattr(self, attr, storage[..., :F])
+        self.F = F
+        self.shape = self.shape[:-1] + (F,)
+        self._draws.resize(F)
+        # the scratch buffers are reallocated with the new shape
+        self._buffers.clear()
+
+    def _validate(self, values, shape=None):
+        '''
+        Validate and convert (see `_cast`) new property values for the
+        selected firms of shape `shape` (all firms if `None`), and return
+        them as a list of `(prop_name, value)` pairs.
+        '''
+        updates = []
+        for prop_name, value in values.items():
+            self._check_prop_name(prop_name)
+            value = self._cast(prop_name, self._as_array(value))
+            if (shape is None):
+                valid = value.shape in ((), (self.F,), self.shape)
+            else:
+                try:
+                    valid = (np.broadcast_shapes(value.shape, shape) == shape)
+                except ValueError:
+                    valid = False
+            if not valid:
+                selected = self.shape if (shape is None) else shape
+                raise TypeError(f"Value for '{prop_name}' with shape {value.shape} does not match the selected firms {selected}.")
+            updates.append((prop_name, value))
+        return updates
+
+    def _check_prop_name(self, prop_name):
+        # verify 'prop_name' is the name of a firm property
+        if (not isinstance(prop_name, str)):
+            raise TypeError(f"'prop_name' must be a string, not '{type(prop_name).__name__}'")
+        if (prop_name not in self.dtypes):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{prop_name}'")
+
+    def _as_array(self, value):
+        # convert a numeric value or array-like to an array
+        value = np.asarray(value)
+        if (value.dtype.kind not in "biuf"):
+            raise TypeError(f"Argument 'value' must be a single numeric value or an array of shape {self._shape_desc()}.")
+        return value
+
+    def _select(self, ids):
+        '''
+        Validate a firm selection (see `set_props`) and return the key that
+        selects those firms from a property array.
+        '''
+        if isinstance(ids, slice):
+            return (..., ids)
+        if isinstance(ids, numbers.Integral):
+            ids = int(ids)
+            if (ids < 0 or ids >= self.F):
+                raise IndexError(f"'id' {ids} is out of bounds: 0 <= 'id' < {self.F}")
+            return (..., ids)
+        ids = np.asarray(ids)
+        if (ids.dtype.kind == "b"):
+            if (ids.shape == (self.F,)):
+                return (..., ids)
+            if (ids.shape == self.shape):
+                return (ids,)
+            raise TypeError(f"Boolean 'ids' mask must have shape {self._shape_desc()}.")
+        if (ids.dtype.kind not in "iu") or (ids.ndim != 1):
+            raise TypeError("'ids' must be an int, a 1-dimensional array of ints, a boolean mask or a slice")
+        if (ids.size > 0) and ((ids.min() < 0) or (ids.max() >= self.F)):
+            raise IndexError(f"'ids' are out of bounds: 0 <= 'id' < {self.F}")
+        return (..., ids)
+
+    def _selection_shape(self, key):
+        # shape of the part of a property array selected by `key`
+        sel = key[-1]
+        if (len(key) == 1): # mask over all replicates
+            return (int(np.count_nonzero(sel)),)
+        if isinstance(sel, slice):
+            n = (len(range(*sel.indices(self.F))),)
+        elif isinstance(sel, int):
+            n = ()
+        elif (sel.dtype.kind == "b"):
+            n = (int(np.count_nonzero(sel)),)
+        else:
+            n = sel.shape
+        return self.shape[:-1] + n
+
+    def _write(self, prop_name, value, key=None, copy=True):
+        '''
+        Write a validated value (already converted by `_cast`) to the
+        property `prop_name`, either to the firms selected by `key` or to
+        all firms.
+        '''
+        if (key is not None):
+            if (prop_name in self._PARAMS) and (getattr(self, "_" + prop_name).ndim == 0):
+                # the parameter now differs between firms
+                setattr(self, prop_name, np.full(self.shape, getattr(self, "_" + prop_name)))
+            getattr(self, prop_name)[key] = value
+        elif (not copy) and (value.shape == self.shape):
+            # adopt the caller's array
+            setattr(self, prop_name, value)
+        elif self.inplace and (prop_name in self._STATE):
+            # keep the state array owned by this object - the monthly
+            # updates write into it
+            np.copyto(getattr(self, prop_name), value)
+        elif (prop_name in self._PARAMS) and (value.ndim == 0):
+            # keep a parameter shared by all firms as a single value
+            setattr(self, prop_name, value)
+        else:
+            # an array of shape (F,) is used for every replicate
+            setattr(self, prop_name, np.full(self.shape, value))
+
+    def _cast(self, prop_name, value):
+        '''
+        Convert `value` to an array with the dtype of the policy for the
+        property `prop_name`.  Raise a `TypeError` if the value can not be
+        converted without changing its kind (e.g. a real value for an
+        integer property); integer values may be stored in any integer
+        dtype that holds them, otherwise an `OverflowError` is raised.
+        '''
+        value = np.asarray(value)
+        dtype = self.dtypes.get(prop_name)
+        if dtype is None:
+            return value
+        integers = (value.dtype.kind in "biu") and (dtype.kind in "iu")
+        if not (integers or np.can_cast(value.dtype, dtype, casting="same_kind")):
+            raise TypeError(f"Cannot set '{prop_name}' ({dtype}) to a value of type {value.dtype}")
+        if integers and (value.size > 0) and not np.can_cast(value.dtype, dtype):
+            info = np.iinfo(dtype)
+            if (value.min() < info.min) or (value.max() > info.max):
+                raise OverflowError(f"Values of '{prop_name}' ({dtype}) must be in [{info.min}, {info.max}]")
+        return value.astype(dtype, copy=False)
+
+    def _shape_desc(self):
+        # description of the array shapes accepted for a property
+        if (self.R is None):
+            return f"({self.F},)"
+        return f"({self.F},) or ({self.R}, {self.F})"
+
+    def check_invariants(self, raise_error=True):
+        '''
+        Verify the model invariants (see `Firms.INVARIANTS`) for every firm:
+
+        - workforce, wages and prices are non-negative
+        - a firm can not both have an open vacancy and count vacancy-free
+          months: (v > 0) and (nv > 0) are mutually exclusive
+        - the lower inventory and price bounds do not exceed the upper
+          bounds
+
+        The monthly updates call this method unless checks are disabled
+        with `set_checked(False)`.
+
+        Args:
+            raise_error (bool, optional):
+                 If `True` (the default) raise an `InvariantError` if any
+                 invariant is violated.
+
+        Returns:
+            dict: Maps the name of each violated invariant to the ids of
+                  the violating firms - an array of firm ids, or of
+                  (replicate, firm id) rows with replicates.
+        '''
+        bad = self._scratch("check", bool)
+        tmp = self._scratch("check_tmp", bool)
+
+        violations = {}
+        def record(name, mask):
+            if (np.ndim(mask) == 0):
+                # parameters shared by all firms
+                if mask:
+                    violations[name] = self._firm_ids(np.ones(self.shape, dtype=bool))
+            elif mask.any():
+                violations[name] = self._firm_ids(mask)
+
+        for name in ("l", "w", "p"):
+            record(name, np.less(getattr(self, name), 0, out=bad))
+
+        np.greater(self.v, 0, out=bad)
+        np.greater(self.nv, 0, out=tmp)
+        record("v_nv", np.logical_and(bad, tmp, out=bad))
+
+        for name, lower, upper in (("i_phi", self._i_phi_lower, self._i_phi_upper),
+                                   ("p_phi", self._p_phi_lower, self._p_phi_upper)):
+            out = None if (np.ndim(lower) == np.ndim(upper) == 0) else bad
+            record(name, np.greater(lower, upper, out=out))
+
+        if violations and raise_error:
+            details = "; ".join(f"{self.INVARIANTS[name]}: {self._ids_desc(ids)}"
+                                for name, ids in violations.items())
+            raise InvariantError(f"Firm invariants violated - {details}", violations)
+        return violations
+
+    def _firm_ids(self, mask):
+        # the ids of the firms selected by a mask (with replicates as
+        # (replicate, firm id) rows)
+        ids = np.flatnonzero(mask)
+        if (self.R is None):
+            return ids
+        return np.column_stack(np.divmod(ids, self.F))
+
+    def _ids_desc(self, ids, n=10):
+        # short description of a list of firm ids
+        desc = ", ".join(str(tuple(x)) if np.ndim(x) else str(x) for x in ids[:n])
+        more = f" and {len(ids) - n} more" if (len(ids) > n) else ""
+        return f"firms [{desc}]{more}"
+
+    @profiling.timed("firms.adjust_wages")
     def adjust_wages(self):
         '''
         See section 2.2 of [Lengnick 2012] for details:
@@ -126,113 +781,488 @@ class Firms:
           - (nv >= gamma) and (new_v == 0) -> decrease wage (-1)
           - otherwise                      -> wage unchanged (0)
         '''
+        if _checked:
+            self.check_invariants()
+        if self.chunk or self.threads:
+            self._run_sliced(_adjust_wages, 1)
+            return
+        self._adjust_wages(self._below_lower())
 
-        # TODO: make sure wage never goes negative ??
+    @profiling.timed("firms.adjust_workforce")
+    def adjust_workforce(self):
+        '''
+        See section 2.2 of [Lengnick 2012] for details:
+
+        - First establish upper and lower limits for inventory
+        - If current inventory is below lower limit, open a new vacancy
+          condition: (f.i < (f.i_phi_lower * f.d))
+        - If current inventory is above uper limit, fire a randomly choosen employee
+          condition: (f.i > (f.i_phi_upper * f.d))
+
+        Each firm can hire/fire at most one employee per month (see footnote 18)
+        '''
+        if _checked:
+            self.check_invariants()
+        if self.chunk or self.threads:
+            self._run_sliced(_adjust_workforce, 0)
+            return
+        self._adjust_workforce(self._below_lower(), self._above_upper())
+
+    @profiling.timed("firms.adjust_prices")
+    def adjust_prices(self):
+        '''
+        See section 2.2 of [Lengnick 2012] for details:
+
+        - First establish upper and lower limits for price
+          marginal costs: (self.l * self.w) / (self.l * self.t_lambda)
+        - Increase price if current inventory is less than inventory lower limit
+          condition:
+        - Decrease price if current inventory is greater then inventory upper limit
+          condition:
+
+        '''
+        if _checked:
+            self.check_invariants()
+        if self.chunk or self.threads:
+            self._run_sliced(_adjust_prices, 2)
+            return
+        self._adjust_prices(self._below_lower(), self._above_upper())
+
+    @profiling.timed("firms.step_month")
+    def step_month(self):
+        '''
+        Run the monthly firm updates as a single fused step.
+
+        The inventory-bound masks are computed once and shared by the wage,
+        workforce and price updates, which are applied in that order.  For
+        a fixed random seed the result is identical to calling
+        `adjust_wages()`, `adjust_workforce()` and `adjust_prices()` one
+        after the other.
+        '''
+        if _checked:
+            self.check_invariants()
+
+        if self.chunk or self.threads or (self.engine == "numba"):
+            self._run_sliced(_step_month, self.DRAWS_PER_MONTH)
+            return
+
+        below = self._below_lower()
+        above = self._above_upper()
+
+        self._adjust_wages(below)
+        self._adjust_workforce(below, above)
+        self._adjust_prices(below, above)
+
+    @profiling.timed("firms.produce")
+    def produce(self):
+        '''
+        See section 2.2 of [Lengnick 2012] for details:
+
+        - Each day every employee produces t_lambda units, which are added
+          to the firm's inventory
+        '''
+        if self.chunk or self.threads:
+            self._run_sliced(_produce, 0)
+            return
+        _produce(self)
+
+    def _run_sliced(self, update, draws):
+        '''
+        Run `update(firms)` on views of slices of the firms (see `_slices`):
+        one slice per thread, each processed `chunk` firms at a time.
+
+        Each view reads its part of the next `draws` draws ahead from the
+        stream (see `UniformStream.peek`), with its own copy of the
+        generators, and the stream then skips them; if the stream is not
+        seekable (see `UniformStream.seekable`) the draws are made up
+        front.  The results are therefore identical to
+        those of the update of all firms at once.
+        '''
+        stream = self._draws
+        ahead = stream.seekable() or (stream.rows - stream.cursor >= draws)
+        if draws and not ahead:
+            rows = [stream.next().copy() for k in range(draws)]
+
+        def run(views):
+            for firms in views:
+                if draws:
+                    start, stop = firms._span
+                    if ahead:
+                        shape = (draws,) + firms.shape
+                        u = firms._buffers.get("draws")
+                        if (u is None) or (u.shape != shape):
+                            u = firms._buffers["draws"] = np.empty(shape)
+                        stream.peek(draws, start, stop, out=u)
+                    else:
+                        u = [row[..., start:stop] for row in rows]
+                    firms._draws = _Rows(u)
+                update(firms)
 
-        # TODO: consider combining adjust_wages with adjust_workforce
+        slices = self._slices()
+        if (len(slices) == 1):
+            run(slices[0])
+        else:
+            # numpy releases the GIL in the ufunc loops
+            for result in self._executor().map(run, slices):
+                pass
+
+        if draws and ahead:
+            stream.skip(draws)
+
+    def _slices(self):
+        '''
+        Return the views of the firms processed by each thread: the firms
+        are split into `threads` contiguous slices, and each slice into
+        views of at most `chunk` firms (see `_view`).  The views of a slice
+        are created as they are processed.
+        '''
+        n = self.threads or 1
+        bounds = np.linspace(0, self.F, n + 1).astype(int).tolist()
+        def views(k, start, stop):
+            size = self.chunk or max(stop - start, 1)
+            for a in range(start, stop, size):
+                yield self._view(k, a, min(a + size, stop))
+        return [views(k, start, stop) for k, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+    def _view(self, k, start, stop):
+        '''
+        Return a view of the firms `start:stop` processed by thread `k`: a
+        `Firms` object whose properties are slices of the properties of
+        these firms, updated in place.  The views of a thread that have the
+        same size share their scratch buffers.
+        '''
+        firms = Firms.__new__(Firms)
+        firms.F = stop - start
+        firms.R = self.R
+        firms.shape = self.shape[:-1] + (firms.F,)
+        firms.dtypes = self.dtypes
+        firms._float = self._float
+        firms.inplace = True
+        firms.chunk = None
+        firms.threads = None
+        firms.engine = self.engine
+        firms.active = self.active
+        firms.alive = self.alive[start:stop]
+        firms._free = self._free
+        firms._span = (start, stop)
+        firms._buffers = self._buffers.setdefault(("view", k, firms.shape), {})
+        for name in self.dtypes:
+            attr = ("_" + name) if (name in self._PARAMS) else name
+            value = getattr(self, attr)
+            setattr(firms, attr, value if (value.ndim == 0) else value[..., start:stop])
+        return firms
+
+    def _executor(self):
+        # the thread pool of the sliced updates (created on first use)
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.threads)
+            weakref.finalize(self, self._pool.shutdown, wait=False)
+        return self._pool
+
+    def _scratch(self, name, dtype=None):
+        '''
+        Return an F-length work array for the temporary `name` (of the
+        real dtype of the firm state unless `dtype` is provided).
+
+        In `inplace` mode the array is allocated on first use and then
+        reused by every later call; otherwise a new array is returned.
+        '''
+        dtype = self._float if (dtype is None) else np.dtype(dtype)
+        if not self.inplace:
+            return np.empty(self.shape, dtype=dtype)
+        buf = self._buffers.get(name)
+        if (buf is None) or (buf.dtype != dtype) or (buf.shape != self.shape):
+            buf = self._buffers[name] = np.empty(self.shape, dtype=dtype)
+        return buf
+
+    def _target(self, prop_name):
+        '''
+        Return the array that the new value of state `prop_name` is
+        written to: the state array itself in `inplace` mode, otherwise a
+        new array with the policy dtype of the property.
+        '''
+        if self.inplace:
+            return getattr(self, prop_name)
+        return np.empty(self.shape, dtype=self.dtypes[prop_name])
+
+    def _below_lower(self):
+        # inventory below lower limit - open vacancy / raise price
+        below = self._scratch("below", bool)
+        bound = self._scratch("i_bound", np.result_type(self._i_phi_lower, self.d))
+        np.multiply(self._i_phi_lower, self.d, out=bound)
+        return np.less(self.i, bound, out=below)
+
+    def _above_upper(self):
+        # inventory above upper limit - fire employee / lower price
+        above = self._scratch("above", bool)
+        bound = self._scratch("i_bound", np.result_type(self._i_phi_upper, self.d))
+        np.multiply(self._i_phi_upper, self.d, out=bound)
+        return np.greater(self.i, bound, out=above)
+
+    def _uniform(self, high):
+        # random draws from [0, high) - one per firm (in every replicate)
+        return np.multiply(self._draws.next(), high, out=self._scratch("u"))
+
+    @profiling.timed("firms.wages")
+    def _adjust_wages(self, below):
+        '''
+        Wage update given the inventory lower bound mask (see `adjust_wages`).
+        '''
+
+        # TODO: make sure wage never goes negative ??
 
         # make sure wages are not modified in a way that conflicts with
         # the workforce adjustments that will be made during next month
         # !!!TEST REQUIRED!!!
 
+        # the data is assumed to be consistent (see `check_invariants`) -
+        # only one of the following can be true:
+        # - open vacancy last month: (f.v  > 0)
+        # - vacancy-free last month: (f.nv > 0)
+        inc = self._scratch("inc", bool)
+        dec = self._scratch("dec", bool)
+        np.greater(self.v, 0, out=inc)
+
         # deteremine whether wages increase, decrease or remain unchanged for
         # each firm:
         # if (open vacancy last month AND next month)   --> increase wages (+1)
         # if (previous vacancy-free months >= gamma AND
         #     no open vacancy next month)               --> decrease wages (-1)
         # otherwise                                     --> wages unchanged (0)
+        # - vacancy next month: (below == True)
+        np.logical_and(inc, below, out=inc)
+        np.greater_equal(self.nv, self._gamma, out=dec)
+        np.greater(dec, below, out=dec) # dec & ~below
+        if self._free:
+            # the slots of removed firms keep their wage
+            np.logical_and(dec, self.alive, out=dec)
+        prof = profiling.active()
+        if prof is not None:
+            prof.count("wages.up", inc)
+            prof.count("wages.down", dec)
 
-        # make sure data is consistent - only one of the following can be true:
-        # - open vacancy last month: (f.v  > 0)
-        # - vacancy-free last month: (f.nv > 0)
-        if (np.any((self.v > 0) & (self.nv > 0))):
-            n = 0
-            while (not (self.v[n] > 0) and (self.nv[n] > 0)):
-                n = n + 1
-            raise RuntimeError(f"Firm {n} had an open vacancy AND was vacancy-free last month")
+        if self.active is not None:
+            moved = self._scratch("w_moved", bool)
+            np.logical_or(inc, dec, out=moved)
+            ids = np.nonzero(moved)
+            if (len(ids[0]) <= self.active * moved.size):
+                self._adjust_wages_active(ids, inc)
+                return
 
-        new_v = (self.i < (self.i_phi_lower * self.d)) * 1
-        change_type =   ((self.v & new_v) * +1) + \
-                        (((self.nv >= self.gamma) & ~new_v) * -1)
+        # wage factor: 1 + (change_type * U(0, delta))
+        change = self._uniform(self._delta)
+        factor = self._scratch("w_factor")
+        factor.fill(1)
+        np.add(1, change, out=factor, where=inc)
+        np.subtract(1, change, out=factor, where=dec)
 
-        self.w = self.w * (1 + (change_type * np.random.uniform(0, self.delta, self.F)))
+        w = self._target("w")
+        self.w = np.multiply(self.w, factor, out=w)
 
-    def adjust_workforce(self):
+    def _adjust_wages_active(self, ids, inc):
         '''
-        See section 2.2 of [Lengnick 2012] for details:
+        Wage update of the firms `ids` (the result of `np.nonzero`) whose
+        wage changes: rises where `inc`, otherwise falls.  The arithmetic
+        matches `_adjust_wages` firm by firm.
+        '''
+        u = self._draws.next()[ids]
+        change = np.multiply(u, _take(self._delta, ids), out=np.empty(u.shape, self._float))
+        factor = np.subtract(1, change)
+        np.add(1, change, out=factor, where=inc[ids])
 
-        - First establish upper and lower limits for inventory
-        - If current inventory is below lower limit, open a new vacancy
-          condition: (f.i < (f.i_phi_lower * f.d))
-        - If current inventory is above uper limit, fire a randomly choosen employee
-          condition: (f.i > (f.i_phi_upper * f.d))
+        w = self._target("w")
+        if w is not self.w:
+            np.copyto(w, self.w)
+        w[ids] = np.multiply(self.w[ids], factor)
+        self.w = w
 
-        Each firm can hire/fire at most one employee per month (see footnote 18)
+    @profiling.timed("firms.workforce")
+    def _adjust_workforce(self, below, above):
+        '''
+        Workforce update given the inventory bound masks (see `adjust_workforce`).
         '''
-
-        # open vacancies
-        # - each firm can have at most 1 vacancy
-        self.v = ((self.i < (self.i_phi_lower * self.d)) * 1)
 
         # increment vacancy-free periods if no vacancy is open
         # !!!TEST REQUIRED!!!
-        self.nv = (self.v == 0) * (self.nv + 1)
+        nv = self._target("nv")
+        np.add(self.nv, 1, out=nv)
+        np.copyto(nv, 0, where=below)
+        if self._free:
+            # the slots of removed firms stay parked
+            np.multiply(nv, self.alive, out=nv)
+        self.nv = nv
+
+        # open vacancies
+        # - each firm can have at most 1 vacancy
+        v = self._target("v")
+        np.copyto(v, below)
+        self.v = v
 
         # fire employees
         # - each firm can fire at most 1 employee
         # - make sure employment is not less than zero (or one?)
-        # TODO: fired employees work for one more month
-        self.l = np.clip(self.l - ((self.i > (self.i_phi_upper * self.d)) * 1), 0, None)
+        # - the labor market chooses the fired employees, who work for
+        #   one more month (see `LaborMarket.give_notice`)
+        prof = profiling.active()
+        if prof is not None:
+            prof.count("workforce.vacancies", below)
+            prof.count("workforce.fired", above & (self.l > 0))
+        l = self._target("l")
+        np.subtract(self.l, above, out=l)
+        self.l = np.maximum(l, 0, out=l)
 
-    def adjust_prices(self):
+    @profiling.timed("firms.prices")
+    def _adjust_prices(self, below, above):
         '''
-        See section 2.2 of [Lengnick 2012] for details:
-
-        - First establish upper and lower limits for price
-          marginal costs: (self.l * self.w) / (self.l * self.t_lambda)
-        - Increase price if current inventory is less than inventory lower limit
-          condition:
-        - Decrease price if current inventory is greater then inventory upper limit
-          condition:
+        Price update given the inventory bound masks (see `adjust_prices`).
 
+        Only firms whose inventory is outside the bounds can change price;
+        for all other firms both price bounds equal the current price.  The
+        proposed price and its bounds are therefore only combined for the
+        firms with `change_type != 0` (`below` or `above`).
         '''
+        if self.active is not None:
+            changed = self._scratch("p_changed", bool)
+            np.logical_or(below, above, out=changed)
+            ids = np.nonzero(changed)
+            if (len(ids[0]) <= self.active * changed.size):
+                self._adjust_prices_active(ids, below)
+                return
 
-        # TODO: optimize these calculations
+        # calculate proposed price change: change_type * p * U(0, nu)
+        change = self._uniform(self._nu)
+        price_change = self._scratch("p_change")
+        np.multiply(self.p, change, out=price_change)
 
-        # deteremine whether prices increase, descrease or remain unchanged for each firm:
-        # if [inventory > upper limit] --> decrease price (-1)
-        # if [inventory < lower limit] --> increase price (+1)
-        # otherwise                    --> price unchanged (0)
-        change_type =   ((self.i > (self.i_phi_upper * self.d)) * -1) + \
-                        ((self.i < (self.i_phi_lower * self.d)) * +1)
+        # proposed price (before bounds)
+        # - increase  (change_type == 1): p + price_change
+        # - decrease  (change_type = -1): p - price_change
+        new_p = self._scratch("p_new")
+        np.copyto(new_p, self.p)
+        np.add(self.p, price_change, out=new_p, where=below)
+        np.subtract(self.p, price_change, out=new_p, where=above)
 
-        # calculate proposed price change
-        price_change = change_type * self.p * np.random.uniform(0, self.nu, self.F)
-
-        # calculate current marginal cost
+        # calculate current marginal cost (once)
         # [marginal cost] = [wages paid per worker] / [total output per worker]
-        marginal_cost = self.w / self.t_lambda
+        marginal_cost = self._scratch("p_mc")
+        np.divide(self.w, self._t_lambda, out=marginal_cost)
 
         # price lower bound
         # - increase  (change_type == 1): max(lb, p) - never lower price
-        # - no change (change_type == 0): p
         # - decrease  (change_type = -1): min(lb, p) - never raise price
-        p_lower_bound = (change_type  > 0) * np.maximum(self.p_phi_lower * marginal_cost, self.p) + \
-                        (change_type == 0) * self.p + \
-                        (change_type  < 0) * np.minimum(self.p_phi_lower * marginal_cost, self.p)
+        p_lower_bound = self._scratch("p_lower")
+        np.multiply(self._p_phi_lower, marginal_cost, out=p_lower_bound)
+        np.maximum(p_lower_bound, self.p, out=p_lower_bound, where=below)
+        np.minimum(p_lower_bound, self.p, out=p_lower_bound, where=above)
 
         # price upper bound
         # - increase  (change_type == 1): max(ub, p) - never lower price
-        # - no change (change_type == 0): p
         # - decrease  (change_type = -1): min(ub, p) - never raise price
-        p_upper_bound = (change_type  > 0) * np.maximum(self.p_phi_upper * marginal_cost, self.p) + \
-                        (change_type == 0) * self.p + \
-                        (change_type  < 0) * np.minimum(self.p_phi_upper * marginal_cost, self.p)
+        p_upper_bound = marginal_cost
+        np.multiply(self._p_phi_upper, marginal_cost, out=p_upper_bound)
+        np.maximum(p_upper_bound, self.p, out=p_upper_bound, where=below)
+        np.minimum(p_upper_bound, self.p, out=p_upper_bound, where=above)
 
-        # calculate proposed new price
-        new_p = np.clip(self.p + price_change, a_min=p_lower_bound, a_max=p_upper_bound)
+        # calculate proposed new price: clip to [lower bound, upper bound]
+        np.maximum(new_p, p_lower_bound, out=new_p)
+        np.minimum(new_p, p_upper_bound, out=new_p)
 
         # change price if price change is accepted
         # - only change price if random # is less than theta
-        new_price_accepted = ((np.random.uniform(0, 1, self.F)) <= self.theta)
-        self.p = (new_price_accepted * new_p) + (~new_price_accepted * self.p)
\ No newline at end of file
+        # - unchanged firms (change_type == 0) keep their price
+        accepted = self._scratch("p_accepted", bool)
+        np.less_equal(self._uniform(1), self._theta, out=accepted)
+        changed = self._scratch("p_changed", bool)
+        np.logical_or(below, above, out=changed)
+        np.logical_and(accepted, changed, out=accepted)
+        prof = profiling.active()
+        if prof is not None:
+            prof.count("prices.up", below)
+            prof.count("prices.down", above)
+            prof.count("prices.accepted", accepted)
+            prof.count("prices.rejected", changed.sum() - accepted.sum())
+
+        p = self._target("p")
+        if p is not self.p:
+            np.copyto(p, self.p)
+        np.copyto(p, new_p, where=accepted)
+        self.p = p
+
+    def _adjust_prices_active(self, ids, below):
+        '''
+        Price update of the firms `ids` (the result of `np.nonzero`) whose
+        inventory is outside the bounds: only the firms that accept their
+        price change are updated, with the arithmetic of `_adjust_prices`.
+        '''
+        # draws of the price change and its acceptance
+        u = self._draws.next()[ids]
+        accepted = np.less_equal(self._draws.next()[ids].astype(self._float, copy=False),
+                                 _take(self._theta, ids))
+        prof = profiling.active()
+        if prof is not None:
+            prof.count("prices.up", below)
+            prof.count("prices.down", len(ids[0]) - below[ids].sum())
+            prof.count("prices.accepted", accepted)
+            prof.count("prices.rejected", len(accepted) - accepted.sum())
+
+        ids = tuple(k[accepted] for k in ids)
+        n = len(ids[0])
+        up = below[ids]
+        down = ~up
+        p = self.p[ids]
+
+        # proposed price (before bounds)
+        change = np.multiply(u[accepted], _take(self._nu, ids), out=np.empty(n, self._float))
+        price_change = np.multiply(p, change, out=change)
+        new_p = np.subtract(p, price_change, out=np.empty(n, self._float))
+        np.add(p, price_change, out=new_p, where=up)
+
+        # price bounds
+        marginal_cost = np.divide(self.w[ids], _take(self._t_lambda, ids), out=np.empty(n, self._float))
+        p_lower_bound = np.multiply(_take(self._p_phi_lower, ids), marginal_cost, out=price_change)
+        np.maximum(p_lower_bound, p, out=p_lower_bound, where=up)
+        np.minimum(p_lower_bound, p, out=p_lower_bound, where=down)
+        p_upper_bound = np.multiply(_take(self._p_phi_upper, ids), marginal_cost, out=marginal_cost)
+        np.maximum(p_upper_bound, p, out=p_upper_bound, where=up)
+        np.minimum(p_upper_bound, p, out=p_upper_bound, where=down)
+
+        # clip to [lower bound, upper bound]
+        np.maximum(new_p, p_lower_bound, out=new_p)
+        np.minimum(new_p, p_upper_bound, out=new_p)
+
+        p = self._target("p")
+        if p is not self.p:
+            np.copyto(p, self.p)
+        p[ids] = new_p
+        self.p = p
+
+def _take(value, ids):
+    # the values of the firms `ids` of a property or parameter (parameters
+    # shared by all firms are single values)
+    return value if (value.ndim == 0) else value[ids]
+
+# the monthly updates of a view of the firms (see `Firms._run_sliced`)
+def _step_month(firms):
+    if (firms.engine == "numba"):
+        jit.step_month(firms, firms._draws.rows)
+        return
+    below = firms._below_lower()
+    above = firms._above_upper()
+    firms._adjust_wages(below)
+    firms._adjust_workforce(below, above)
+    firms._adjust_prices(below, above)
+
+def _produce(firms):
+    output = firms._scratch("output")
+    np.multiply(firms._t_lambda, firms.l, out=output)
+    i = firms._target("i")
+    firms.i = np.add(firms.i, output, out=i)
+
+def _adjust_wages(firms):
+    firms._adjust_wages(firms._below_lower())
+
+def _adjust_workforce(firms):
+    firms._adjust_workforce(firms._below_lower(), firms._above_upper())
+
+def _adjust_prices(firms):
+    firms._adjust_prices(firms._below_lower(), firms._above_upper())
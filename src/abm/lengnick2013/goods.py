@@ -0,0 +1,364 @@
+import numpy as np
+
+from .arrays import group_rank, shuffled_order
+from . import checkpoint
+from .rng import generators, get_state, set_state
+
+class TradingNetwork:
+    '''
+    The trading links ("type A connections") between households and firms
+    of [Lengnick 2013], stored as a compressed sparse row (CSR) matrix with
+    one row per household: the firms linked to household `h` are
+    `firm[indptr[h]:indptr[h+1]]`.
+    '''
+    def __init__(self, indptr, firm, F):
+        '''
+        Args:
+            indptr (numpy.ndarray): The H+1 row offsets
+            firm (numpy.ndarray): The firm of each link (column indices)
+            F (int): The number of firms
+        '''
+        self.indptr = indptr
+        self.firm = firm
+        self.F = F
+        self.H = len(indptr) - 1
+        # number of links of each household
+        self.degree = np.diff(indptr)
+        # household of each link (row indices)
+        self.household = np.repeat(np.arange(self.H), self.degree)
+
+    @classmethod
+    def random(cls, H, F, degree, rng):
+        '''
+        Create a network in which every household is linked to `degree`
+        distinct, randomly chosen firms.
+
+        Args:
+            H (int): The number of households
+            F (int): The number of firms
+            degree (int): The number of links of each household
+            rng (numpy.random.Generator): The generator used to pick firms
+        '''
+        if (degree > F):
+            raise ValueError(f"Can not link households to {degree} distinct firms out of {F}")
+
+        if (F <= 4 * degree):
+            # few firms - take the first firms of a random permutation
+            links = rng.permuted(np.tile(np.arange(F), (H, 1)), axis=1)[:, :degree]
+        else:
+            # many firms - redraw the links of households with duplicates
+            links = rng.integers(0, F, size=(H, degree))
+            while True:
+                s = np.sort(links, axis=1)
+                dup = (s[:, 1:] == s[:, :-1]).any(axis=1)
+                if not dup.any():
+                    break
+                links[dup] = rng.integers(0, F, size=(np.count_nonzero(dup), degree))
+
+        indptr = np.arange(H + 1) * degree
+        return cls(indptr, links.ravel(), F)
+
+    def links(self, households):
+        '''
+        Return the links of the given households.
+
+        Args:
+            households (numpy.ndarray): Household ids
+
+        Returns:
+            tuple: The link indices, and for each link the position of its
+                household in `households`
+        '''
+        degree = self.degree[households]
+        n = int(degree.sum())
+        seg = np.repeat(np.arange(len(households)), degree)
+        offset = np.arange(n) - np.repeat(np.cumsum(degree) - degree, degree)
+        return np.repeat(self.indptr[households], degree) + offset, seg
+
+    def linked(self, households, firm):
+        '''
+        Return whether each household is already linked to the matching
+        firm in `firm`.
+        '''
+        links, seg = self.links(households)
+        existing = seg * self.F + self.firm[links]
+        return np.isin(np.arange(len(households)) * self.F + firm, existing)
+
+    def mean(self, x):
+        '''
+        Return, for each household, the mean of the firm values `x` over
+        the firms it is linked to.
+        '''
+        return np.bincount(self.household, x[self.firm], minlength=self.H) / self.degree
+
+class GoodsMarket:
+    '''
+    The daily goods market of [Lengnick 2013] (section 2.1).
+
+    Every trading day each household tries to buy 1/21 of its planned
+    monthly consumption from the firms it is linked to, visiting them in a
+    random (cyclic) order.  Each visit is cleared for all households at
+    once: the quantities requested from each firm are summed with
+    `np.bincount` and, if a firm's inventory does not cover them, every
+    request to that firm is rationed in proportion.  Rationed households
+    move on to their next firm; links on which a household was rationed
+    are flagged in `rationed`.
+
+    At the end of the month the demand faced by each firm is written to
+    `Firms.d`.  At the start of the next month some households replace
+    trading partners (see `rewire`).
+    '''
+    # trading days per month
+    DAYS = 21
+
+    def __init__(self, firms, households, network=None, seed=None, degree=7):
+        '''
+        Args:
+            firms (Firms): The firms (without replicates)
+            households (Households): The households
+            network (TradingNetwork, optional):
+                 The trading links.  If `None` every household is linked to
+                 `degree` random firms.
+            seed (optional):
+                 Seed for the random visiting order (see `rng.generators`)
+            degree (int, optional):
+                 The number of trading links of each household for a new
+                 network ([Lengnick 2013] sets this to 7)
+        '''
+        if (firms.R is not None):
+            raise ValueError("The goods market does not support firms with replicates")
+        self.firms = firms
+        self.households = households
+        self.rng = generators(seed)[0]
+        if network is None:
+            network = TradingNetwork.random(households.H, firms.F, degree, self.rng)
+        self.network = network
+
+        # demand and sales of each firm during the current month
+        self.demand = np.zeros(firms.F)
+        self.sales = np.zeros(firms.F)
+        # links on which the household was rationed during the current month
+        # (as flags, and as the list of rationed links of each visit)
+        self.rationed = np.zeros(len(network.firm), dtype=bool)
+        self._rationed_links = []
+        # demand of each household left for the current day
+        self._need = np.zeros(households.H)
+
+    def state(self):
+        '''
+        Return the state of the goods market (the trading network, the
+        accumulators of the current month and the generator) as a dict of
+        arrays, without copying (see `Firms.state`).
+        '''
+        return {"indptr": self.network.indptr, "firm": self.network.firm,
+                "demand": self.demand, "sales": self.sales,
+                "rationed": self.rationed, "rationed_links": self.rationed_links(),
+                "meta": checkpoint.encode({"rng": get_state(self.rng)})}
+
+    @classmethod
+    def from_state(cls, arrays, firms, households):
+        '''
+        Return a goods market for `firms` and `households` restored from a
+        state returned by `state`.
+        '''
+        network = TradingNetwork(arrays["indptr"], arrays["firm"], firms.F)
+        market = cls(firms, households, network)
+        market.rng = set_state(checkpoint.decode(arrays["meta"])["rng"])
+        market.demand = arrays["demand"]
+        market.sales = arrays["sales"]
+        market.rationed = arrays["rationed"]
+        market._rationed_links = [arrays["rationed_links"]]
+        return market
+
+    def step_month(self):
+        '''
+        Run the goods market for one month:
+
+        - households replace some of their trading partners (see `rewire`)
+        - households plan their consumption given the average price of
+          the firms they are linked to
+        - firms produce and households buy on each of the trading days
+        - the demand faced by each firm is written to `Firms.d`
+        '''
+        self.rewire()
+        self.households.plan_consumption(self.network.mean(self.firms.p))
+        self.demand[:] = 0
+        self.sales[:] = 0
+        self.rationed[self.rationed_links()] = False
+        self._rationed_links = []
+
+        for day in range(self.DAYS):
+            self.firms.produce()
+            self.step_day()
+
+        self.firms.set_props({"d": self.demand})
+
+    def step_day(self):
+        '''
+        Clear one trading day: each household buys `c / DAYS` units (as far
+        as its liquidity allows) from the firms it is linked to.
+        '''
+        f, h, net = self.firms, self.households, self.network
+
+        need = self._need
+        np.divide(h.c, self.DAYS, out=need)
+
+        # each household starts at a random link and visits its links in
+        # order, until its demand for the day is met
+        start = self.rng.integers(0, np.maximum(net.degree, 1))
+        for k in range(int(net.degree.max(initial=0))):
+            buyers = np.flatnonzero((need > 0) & (h.m > 0) & (net.degree > k))
+            if (len(buyers) == 0):
+                break
+            link = net.indptr[buyers] + (start[buyers] + k) % net.degree[buyers]
+            firm = net.firm[link]
+            price = f.p[firm]
+
+            # quantity requested: remaining need, limited by liquidity
+            q = np.minimum(need[buyers], h.m[buyers] / price)
+            requested = np.bincount(firm, q, minlength=f.F)
+            self.demand += requested
+
+            # ration requests in proportion if inventory is short
+            available = np.maximum(f.i, 0)
+            short = requested > available
+            fill = np.ones(f.F)
+            np.divide(available, requested, out=fill, where=short)
+            bought = q * fill[firm]
+            spent = bought * price
+            rationed = link[short[firm]]
+            self.rationed[rationed] = True
+            self._rationed_links.append(rationed)
+
+            # settle the purchases
+            sold = np.bincount(firm, bought, minlength=f.F)
+            f.i -= sold
+            np.maximum(f.i, 0, out=f.i) # rounding of the rationed sales
+            f.m += np.bincount(firm, spent, minlength=f.F)
+            self.sales += sold
+            need[buyers] -= bought
+            h.m[buyers] -= spent
+
+    def add_firms(self, ids):
+        '''
+        Extend the monthly accumulators to the firms `ids` added by
+        `Firms.add_firms` (see `Economy.add_firms`).  The new firms start
+        without trading links and gain customers as households replace
+        trading partners (see `rewire`).
+        '''
+        n = self.firms.F - len(self.demand)
+        if (n > 0):
+            self.demand = np.concatenate([self.demand, np.zeros(n)])
+            self.sales = np.concatenate([self.sales, np.zeros(n)])
+        self.network.F = self.firms.F
+
+    def remove_firms(self, ids):
+        '''
+        Replace every trading link to the firms `ids` removed by
+        `Firms.remove_firms` (see `Economy.remove_firms`) by a link to
+        another firm, drawn as in `rewire`.
+        '''
+        net = self.network
+        dead = np.zeros(net.F, dtype=bool)
+        dead[ids] = True
+        links = np.flatnonzero(dead[net.firm])
+        if (len(links) == 0):
+            return
+        alive = np.count_nonzero(self.firms.alive)
+        if (net.degree.max() > alive):
+            raise ValueError(f"Can not link households to {net.degree.max()} distinct firms out of {alive}")
+
+        # one link per household at a time, so that the new partners of a
+        # household are distinct
+        household = net.household[links]
+        rank = group_rank(household)
+        candidates = self._sampler()
+        alive = np.flatnonzero(self.firms.alive)
+        for r in range(rank.max() + 1):
+            left = links[rank == r]
+            weighted = True
+            while (len(left) > 0):
+                if weighted:
+                    new = candidates(len(left))
+                else:
+                    # the firms left to a household may employ no one -
+                    # draw among all firms that have not been removed
+                    new = alive[self.rng.integers(0, len(alive), len(left))]
+                replace = ~net.linked(net.household[left], new)
+                net.firm[left[replace]] = new[replace]
+                left = left[~replace]
+                weighted = weighted and replace.any()
+
+        # households are no longer rationed on the replaced links
+        self.rationed[links] = False
+        rationed = self.rationed_links()
+        self._rationed_links = [rationed[self.rationed[rationed]]]
+
+    def _sampler(self):
+        '''
+        Return a function that draws `n` firms with probability proportional
+        to their size (`Firms.l`) - or uniformly among the firms that have
+        not been removed if no firm employs anyone.
+        '''
+        f, rng = self.firms, self.rng
+        size = np.cumsum(np.clip(f.l, 0, None), dtype=np.float64)
+        alive = np.flatnonzero(f.alive)
+        def candidates(n):
+            if (size[-1] <= 0):
+                return alive[rng.integers(0, len(alive), n)]
+            return np.searchsorted(size, rng.random(n) * size[-1], side="right")
+        return candidates
+
+    def rationed_links(self):
+        '''
+        Return the (distinct) links on which households were rationed during
+        the current month.
+        '''
+        if not self._rationed_links:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(self._rationed_links))
+
+    def rewire(self):
+        '''
+        See section 2.1 of [Lengnick 2013] for details:
+
+        - With probability psi_price a household compares its most expensive
+          trading partner with a new firm, and replaces it if the new firm's
+          price is lower by at least xi
+        - With probability psi_quant a household that was rationed during
+          the last month replaces one of the firms that failed to deliver
+          with a new firm
+
+        New firms are drawn with probability proportional to their size
+        (`Firms.l`) among the firms a household is not linked to.  Only the
+        replaced links are rewritten, in place, and the cost of a month is
+        proportional to the number of households that search.
+        '''
+        f, h, net = self.firms, self.households, self.network
+        rng = self.rng
+        candidates = self._sampler()
+
+        # price: replace the most expensive partner by a cheaper firm
+        n = rng.binomial(h.H, h.psi_price)
+        searching = rng.choice(h.H, n, replace=False)
+        links, seg = net.links(searching)
+        order = np.lexsort((-f.p[net.firm[links]], seg))
+        old = links[order[group_rank(seg[order]) == 0]]
+        # households without links have nothing to replace
+        searching = searching[np.unique(seg)]
+        new = candidates(len(searching))
+        cheaper = f.p[new] < f.p[net.firm[old]] * (1 - h.xi)
+        replace = cheaper & ~net.linked(searching, new)
+        net.firm[old[replace]] = new[replace]
+
+        # quantity: replace one of the partners that failed to deliver
+        links = self.rationed_links()
+        household = net.household[links]
+        order = shuffled_order(household, rng)
+        first = order[group_rank(household[order]) == 0]
+        links, household = links[first], household[first]
+        searching = rng.random(len(links)) < h.psi_quant
+        links, household = links[searching], household[searching]
+        new = candidates(len(links))
+        replace = ~net.linked(household, new)
+        net.firm[links[replace]] = new[replace]
@@ -0,0 +1,108 @@
+import numpy as np
+
+from . import checkpoint
+
+class Households:
+    '''
+    The households of [Lengnick 2013], stored as one array per property
+    (indexed by household id).
+    '''
+    # initialize households
+    def __init__(self, H):
+        '''
+        Args:
+            H (int): The number of households
+        '''
+
+        # initialize number of households
+        self.H = H
+
+        # initialize model parameters
+        # - See [Lengnick 2013] Table 1:
+        # number of firms visited by an unemployed household (beta)
+        self.beta = 5 # [Lengnick 2013] sets this to 5
+        # probability of an employed household searching for a better paid job (pi)
+        self.pi = 0.1 # [Lengnick 2013] sets this to 0.1
+        # monthly reduction of the reservation wage of unemployed households
+        self.chi = 0.1 # [Lengnick 2013] reduces the reservation wage by 10%
+        # exponent of the planned consumption (alpha)
+        self.alpha = 0.9 # [Lengnick 2013] sets this to 0.9
+        # probability of searching for a cheaper trading partner (psi_price)
+        self.psi_price = 0.25 # [Lengnick 2013] sets this to 0.25
+        # probability of replacing a trading partner that failed to deliver (psi_quant)
+        self.psi_quant = 0.25 # [Lengnick 2013] sets this to 0.25
+        # minimum relative price advantage of a new trading partner (xi)
+        self.xi = 0.01 # [Lengnick 2013] sets this to 0.01
+
+        # initial conditions (TBD)
+        # household reservation wage (w_h) - minimum acceptable wage
+        self.w_res = np.ones(self.H) # reservation wage set to 1 at start (?)
+        # household employer - id of the employing firm (-1 if unemployed)
+        self.employer = np.full(self.H, -1) # every household unemployed at start (?)
+        # household liquidity (m_h) - current "bank account" balance
+        self.m = np.zeros(self.H) # bank balance is zero at start (?)
+        # household planned consumption (c_h) - planned demand for the month
+        self.c = np.zeros(self.H) # no consumption planned at start (?)
+
+    # model parameters (see `state`)
+    _PARAMS = ("beta", "pi", "chi", "alpha", "psi_price", "psi_quant", "xi")
+    # household arrays
+    _ARRAYS = ("w_res", "employer", "m", "c")
+
+    def state(self):
+        '''
+        Return the state of the households as a dict of arrays, without
+        copying (see `Firms.state`).
+        '''
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        arrays["meta"] = checkpoint.encode({"H": self.H, **{name: getattr(self, name) for name in self._PARAMS}})
+        return arrays
+
+    @classmethod
+    def from_state(cls, arrays):
+        '''
+        Return households restored from a state returned by `state`.
+        '''
+        households = cls.__new__(cls)
+        for name, value in checkpoint.decode(arrays["meta"]).items():
+            setattr(households, name, value)
+        for name in cls._ARRAYS:
+            setattr(households, name, arrays[name])
+        return households
+
+    def employment(self, F):
+        '''
+        Return the number of households employed by each of `F` firms.
+        '''
+        return np.bincount(self.employer[self.employer >= 0], minlength=F)
+
+    def adjust_reservation_wages(self, w):
+        '''
+        See section 2.1 of [Lengnick 2013] for details:
+
+        - Employed households raise their reservation wage to their current
+          wage if it is higher
+        - Unemployed households reduce their reservation wage by chi
+
+        Args:
+            w (numpy.ndarray): The wage paid by each firm
+        '''
+        employed = (self.employer >= 0)
+        current = w[self.employer[employed]]
+        self.w_res[employed] = np.maximum(self.w_res[employed], current)
+        self.w_res[~employed] *= (1 - self.chi)
+
+    def plan_consumption(self, P):
+        '''
+        See section 2.1 of [Lengnick 2013] for details:
+
+        - Households plan to consume less than proportionally more when
+          their real liquidity grows: c = min((m / P)^alpha, m / P)
+
+        Args:
+            P (numpy.ndarray):
+                 The price level faced by each household (the average price
+                 of its trading partners)
+        '''
+        real = np.maximum(self.m, 0) / P
+        self.c = np.minimum(real ** self.alpha, real)
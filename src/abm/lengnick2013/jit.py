@@ -0,0 +1,110 @@
+'''
+Optional compiled engine for the monthly firm updates (see
+`Firms(engine="numba")`).
+
+The NumPy updates make one pass over memory per operation and keep their
+intermediate results in firm-length temporaries.  The kernel below updates
+each firm's vacancy, workforce, wage and price in a single loop over the
+firms, with no temporaries, and is compiled with Numba when it is
+installed.  Every intermediate result is rounded to the real dtype of the
+firms, like the scratch arrays of the NumPy updates, so that both engines
+give the same results for the same draws.
+'''
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+def available():
+    '''
+    Return `True` if Numba is installed.
+    '''
+    return numba is not None
+
+def step_month(firms, u, compiled=True):
+    '''
+    Run the monthly updates (see `Firms.step_month`) of `firms` in place,
+    given the three draws of the month `u` (wage change, price change and
+    price acceptance).  See `kernel` for `compiled`.
+    '''
+    shape = (-1, firms.shape[-1])
+    state = [getattr(firms, name).reshape(shape) for name in ("i", "d", "w", "p", "l", "v", "nv")]
+    alive = np.broadcast_to(firms.alive, firms.shape).reshape(shape)
+    params = [np.broadcast_to(getattr(firms, "_" + name), firms.shape).reshape(shape)
+              for name in ("gamma", "delta", "i_phi_lower", "i_phi_upper", "nu",
+                           "p_phi_lower", "p_phi_upper", "theta", "t_lambda")]
+    draws = [row.reshape(shape) for row in u]
+    kernel(firms._float, compiled)(*state, alive, *params, *draws)
+
+# compiled kernels by real dtype
+_kernels = {}
+
+def kernel(dtype, compiled=True):
+    '''
+    Return the monthly update kernel for firms with the real dtype `dtype`:
+    compiled with Numba if it is installed and `compiled` is `True`,
+    otherwise as a (slow) Python function.
+    '''
+    key = (np.dtype(dtype), compiled and available())
+    if key not in _kernels:
+        step = _make_kernel(np.dtype(dtype).type)
+        if key[1]:
+            step = numba.njit(nogil=True)(step)
+        _kernels[key] = step
+    return _kernels[key]
+
+def _make_kernel(real):
+    # `real` rounds each intermediate result to the real dtype of the firms
+    def step(i, d, w, p, l, v, nv, alive,
+             gamma, delta, i_phi_lower, i_phi_upper, nu, p_phi_lower, p_phi_upper, theta, t_lambda,
+             u_wage, u_price, u_accept):
+        rows, cols = i.shape
+        for r in range(rows):
+            for j in range(cols):
+                # inventory bounds
+                below = i[r, j] < i_phi_lower[r, j] * d[r, j]
+                above = i[r, j] > i_phi_upper[r, j] * d[r, j]
+
+                # wage
+                change = real(u_wage[r, j] * delta[r, j])
+                factor = real(1)
+                if (v[r, j] > 0) and below:
+                    factor = real(1 + change)
+                elif (nv[r, j] >= gamma[r, j]) and not below and alive[r, j]:
+                    factor = real(1 - change)
+                wage = real(w[r, j] * factor)
+                w[r, j] = wage
+
+                # workforce
+                if below:
+                    nv[r, j] = 0
+                    v[r, j] = 1
+                else:
+                    # the slots of removed firms stay parked
+                    nv[r, j] = nv[r, j] + 1 if alive[r, j] else 0
+                    v[r, j] = 0
+                l[r, j] = max(l[r, j] - 1, 0) if above else max(l[r, j], 0)
+
+                # price
+                if not (below or above):
+                    continue
+                price = p[r, j]
+                price_change = real(price * real(u_price[r, j] * nu[r, j]))
+                marginal_cost = real(wage / t_lambda[r, j])
+                lower = real(p_phi_lower[r, j] * marginal_cost)
+                upper = real(p_phi_upper[r, j] * marginal_cost)
+                if below:
+                    new_price = real(price + price_change)
+                    lower = max(lower, price)
+                    upper = max(upper, price)
+                else:
+                    new_price = real(price - price_change)
+                    lower = min(lower, price)
+                    upper = min(upper, price)
+                new_price = min(max(new_price, lower), upper)
+                if real(u_accept[r, j]) <= theta[r, j]:
+                    p[r, j] = new_price
+    return step
@@ -0,0 +1,280 @@
+import numpy as np
+
+from .arrays import group_rank, shuffled_order
+from . import checkpoint
+from .employment import Employment
+from .rng import generators, get_state, set_state
+
+class LaborMarket:
+    '''
+    The monthly labor market of [Lengnick 2013] (section 2.1), matching
+    households to the vacancies opened by firms.
+
+    Households are matched in batches: every searching household ranks the
+    firms it visits by wage offer, and all households apply to their best
+    remaining offer at once.  A firm with `v` open vacancies hires `v` of
+    its applicants at random and the rejected households move on to their
+    next offer.  Each batch is a sort over the applications, so a month
+    costs O(H log H) for H households.
+
+    The employees of each firm are indexed (see `Employment`), so firms
+    lay off randomly chosen employees in one vectorized step and
+    `Firms.l` is kept equal to the number of households employed by each
+    firm without recounting the labor force.  The index follows the
+    changes the labor market makes to `Households.employer`; call `sync`
+    after changing the employer ids in place.
+    '''
+    def __init__(self, firms, households, seed=None, notice=True):
+        '''
+        Args:
+            firms (Firms): The firms (without replicates)
+            households (Households): The households
+            seed (optional):
+                 Seed for the random search (see `rng.generators`)
+            notice (bool, optional):
+                 If `True` (the default) laid off employees work for one
+                 more month: they are given notice by the labor market and
+                 separated from their firm at the end of the month (see
+                 `separate`).  Otherwise they are laid off at once.
+        '''
+        if (firms.R is not None):
+            raise ValueError("The labor market does not support firms with replicates")
+        self.firms = firms
+        self.households = households
+        self.rng = generators(seed)[0]
+        self.notice = notice
+        # households given notice and the firms they leave (see `give_notice`)
+        self.pending = np.empty(0, dtype=np.int64)
+        self.pending_firm = np.empty(0, dtype=np.int64)
+        self._index(rebuild=True)
+
+    def state(self):
+        '''
+        Return the state of the labor market (its generator, the employee
+        index and the pending separations) as a dict of arrays (see
+        `Firms.state`).
+        '''
+        arrays = {"employment." + name: arr for name, arr in self.employment.state().items()}
+        arrays["pending"] = self.pending
+        arrays["pending_firm"] = self.pending_firm
+        arrays["meta"] = checkpoint.encode({"rng": get_state(self.rng), "notice": self.notice})
+        return arrays
+
+    @classmethod
+    def from_state(cls, arrays, firms, households):
+        '''
+        Return a labor market for `firms` and `households` restored from a
+        state returned by `state`.
+        '''
+        market = cls.__new__(cls)
+        market.firms = firms
+        market.households = households
+        meta = checkpoint.decode(arrays["meta"])
+        market.rng = set_state(meta["rng"])
+        market.notice = meta.get("notice", False)
+        if "pending" in arrays:
+            market.pending = arrays["pending"]
+            market.pending_firm = arrays["pending_firm"]
+            market.employment = Employment.from_state(checkpoint.prefixed(arrays, "employment."))
+            market._employer = households.employer
+        else:
+            market.pending = np.empty(0, dtype=np.int64)
+            market.pending_firm = np.empty(0, dtype=np.int64)
+            market._index(rebuild=True)
+        return market
+
+    def step(self):
+        '''
+        Run the labor market for one month:
+
+        - the separations still pending from last month take effect
+          (see `separate`)
+        - firms give notice to (or lay off) the employees they no longer
+          employ (see `Firms.adjust_workforce`)
+        - households adjust their reservation wages
+        - unemployed and job-switching households search for a job
+        - the workforce of each firm is updated
+        '''
+        self.separate()
+        if self.notice:
+            self.give_notice()
+        else:
+            self.layoffs()
+        self.households.adjust_reservation_wages(self.firms.w)
+        self.search()
+        self.firms.set_props({"l": self._index().count})
+
+    def sync(self):
+        '''
+        Rebuild the employee index from the employer ids of the households
+        and set the workforce of each firm to the number of households it
+        employs.
+        '''
+        self._index(rebuild=True)
+        self.firms.set_props({"l": self.employment.count})
+
+    def add_firms(self, ids):
+        '''
+        Make room in the employee index for the firms `ids` added by
+        `Firms.add_firms` (see `Economy.add_firms`).
+        '''
+        if (self.firms.F > self._index().F):
+            self.employment.resize(self.firms.F)
+
+    def remove_firms(self, ids):
+        '''
+        Lay off at once all employees of the firms `ids` removed by
+        `Firms.remove_firms` (see `Economy.remove_firms`).
+        '''
+        index = self._index()
+        self._separate(np.concatenate([index.employees(f) for f in ids] + [np.empty(0, dtype=np.int64)]))
+
+    def layoffs(self):
+        '''
+        Lay off randomly chosen employees of every firm that employs more
+        households than its workforce `Firms.l`.
+        '''
+        fired = self._excess()
+        self._separate(fired)
+
+    def give_notice(self):
+        '''
+        Give notice to randomly chosen employees of every firm that employs
+        more households than its workforce `Firms.l`: they keep working for
+        their firm until the end of the month (see `separate`).
+        '''
+        fired = self._excess()
+        self.pending = fired
+        self.pending_firm = self.households.employer[fired]
+
+    def separate(self):
+        '''
+        Separate the households given notice (see `give_notice`) from their
+        firms - unless they have moved to another firm since - and reduce
+        the workforce of those firms by the households that left.  Any
+        other change of the workforce made since the notice (e.g. by
+        `Firms.adjust_workforce`) is kept.
+        '''
+        if (len(self.pending) == 0):
+            return
+        h = self.households
+        staying = (h.employer[self.pending] == self.pending_firm)
+        self._separate(self.pending[staying])
+        left = np.bincount(self.pending_firm[staying], minlength=self.firms.F)
+        self.firms.set_props({"l": np.maximum(self.firms.l - left, 0)})
+        self.pending = np.empty(0, dtype=np.int64)
+        self.pending_firm = np.empty(0, dtype=np.int64)
+
+    def _excess(self):
+        '''
+        Return randomly chosen employees of every firm that employs more
+        households than its workforce `Firms.l` - as many as it employs in
+        excess - choosing at most one employee per firm at a time.
+        '''
+        index = self._index()
+        excess = index.count - self.firms.l
+        chosen = []
+        for k in range(max(int(excess.max(initial=0)), 0)):
+            firing = np.flatnonzero(excess > k)
+            chosen.append(index.pick(firing, self.rng.random(len(firing)), exclude=k))
+        return np.concatenate(chosen) if chosen else np.empty(0, dtype=np.int64)
+
+    def _separate(self, households):
+        # lay off employees
+        self._index().remove(households)
+        self.households.employer[households] = -1
+
+    def _index(self, rebuild=False):
+        '''
+        Return the employee index (see `Employment`), rebuilt if `rebuild`
+        is `True` or the employer ids of the households were replaced by
+        another array.
+        '''
+        h = self.households
+        if rebuild or (self._employer is not h.employer):
+            self.employment = Employment(h.employer, self.firms.F)
+            self._employer = h.employer
+        return self.employment
+
+    def search(self):
+        '''
+        See section 2.1 of [Lengnick 2013] for details:
+
+        - Unemployed households visit beta randomly chosen firms and accept
+          an open vacancy paying at least their reservation wage
+        - Employed households paid less than their reservation wage, and
+          other employed households with probability pi, visit one randomly
+          chosen firm and accept an open vacancy paying a higher wage than
+          their current one
+
+        Each firm fills at most `v` vacancies; the filled vacancies are
+        closed.
+        '''
+        f, h = self.firms, self.households
+        rng = self.rng
+
+        employed = (h.employer >= 0)
+        wage = np.zeros(h.H)
+        wage[employed] = f.w[h.employer[employed]]
+
+        # searching households - unemployed first
+        switch = employed & ((wage < h.w_res) | (rng.random(h.H) < h.pi))
+        unemployed = np.flatnonzero(~employed)
+        searchers = np.concatenate([unemployed, np.flatnonzero(switch)])
+        if (len(searchers) == 0):
+            return
+
+        # firms visited by each searching household
+        # - unemployed households visit beta firms, employed households one
+        beta = max(int(h.beta), 1)
+        visited = rng.integers(0, f.F, size=(len(searchers), beta))
+        valid = np.zeros(visited.shape, dtype=bool)
+        valid[:len(unemployed)] = True
+        valid[len(unemployed):, 0] = True
+
+        # acceptable offers
+        # - unemployed: offer >= reservation wage
+        # - employed:   offer >  current wage
+        offer = f.w[visited]
+        accept = np.where(employed[searchers], wage[searchers], h.w_res[searchers])
+        acceptable = valid & (f.v[visited] > 0)
+        acceptable &= np.where(employed[searchers, None], offer > accept[:, None], offer >= accept[:, None])
+
+        # rank the acceptable offers of each household - best first
+        order = np.argsort(np.where(acceptable, -offer, np.inf), axis=1, kind="stable")
+        visited = np.take_along_axis(visited, order, axis=1)
+        acceptable = np.take_along_axis(acceptable, order, axis=1)
+
+        # match households to vacancies in batches, one offer per household
+        # per batch
+        vacancies = np.clip(f.v, 0, None).astype(np.int64)
+        pending = np.arange(len(searchers))
+        hires, employers = [], []
+        for k in range(beta):
+            pending = pending[acceptable[pending, k]]
+            firm = visited[pending, k]
+            open_ = vacancies[firm] > 0
+            applicants, firm = pending[open_], firm[open_]
+            if (len(applicants) == 0):
+                break
+
+            # each firm hires applicants in random order until its
+            # vacancies are filled
+            order = shuffled_order(firm, rng)
+            applicants, firm = applicants[order], firm[order]
+            hired = group_rank(firm) < vacancies[firm]
+            hires.append(searchers[applicants[hired]])
+            employers.append(firm[hired])
+            vacancies -= np.bincount(firm[hired], minlength=f.F)
+
+            # rejected households try their next offer
+            pending = np.setdiff1d(pending, applicants[hired], assume_unique=True)
+
+        # households that switch jobs leave their current firm
+        if hires:
+            hires, employers = np.concatenate(hires), np.concatenate(employers)
+            index = self._index()
+            index.remove(hires)
+            index.add(hires, employers)
+            h.employer[hires] = employers
+        f.set_props({"v": vacancies})
@@ -0,0 +1,176 @@
+'''
+Opt-in timing and branch counters for the monthly updates.
+
+The firm updates and `Economy.step` time each of their phases and count
+the firms taking each branch of the updates (wage up/down, vacancy opened,
+employee fired, price up/down, price change accepted/rejected) into the
+active `Profile`, if there is one:
+
+    with Profile() as prof:
+        economy.run(120)
+    print(prof.summary())
+
+The phases are the public updates ("firms.step_month", "firms.produce",
+...), the wage, workforce and price kernels they run ("firms.wages",
+"firms.workforce", "firms.prices") and the parts of a month of an economy
+("economy.firms", "economy.labor", "economy.goods", "economy.pay",
+"economy.separations").
+Without an active profile each phase costs one global lookup (see `timed`
+and `phase`), so the instrumentation can stay in production runs.
+
+Phase times of updates that run in several threads (see `Firms`) add up
+the time spent in each thread.  The branches are not counted by the
+"numba" engine, nor by the worker processes of `ShardedFirms`.
+'''
+
+import functools
+import threading
+import time
+
+# the profile that records the phases and counters (see `Profile.enable`)
+_active = None
+
+def active():
+    '''
+    Return the active profile, or `None` if profiling is disabled.
+    '''
+    return _active
+
+def timed(name):
+    '''
+    Return a decorator that adds the time of each call of a function to
+    the phase `name` of the active profile (see `phase`).
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _Phase(_active, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def phase(name):
+    '''
+    Return a context manager that adds the time spent in its block to the
+    phase `name` of the active profile (and does nothing if profiling is
+    disabled).
+    '''
+    if _active is None:
+        return _DISABLED
+    return _Phase(_active, name)
+
+class Profile:
+    '''
+    Wall time and calls per phase, and counters, of the monthly updates.
+
+    Attributes:
+        times (dict): Maps each phase to its total time in seconds
+        calls (dict): Maps each phase to its number of calls
+        counts (dict): Maps each counter to its total
+    '''
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._previous = []
+
+    def enable(self):
+        '''
+        Make this profile the active profile (until `disable` is called).
+        '''
+        global _active
+        self._previous.append(_active)
+        _active = self
+
+    def disable(self):
+        '''
+        Restore the profile that was active before `enable` was called.
+        '''
+        global _active
+        _active = self._previous.pop()
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def add_time(self, name, seconds):
+        '''
+        Add one call that took `seconds` to the phase `name`.
+        '''
+        with self._lock:
+            self.times[name] = self.times.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n):
+        '''
+        Add `n` to the counter `name`: an int, or a boolean array whose
+        true elements are counted.
+        '''
+        n = int(n.sum()) if hasattr(n, "sum") else int(n)
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def reset(self):
+        '''
+        Clear all phases and counters.
+        '''
+        with self._lock:
+            self.times.clear()
+            self.calls.clear()
+            self.counts.clear()
+
+    def to_dict(self):
+        '''
+        Return the phases and counters as a JSON-compatible dict.
+        '''
+        return {"phases": {name: {"seconds": self.times[name], "calls": self.calls[name]}
+                           for name in self.times},
+                "counts": dict(self.counts)}
+
+    def summary(self):
+        '''
+        Return the phases (total and mean time, and calls) and counters as
+        a text table.
+        '''
+        lines = [f"{'phase':<24} {'calls':>9} {'total s':>11} {'mean ms':>11}"]
+        for name in sorted(self.times):
+            seconds, calls = self.times[name], self.calls[name]
+            lines.append(f"{name:<24} {calls:>9} {seconds:>11.4f} {seconds / calls * 1e3:>11.4f}")
+        if self.counts:
+            lines.append("")
+            lines.append(f"{'counter':<24} {'firms':>9}")
+            for name in sorted(self.counts):
+                lines.append(f"{name:<24} {self.counts[name]:>9}")
+        return "\n".join(lines)
+
+class _Phase:
+    # times one block of a phase (see `phase`)
+    __slots__ = ("profile", "name", "start")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile.add_time(self.name, time.perf_counter() - self.start)
+
+class _Disabled:
+    # the phase of a disabled profile - does nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_DISABLED = _Disabled()
@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+
+class Recorder:
+    '''
+    Records the monthly trajectories of selected firm properties to `.npy`
+    files, one per property (`<path>/<field>.npy`).
+
+    Each file is preallocated with one row per recorded month (shape
+    `(rows,) + Firms.shape`).  Rows are collected in a fixed-size block in
+    memory and written to the file, through a short-lived memory map, when
+    the block is full, so the writes are sequential and the memory used is
+    independent of the number of months.
+
+    Usage:
+
+        recorder = Recorder(path, economy.firms, T)
+        economy.run(T, recorder)
+        recorder.close()
+        p = Recorder.load(path)["p"]
+    '''
+    # fields recorded if none are requested
+    FIELDS = ("p", "w", "l", "i", "m")
+
+    def __init__(self, path, firms, T, fields=None, every=1, downcast=False, block=64):
+        '''
+        Args:
+            path (str): The directory of the `.npy` files (created if needed)
+            firms (Firms): The firms to record
+            T (int): The number of months that will be recorded
+            fields (optional): The properties to record (`Recorder.FIELDS`
+                 if `None`)
+            every (int or dict, optional):
+                 Record a property every `every` months, starting with the
+                 first; a dict maps properties to their own interval
+            downcast (bool, optional):
+                 If `True` floating point properties are stored as float32
+            block (int, optional):
+                 The number of rows kept in memory between writes
+        '''
+        fields = self.FIELDS if (fields is None) else tuple(fields)
+        for name in fields:
+            if name not in firms.dtypes:
+                raise ValueError(f"Unknown property '{name}'")
+        if not isinstance(every, dict):
+            every = {name: every for name in fields}
+        for name in fields:
+            if (every.get(name, 1) < 1):
+                raise ValueError(f"'every' must be at least 1, not {every[name]}")
+
+        self.path = path
+        self.T = T
+        self.fields = fields
+        self.every = {name: int(every.get(name, 1)) for name in fields}
+        self.block = block
+        # number of months seen, and number of rows recorded and written
+        # to disk per field
+        self.month = 0
+        self.rows = dict.fromkeys(fields, 0)
+        self._written = dict.fromkeys(fields, 0)
+
+        os.makedirs(path, exist_ok=True)
+        self._buffers = {}
+        for name in fields:
+            dtype = firms.dtypes[name]
+            if downcast and (dtype.kind == "f"):
+                dtype = np.dtype(np.float32)
+            shape = (-(-T // self.every[name]),) + firms.shape
+            np.lib.format.open_memmap(self._file(name), mode="w+", dtype=dtype, shape=shape)
+            self._buffers[name] = np.empty((max(min(block, shape[0]), 1),) + firms.shape, dtype)
+
+    def record(self, firms):
+        '''
+        Record the current state of `firms` (call once per month).
+        '''
+        if (self.month >= self.T):
+            raise ValueError(f"Can not record more than {self.T} months")
+        for name in self.fields:
+            if (self.month % self.every[name] == 0):
+                buf = self._buffers[name]
+                np.copyto(buf[self.rows[name] % len(buf)], getattr(firms, name), casting="same_kind")
+                self.rows[name] += 1
+                if (self.rows[name] % len(buf) == 0):
+                    self._flush(name)
+        self.month += 1
+
+    def close(self):
+        '''
+        Write the rows still held in memory to the files.
+        '''
+        for name in self.fields:
+            self._flush(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def load(path, fields=None):
+        '''
+        Open recorded trajectories as read-only memory maps.
+
+        Returns:
+            dict: Maps each property to an array of shape
+                (rows,) + Firms.shape
+        '''
+        if fields is None:
+            fields = sorted(f[:-4] for f in os.listdir(path) if f.endswith(".npy"))
+        return {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in fields}
+
+    def _file(self, name):
+        return os.path.join(self.path, name + ".npy")
+
+    def _flush(self, name):
+        '''
+        Write the rows of the block of `name` that are not on disk yet.
+        '''
+        buf = self._buffers[name]
+        start, stop = self._written[name], self.rows[name]
+        if (start == stop):
+            return
+        # the unwritten rows never wrap around the block
+        offset = start % len(buf)
+        out = np.lib.format.open_memmap(self._file(name), mode="r+")
+        out[start:stop] = buf[offset:offset + stop - start]
+        out.flush()
+        del out
+        self._written[name] = stop
@@ -0,0 +1,250 @@
+import numpy as np
+
+def generators(seed, R=None):
+    '''
+    Create the random generators for a set of firms.
+
+    Args:
+        seed (int, numpy.random.SeedSequence or numpy.random.Generator):
+             The seed (or generator) for the random draws.
+        R (int, optional):
+             The number of replicates.  If `None` a single generator is
+             created; otherwise `R` independent generators are spawned
+             from `seed`.
+
+    Returns:
+        list of numpy.random.Generator
+    '''
+    if isinstance(seed, np.random.Generator):
+        return [seed] if (R is None) else seed.spawn(R)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = [seed] if (R is None) else seed.spawn(R)
+    return [np.random.default_rng(s) for s in seeds]
+
+def get_state(rng):
+    '''
+    Return the state of a generator as a JSON-compatible dict, or the state
+    of the global `numpy.random` functions if `rng` is `None`.
+    '''
+    if rng is None:
+        state = np.random.get_state(legacy=False)
+    else:
+        state = rng.bit_generator.state
+    return _to_json(state)
+
+def set_state(state):
+    '''
+    Return a generator restored from a state returned by `get_state` (or
+    restore the global `numpy.random` functions if the state is theirs).
+    '''
+    if state.get("global"):
+        state = dict(state)
+        del state["global"]
+        state["state"]["key"] = np.asarray(state["state"]["key"], dtype=np.uint32)
+        np.random.set_state(state)
+        return None
+    bitgen = getattr(np.random, state["bit_generator"])()
+    bitgen.state = state
+    return np.random.Generator(bitgen)
+
+def _to_json(state):
+    # generator states hold ints (and for MT19937 an array of keys)
+    if "key" in state.get("state", {}):
+        state = {**state, "global": True,
+                 "state": {**state["state"], "key": state["state"]["key"].tolist()}}
+    return state
+
+class UniformStream:
+    '''
+    A stream of uniform [0, 1) random draws for a set of firms.
+
+    Each call to `next()` returns one draw per firm (in every replicate).
+    Draws are generated `rows` at a time into a buffer that is reused for
+    the lifetime of the stream, so the per-call generator overhead is paid
+    once per block.  Each replicate consumes its generator sequentially,
+    which makes the draws independent of the block size.
+
+    A stream can also produce only the draws of a span of the firms (see
+    `span`): it skips the draws of the other firms by advancing its
+    generators, so the draws of each firm are the same as in the stream of
+    all firms.
+    '''
+    def __init__(self, F, R=None, seed=None, rows=1, span=None):
+        '''
+        Args:
+            F (int): The number of firms
+            R (int, optional): The number of replicates
+            seed (optional):
+                 Seed for the draws (see `generators`).  If `None` and `R`
+                 is `None` the draws come from the global `numpy.random`
+                 functions; with replicates each replicate is seeded from
+                 fresh entropy.
+            rows (int, optional):
+                 The number of draws (per firm) generated at a time.
+            span (tuple, optional):
+                 The range `(start, stop)` of the firms to draw for (all
+                 firms if `None`).  Needs a seed, and generators that can
+                 be advanced (e.g. PCG64, the default).
+        '''
+        self.F = F
+        self.R = R
+        self.rows = rows
+        self.span = (0, F) if (span is None) else (int(span[0]), int(span[1]))
+
+        if (seed is None) and (R is None):
+            self.rngs = None
+        else:
+            self.rngs = generators(seed, R)
+
+        if (self.span != (0, F)):
+            if not self.seekable():
+                raise ValueError("A span of the draws needs a seed and generators that can be advanced")
+            # skip the draws of the firms before the span
+            for rng in self.rngs:
+                rng.bit_generator.advance(self.span[0])
+
+        # buffer of pre-generated draws: (stream, row, firm)
+        n = 1 if (R is None) else R
+        self.buffer = np.empty((n, rows, self.span[1] - self.span[0]))
+        # the array that holds the buffer (see `resize`)
+        self._storage = self.buffer
+        # next row to hand out - the buffer starts out used up
+        self.cursor = rows
+
+    def state(self):
+        '''
+        Return the state of the stream: a dict with the draw buffer and the
+        position and generator states (see `rng.get_state`).
+        '''
+        rngs = [None] if (self.rngs is None) else self.rngs
+        return {"buffer": self.buffer,
+                "position": {"F": self.F, "R": self.R, "rows": self.rows, "cursor": self.cursor,
+                             "span": self.span,
+                             "rngs": [get_state(rng) for rng in rngs]}}
+
+    @classmethod
+    def from_state(cls, state):
+        '''
+        Return a stream restored from a state returned by `state`; the
+        buffer is used without copying.
+        '''
+        pos = state["position"]
+        stream = cls.__new__(cls)
+        stream.F, stream.R, stream.rows = pos["F"], pos["R"], pos["rows"]
+        stream.span = tuple(pos.get("span", (0, pos["F"])))
+        rngs = [set_state(s) for s in pos["rngs"]]
+        stream.rngs = None if (rngs == [None]) else rngs
+        stream.buffer = state["buffer"]
+        stream._storage = stream.buffer
+        stream.cursor = pos["cursor"]
+        return stream
+
+    def seekable(self):
+        '''
+        Return `True` if the stream is seeded and all its generators can be
+        advanced (e.g. PCG64, the default), so draws can be generated ahead
+        (see `peek`), skipped and returned (see `resize`).
+        '''
+        return (self.rngs is not None) and all(hasattr(rng.bit_generator, "advance") for rng in self.rngs)
+
+    def next(self):
+        '''
+        Return the next draw for every firm.
+
+        The returned array is a view into the stream buffer and is only
+        valid until the next call to `next()`.
+        '''
+        if (self.cursor == self.rows):
+            self._fill()
+            self.cursor = 0
+        c = self.cursor
+        self.cursor = c + 1
+        return self.buffer[0, c] if (self.R is None) else self.buffer[:, c]
+
+    def peek(self, k, start, stop, out):
+        '''
+        Write the next `k` draws of the firms `start:stop` to `out` (shape
+        `(k, stop - start)`, or `(k, R, stop - start)` with replicates)
+        without consuming them (see `skip`).
+
+        Draws that are not buffered yet are generated by advancing copies
+        of the generators to the firms, which needs a seekable stream; the
+        stream itself is not changed, so several threads can peek at the
+        same time.
+
+        Returns:
+            numpy.ndarray: `out`
+        '''
+        n = stop - start
+        buffered = min(k, self.rows - self.cursor)
+        for j in range(buffered):
+            row = self.cursor + j
+            out[j] = self.buffer[0, row, start:stop] if (self.R is None) else self.buffer[:, row, start:stop]
+        if (buffered == k):
+            return out
+        if not self.seekable():
+            raise ValueError("Can not generate draws ahead without a seed and generators that can be advanced")
+        for r, rng in enumerate(self.rngs):
+            bitgen = type(rng.bit_generator)()
+            bitgen.state = rng.bit_generator.state
+            bitgen.advance(start)
+            copy = np.random.Generator(bitgen)
+            for j in range(buffered, k):
+                copy.random(out=(out[j] if (self.R is None) else out[j, r]))
+                bitgen.advance(self.F - n)
+        return out
+
+    def skip(self, k):
+        '''
+        Consume the next `k` draws of every firm (see `peek`).
+        '''
+        buffered = min(k, self.rows - self.cursor)
+        self.cursor += buffered
+        if (k > buffered):
+            if not self.seekable():
+                raise ValueError("Can not skip draws without a seed and generators that can be advanced")
+            for rng in self.rngs:
+                rng.bit_generator.advance((k - buffered) * self.F)
+
+    def resize(self, F):
+        '''
+        Change the number of firms to `F`.
+
+        The buffered draws that were not handed out yet are returned to
+        the generators, so the draws after a resize do not depend on the
+        number of rows generated at a time; a seeded stream with buffered
+        draws must therefore be seekable (see `seekable`).  The buffer is
+        a view of an array whose capacity doubles when it runs out.
+        '''
+        if (self.span != (0, self.F)):
+            raise ValueError("A span of the draws can not be resized")
+        unused = self.rows - self.cursor
+        if unused and (self.rngs is not None):
+            if not self.seekable():
+                raise ValueError("Can not return buffered draws to generators that can not be advanced")
+            for rng in self.rngs:
+                rng.bit_generator.advance(-unused * self.F)
+        if (F > self._storage.shape[-1]):
+            self._storage = np.empty(self.buffer.shape[:-1] + (max(F, 2 * self._storage.shape[-1]),))
+        self.F = F
+        self.span = (0, F)
+        self.buffer = self._storage[..., :F]
+        self.cursor = self.rows
+
+    def _fill(self):
+        # generate the next block of draws for each replicate
+        if (self.rngs is None):
+            self.buffer[0] = np.random.random_sample(self.buffer.shape[1:])
+        else:
+            skip = self.F - (self.span[1] - self.span[0])
+            for rng, rows in zip(self.rngs, self.buffer):
+                if (skip == 0) and rows.flags.c_contiguous:
+                    rng.random(out=rows)
+                    continue
+                # one row per month - skip the draws of the firms after
+                # the span and before it in the next row
+                for row in rows:
+                    rng.random(out=row)
+                    if skip:
+                        rng.bit_generator.advance(skip)
@@ -0,0 +1,265 @@
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import checkpoint
+from . import firms as firms_module
+from . import profiling
+from .firms import Firms
+from .rng import UniformStream
+
+class ShardedFirms(Firms):
+    '''
+    Firms whose monthly updates run in parallel in worker processes.
+
+    The firm arrays live in shared memory (`multiprocessing.shared_memory`)
+    and the firm index range is split into `shards` contiguous slices, one
+    per worker process.  Each worker runs the monthly kernels (`step_month`,
+    the `adjust_*` methods and `produce`) on its slice, in place, and draws
+    the random numbers of its slice only (see `UniformStream`): the draws
+    of each firm are the same for every number of shards, so for a given
+    seed the results are identical to those of `Firms(F, seed=seed,
+    inplace=True)` for any number of shards.
+
+    Everything else - properties, `set_prop`/`set_props`, the invariant
+    checks and cross-firm reductions such as the labor and goods markets -
+    runs in the calling process on the shared arrays.  A property that is
+    rebound to a new array (e.g. by `set_props`) is copied back into shared
+    memory before the next monthly update.
+
+    The number of firm slots is fixed when the workers are started: firms
+    can be removed (see `remove_firms`), but `add_firms` can only reuse
+    the slots of removed firms and raises a `ValueError` if it needs more.
+
+    Sharded firms can not be checkpointed (see `state`).  Call `close()`
+    (or use the firms as a context manager) to stop the workers and release
+    the shared memory.
+    '''
+    def __init__(self, F, shards, R=None, seed=None, block=None, dtypes="default"):
+        '''
+        Args:
+            F (int): The number of firms
+            shards (int): The number of worker processes
+            R (int, optional): The number of replicates (see `Firms`)
+            seed (optional):
+                 Seed for the random draws (see `Firms`); fresh entropy if
+                 `None`
+            block (int, optional): See `Firms`
+            dtypes (str or dict, optional): See `Firms`
+        '''
+        if seed is None:
+            # every worker draws from the same seed
+            seed = np.random.SeedSequence()
+        super().__init__(F, R, None, block=None, inplace=True, dtypes=dtypes)
+        # the draws are made by the workers
+        self._draws = None
+
+        # shared memory blocks and the shared arrays of the properties
+        self._shm = {}
+        self._shared = {}
+        self._sync()
+
+        bounds = np.linspace(0, F, shards + 1).astype(int)
+        self.bounds = bounds
+        ctx = multiprocessing.get_context()
+        self._workers = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            conn, child = ctx.Pipe()
+            spec = {"F": F, "R": R, "seed": seed, "block": block, "span": (int(start), int(stop)),
+                    "dtypes": {name: dt.str for name, dt in self.dtypes.items()},
+                    "shared": {name: shm.name for name, shm in self._shm.items()},
+                    "params": self._params()}
+            process = ctx.Process(target=_worker, args=(child, spec), daemon=True)
+            process.start()
+            child.close()
+            self._workers.append((process, conn))
+        self._finalizer = weakref.finalize(self, _shutdown, self._workers, list(self._shm.values()))
+
+    @profiling.timed("firms.step_month")
+    def step_month(self):
+        if firms_module._checked:
+            self.check_invariants()
+        self._run("step_month")
+
+    @profiling.timed("firms.adjust_wages")
+    def adjust_wages(self):
+        if firms_module._checked:
+            self.check_invariants()
+        self._run("adjust_wages")
+
+    @profiling.timed("firms.adjust_workforce")
+    def adjust_workforce(self):
+        if firms_module._checked:
+            self.check_invariants()
+        self._run("adjust_workforce")
+
+    @profiling.timed("firms.adjust_prices")
+    def adjust_prices(self):
+        if firms_module._checked:
+            self.check_invariants()
+        self._run("adjust_prices")
+
+    @profiling.timed("firms.produce")
+    def produce(self):
+        self._run("produce")
+
+    def state(self):
+        '''
+        Sharded firms can not be checkpointed (see `Economy.save`): the
+        random draws live in the worker processes.  Raises a `TypeError`.
+        '''
+        raise TypeError("Sharded firms can not be checkpointed - their random draws live in the "
+                        "worker processes; checkpoint Firms(F, seed=seed, inplace=True) instead, "
+                        "which give the same results")
+
+    def close(self):
+        '''
+        Stop the workers and release the shared memory.  The firm arrays
+        are copied to private memory first, so they remain readable.
+        '''
+        if not self._finalizer.alive:
+            return
+        for name, shared in self._shared.items():
+            attr = self._attr(name)
+            if getattr(self, attr) is shared:
+                setattr(self, attr, shared.copy())
+        self._shared = {}
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, method):
+        '''
+        Run the monthly update `method` on every shard and wait for the
+        workers to finish.
+        '''
+        if not self._finalizer.alive:
+            raise RuntimeError("The workers of the sharded firms have been stopped")
+        shared = self._sync()
+        params = self._params()
+        for process, conn in self._workers:
+            conn.send((method, params, shared, self._free))
+        errors = [conn.recv() for process, conn in self._workers]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def _grow(self, F):
+        raise ValueError(f"Sharded firms have a fixed number of slots ({self.F}) - "
+                         "only the slots of removed firms can be reused")
+
+    @staticmethod
+    def _attr(name):
+        # attribute that stores the property `name`
+        return ("_" + name) if (name in Firms._PARAMS) else name
+
+    def _params(self):
+        # parameters shared by all firms (stored as single values)
+        params = {}
+        for name in self._PARAMS:
+            value = getattr(self, self._attr(name))
+            if (value.ndim == 0):
+                params[name] = value.item()
+        return params
+
+    def _sync(self):
+        '''
+        Copy the properties that were rebound to new arrays into shared
+        memory, and return the shared memory blocks of those properties.
+        '''
+        shared = {}
+        for name in (*self.dtypes, "alive"):
+            attr = self._attr(name)
+            value = getattr(self, attr)
+            if (value is self._shared.get(name)) or (value.ndim == 0):
+                continue
+            if name not in self._shm:
+                # the alive mask is shared by the replicates
+                shape, dtype = (value.shape, value.dtype) if (name == "alive") else (self.shape, self.dtypes[name])
+                size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+                shm = self._shm[name] = shared_memory.SharedMemory(create=True, size=size)
+                self._shared[name] = np.ndarray(shape, dtype, buffer=shm.buf)
+                if hasattr(self, "_finalizer"):
+                    # release the new block with the others
+                    self._finalizer.detach()
+                    self._finalizer = weakref.finalize(self, _shutdown, self._workers, list(self._shm.values()))
+            np.copyto(self._shared[name], value)
+            setattr(self, attr, self._shared[name])
+            shared[name] = self._shm[name].name
+        return shared
+
+def _worker(conn, spec):
+    '''
+    Run the monthly updates of one shard (in a worker process) until the
+    firms are closed.
+    '''
+    firms_module.set_checked(False)
+    start, stop = spec["span"]
+    R = spec["R"]
+    shape = (spec["F"],) if (R is None) else (R, spec["F"])
+    dtypes = {name: np.dtype(dt) for name, dt in spec["dtypes"].items()}
+    dtypes["alive"] = np.dtype(bool)
+    blocks = {}
+
+    def attach(name, shm_name):
+        # the slice of the shard of a shared array
+        if name not in blocks or blocks[name].name != shm_name:
+            blocks[name] = shared_memory.SharedMemory(name=shm_name)
+        return np.ndarray(shape[-1:] if (name == "alive") else shape, dtypes[name],
+                          buffer=blocks[name].buf)[..., start:stop]
+
+    rows = 1 if (spec["block"] is None) else spec["block"] * Firms.DRAWS_PER_MONTH
+    draws = UniformStream(spec["F"], R, spec["seed"], rows, span=(start, stop)).state()
+    arrays = {name: attach(name, shm_name) for name, shm_name in spec["shared"].items()}
+    for name, value in spec["params"].items():
+        arrays[name] = np.asarray(value, dtype=dtypes[name])
+    arrays["draws"] = draws["buffer"]
+    arrays["meta"] = checkpoint.encode({"F": stop - start, "R": R, "inplace": True,
+                                        "dtypes": spec["dtypes"], "draws": draws["position"]})
+    firms = Firms.from_state(arrays)
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        method, params, shared, free = message
+        try:
+            for name, shm_name in shared.items():
+                setattr(firms, ShardedFirms._attr(name), attach(name, shm_name))
+            firms._free = [k - start for k in free if (start <= k < stop)]
+            for name, value in params.items():
+                setattr(firms, "_" + name, np.asarray(value, dtype=dtypes[name]))
+            getattr(firms, method)()
+            conn.send(None)
+        except Exception as error:
+            conn.send(error)
+
+    del firms, arrays
+    for block in blocks.values():
+        block.close()
+
+def _shutdown(workers, blocks):
+    # stop the workers and release the shared memory
+    for process, conn in workers:
+        try:
+            conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for process, conn in workers:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+        conn.close()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # arrays still refer to the block - it is released with them
+            pass
+        block.unlink()
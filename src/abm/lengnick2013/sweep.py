@@ -0,0 +1,165 @@
+import concurrent.futures
+import itertools
+import json
+import os
+
+import numpy as np
+
+from .aggregates import Aggregates
+from .economy import Economy
+
+class Sweep:
+    '''
+    A parameter sweep: runs of `Economy.create(F, H, ...)` for every point
+    of a grid of firm parameters and `seeds` seeds per point, spread over a
+    pool of worker processes.
+
+    The seed of each run is spawned from the seed of the sweep by its
+    position in the sweep (point, seed index), so the results do not depend
+    on the number of workers or on the order in which the runs finish.
+
+    The results are the monthly macro aggregates of each run (see
+    `Aggregates`), written by the workers directly into one `.npy` file
+    per series (`<path>/<series>.npy`, shape `(points, seeds, T)`); only
+    the run parameters and seeds are sent to the workers.  Completed runs
+    are flagged in `<path>/done.npy`, so a sweep that was interrupted can
+    be resumed by running it again: the completed runs are skipped.
+    '''
+    def __init__(self, path, grid, seeds, T, F, H, seed=None, **options):
+        '''
+        Args:
+            path (str): The directory of the results (created if needed)
+            grid (dict or list):
+                 The points of the sweep: a dict mapping firm parameters to
+                 lists of values (every combination is a point) or a list of
+                 dicts of parameter values
+            seeds (int): The number of runs (seeds) per point
+            T (int): The number of months of each run
+            F (int): The number of firms
+            H (int): The number of households
+            seed (optional):
+                 Seed of the sweep (an int, or `None` for fresh entropy)
+            options: Further arguments for `Economy.create`
+        '''
+        if isinstance(grid, dict):
+            names = list(grid)
+            points = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+        else:
+            points = [dict(point) for point in grid]
+
+        self.path = path
+        config = {
+            "points": points,
+            "seeds": seeds, "T": T, "F": F, "H": H,
+            "options": options,
+            "entropy": np.random.SeedSequence(seed).entropy,
+        }
+        # JSON round trip - numpy scalars become plain numbers and tuples
+        # lists, as in the saved configuration of a resumed sweep
+        self.config = json.loads(json.dumps(config, default=_to_python))
+
+        os.makedirs(path, exist_ok=True)
+        config = os.path.join(path, "sweep.json")
+        if os.path.exists(config):
+            with open(config) as fh:
+                previous = json.load(fh)
+            if (seed is None):
+                # resume with the entropy of the interrupted sweep
+                self.config["entropy"] = previous["entropy"]
+            if (previous != self.config):
+                raise ValueError(f"{path} holds the results of a different sweep")
+        else:
+            shape = (len(points), seeds)
+            for name in Aggregates.SERIES:
+                out = np.lib.format.open_memmap(self._file(name), mode="w+", dtype=np.float64, shape=shape + (T,))
+                out.fill(np.nan)
+                del out
+            np.lib.format.open_memmap(self._file("done"), mode="w+", dtype=bool, shape=shape)
+            with open(config, "w") as fh:
+                json.dump(self.config, fh)
+
+    @property
+    def points(self):
+        return self.config["points"]
+
+    def pending(self):
+        '''
+        Return the (point, seed index) pairs of the runs not completed yet.
+        '''
+        done = np.load(self._file("done"))
+        return [tuple(int(k) for k in run) for run in np.argwhere(~done)]
+
+    def run(self, workers=None):
+        '''
+        Run the pending runs of the sweep.
+
+        Args:
+            workers (int, optional):
+                 The number of worker processes (`None` for the number of
+                 CPUs); with 0 the runs are executed in this process
+
+        Returns:
+            int: The number of runs executed
+        '''
+        pending = self.pending()
+        seeds = np.random.SeedSequence(self.config["entropy"]).spawn(len(self.points) * self.config["seeds"])
+        tasks = [(self.path, self.config, point, k, seeds[point * self.config["seeds"] + k])
+                 for point, k in pending]
+
+        done = np.lib.format.open_memmap(self._file("done"), mode="r+")
+        try:
+            if (workers == 0):
+                for task in tasks:
+                    done[_run(*task)] = True
+                    done.flush()
+            else:
+                with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                    futures = [pool.submit(_run, *task) for task in tasks]
+                    for future in concurrent.futures.as_completed(futures):
+                        done[future.result()] = True
+                        done.flush()
+        finally:
+            del done
+        return len(tasks)
+
+    def results(self):
+        '''
+        Return the results as read-only memory maps: a dict mapping each
+        series of `Aggregates.SERIES` to an array of shape
+        `(points, seeds, T)` (nan for runs not completed yet), and "done"
+        to the flags of the completed runs (shape `(points, seeds)`).
+        '''
+        done = np.load(self._file("done"))
+        results = {}
+        for name in Aggregates.SERIES:
+            results[name] = np.load(self._file(name), mmap_mode="r")
+        results["done"] = done
+        return results
+
+    def _file(self, name):
+        return os.path.join(self.path, name + ".npy")
+
+def _run(path, config, point, k, seed):
+    '''
+    Execute one run of a sweep and write its aggregates to the result
+    files.
+
+    Returns:
+        tuple: The (point, seed index) of the run
+    '''
+    economy = Economy.create(config["F"], config["H"], seed, config["points"][point], **config["options"])
+    aggregates = Aggregates(economy.firms, config["T"], quantiles=())
+    economy.run(config["T"], aggregates)
+
+    for name in Aggregates.SERIES:
+        out = np.lib.format.open_memmap(os.path.join(path, name + ".npy"), mode="r+")
+        out[point, k] = aggregates.series[name]
+        out.flush()
+        del out
+    return point, k
+
+def _to_python(value):
+    # JSON encoding of numpy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Can not encode a value of type '{type(value).__name__}'")
@@ -0,0 +1,13 @@
+import pytest
+
+import abm.lengnick2013.firms as firms
+
+@pytest.fixture(autouse=True)
+def checked():
+    '''
+    Run every test with the firm invariant checks enabled, whatever the
+    ABM_CHECKED environment setting.
+    '''
+    previous = firms.set_checked(True)
+    yield
+    firms.set_checked(previous)
@@ -0,0 +1,22 @@
+import numpy as np
+
+def configure_random_state(f, seed):
+    """
+    Populate the state of a set of firms with random values so that every
+    branch of the monthly updates (vacancy opened/closed, wage up/down,
+    price up/down/unchanged) is exercised.
+
+    Args:
+        f (Firms object) - the object holding the firms (with or without
+           replicates)
+        seed (int) - seed for the state generator
+    """
+    rng = np.random.default_rng(seed)
+    d = rng.integers(1, 10, f.shape)
+    i = rng.integers(0, 12, f.shape)
+    w = rng.uniform(0.5, 1.5, f.shape)
+    p = rng.uniform(0.5, 1.5, f.shape)
+    l = rng.integers(0, 3, f.shape)
+    v = rng.integers(0, 2, f.shape)
+    nv = (v == 0) * rng.integers(0, 30, f.shape)
+    f.set_props({"d": d, "i": i, "w": w, "p": p, "l": l, "v": v, "nv": nv})
@@ -0,0 +1,106 @@
+import pytest
+import tracemalloc
+
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.aggregates as aggregates
+
+def test_welford():
+    x = np.random.default_rng(0).normal(3, 2, size=(100, 4))
+    acc = aggregates.Welford(4)
+    assert np.all(np.isnan(acc.var))
+    for row in x:
+        acc.update(row)
+    assert np.allclose(acc.mean, x.mean(axis=0))
+    assert np.allclose(acc.var, x.var(axis=0, ddof=1))
+
+def test_record():
+    '''
+    Test the aggregates against direct reductions of the firm arrays.
+    '''
+    T = 6
+    f = firms.Firms(50, seed=0)
+    f.set_prop("d", np.linspace(1, 100, 50))
+    f.set_prop("l", 100 + np.arange(50) % 4)
+    agg = aggregates.Aggregates(f, T, exact=True)
+    for t in range(T):
+        # firms with a low inventory hire, firms with a high inventory fire
+        f.set_prop("i", np.linspace(0, 200, 50))
+        f.step_month()
+        agg.record(f)
+        assert f.v.sum() > 0
+
+        p, w, d = f.p, f.w, f.d
+        assert np.isclose(agg.series["price_index"][t], (p * d).sum() / d.sum())
+        assert np.isclose(agg.series["mean_wage"][t], w.mean())
+        assert agg.series["employment"][t] == f.l.sum()
+        assert np.isclose(agg.series["vacancy_rate"][t], f.v.sum() / (f.l.sum() + f.v.sum()))
+        assert np.isclose(agg.series["price_std"][t], p.std())
+        assert np.isclose(agg.series["wage_std"][t], w.std())
+        assert np.allclose(agg.quantiles["p"][t], np.quantile(p, agg.q))
+
+    for name in agg.SERIES:
+        assert np.isclose(agg.moments[name].mean, agg.series[name].mean())
+    with pytest.raises(ValueError):
+        agg.record(f)
+
+def test_sampled_quantiles():
+    '''
+    Test that sampled quantiles approximate the exact ones, with replicates.
+    '''
+    f = firms.Firms(20000, R=2, dtypes="compact")
+    f.set_prop("p", np.random.default_rng(1).uniform(0, 1, size=(2, 20000)))
+    agg = aggregates.Aggregates(f, 1, quantiles=(0.25, 0.5), sample=2000, seed=2)
+    agg.record(f)
+    assert agg.quantiles["p"].shape == (1, 2, 2)
+    assert np.allclose(agg.quantiles["p"][0], [[0.25, 0.5]] * 2, atol=0.03)
+    assert np.allclose(agg.series["price_std"][0], np.sqrt(1 / 12), rtol=0.02)
+
+def test_chunks():
+    '''
+    Test that the aggregates do not depend on the chunk size, and that
+    recording a month allocates no firm-sized arrays.
+    '''
+    F = 200000
+    f = firms.Firms(F, R=2, seed=1, dtypes="compact")
+    rng = np.random.default_rng(3)
+    f.set_props({"p": rng.uniform(0.5, 1.5, (2, F)), "w": rng.uniform(0.5, 1.5, (2, F)),
+                 "d": rng.uniform(1, 10, (2, F)), "v": rng.integers(0, 2, (2, F))})
+    f.remove_firms(np.arange(0, F, 5))
+    results = []
+    for chunk in (F, 1000, 777):
+        agg = aggregates.Aggregates(f, 2, quantiles=(), chunk=chunk)
+        agg.record(f)
+        tracemalloc.start()
+        agg.record(f)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if (chunk < F):
+            assert peak < F
+        results.append(agg.series)
+    for series in results[1:]:
+        for name in aggregates.Aggregates.SERIES:
+            assert np.allclose(series[name], results[0][name], rtol=1e-12)
+
+def test_removed_firms():
+    '''
+    Test that the slots of removed firms are left out of the aggregates.
+    '''
+    f = firms.Firms(40, seed=2)
+    f.set_prop("w", np.linspace(0.5, 1.5, 40))
+    f.remove_firms(np.arange(0, 40, 3))
+    alive = f.alive.copy()
+    agg = aggregates.Aggregates(f, 2, exact=True, chunk=7)
+    agg.record(f)
+    assert np.isclose(agg.series["mean_wage"][0], f.w[alive].mean())
+    assert np.isclose(agg.series["wage_std"][0], f.w[alive].std())
+    assert agg.series["employment"][0] == f.l[alive].sum()
+    assert np.allclose(agg.quantiles["w"][0], np.quantile(f.w[alive], agg.q))
+
+    # no firms left - the distribution aggregates are undefined
+    f.remove_firms(np.flatnonzero(f.alive))
+    agg.record(f)
+    for name in ("price_index", "mean_wage", "price_std", "wage_std"):
+        assert np.isnan(agg.series[name][1])
+    assert agg.series["employment"][1] == 0
+    assert np.isnan(agg.quantiles["w"][1]).all()
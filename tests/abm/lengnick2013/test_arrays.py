@@ -0,0 +1,13 @@
+import numpy as np
+import abm.lengnick2013.arrays as arrays
+
+def test_group_rank():
+    assert np.array_equal(arrays.group_rank(np.array([3, 3, 5, 7, 7, 7])), [0, 1, 0, 0, 1, 2])
+    assert len(arrays.group_rank(np.array([], dtype=int))) == 0
+
+def test_shuffled_order():
+    rng = np.random.default_rng(0)
+    keys = np.array([2, 0, 1, 0, 2, 2])
+    order = arrays.shuffled_order(keys, rng)
+    assert np.array_equal(keys[order], np.sort(keys))
+    assert sorted(order) == list(range(len(keys)))
@@ -0,0 +1,44 @@
+import json
+
+from abm.lengnick2013 import benchmark
+
+def test_run(tmp_path):
+    results = benchmark.run([10, 100], configs=("default", "inplace"), min_time=0)
+    assert len(results["results"]) == 2 * 2 * len(benchmark.CASES)
+    for r in results["results"]:
+        assert r["seconds"] > 0
+        assert r["updates_per_sec"] > 0
+        assert r["peak_bytes"] >= 0
+
+    path = tmp_path / "baseline.json"
+    benchmark.save(path, results)
+    assert benchmark.load(path) == json.loads(json.dumps(results))
+
+def test_compare():
+    baseline = {"results": [{"case": "adjust_wages", "config": "default", "F": 100,
+                             "seconds": 1.0, "peak_bytes": 10**6}]}
+    same = {"results": [dict(baseline["results"][0])]}
+    assert benchmark.compare(same, baseline) == []
+
+    slower = {"results": [dict(baseline["results"][0], seconds=1.5)]}
+    regressions = benchmark.compare(slower, baseline, tolerance=0.2)
+    assert [r["measure"] for r in regressions] == ["seconds"]
+    assert regressions[0]["ratio"] == 1.5
+    assert benchmark.compare(slower, baseline, tolerance=0.6) == []
+
+    larger = {"results": [dict(baseline["results"][0], peak_bytes=2 * 10**6)]}
+    assert [r["measure"] for r in benchmark.compare(larger, baseline)] == ["peak_bytes"]
+
+    # cases missing from the baseline are not compared
+    other = {"results": [dict(baseline["results"][0], F=1000, seconds=10.0)]}
+    assert benchmark.compare(other, baseline) == []
+
+def test_main(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    args = ["--sizes", "10", "--cases", "produce", "--min-time", "0"]
+    assert benchmark.main(args + ["--save", path]) == 0
+    baseline = benchmark.load(path)
+    for r in baseline["results"]:
+        r["seconds"] /= 1000
+    benchmark.save(path, baseline)
+    assert benchmark.main(args + ["--baseline", path]) == 1
@@ -0,0 +1,50 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.checkpoint as checkpoint
+
+def test_save_load(tmp_path):
+    '''
+    Test that arrays and encoded values round-trip through both formats, and
+    that modifying a memory-mapped array does not change the checkpoint.
+    '''
+    arrays = {
+        "x": np.arange(1000, dtype=np.float64),
+        "a.y": np.arange(12, dtype=np.int16).reshape(3, 4),
+        "a.z": np.zeros(5, dtype=bool),
+        "scalar": np.array(3.5),
+        "empty": np.zeros(0, dtype=np.int64),
+        "meta": checkpoint.encode({"F": 10, "R": None, "big": 2**100}),
+    }
+    for path in (str(tmp_path / "c.npz"), str(tmp_path / "c")):
+        checkpoint.save(path, arrays)
+        for mmap in (True, False):
+            loaded = checkpoint.load(path, mmap)
+            assert sorted(loaded) == sorted(arrays)
+            for name, arr in arrays.items():
+                assert loaded[name].dtype == arr.dtype
+                assert np.array_equal(loaded[name], arr)
+            assert checkpoint.decode(loaded["meta"]) == {"F": 10, "R": None, "big": 2**100}
+            assert checkpoint.prefixed(loaded, "a.").keys() == {"y", "z"}
+
+        loaded = checkpoint.load(path)
+        assert isinstance(loaded["x"], np.memmap)
+        assert loaded["x"].flags.aligned
+        loaded["x"][:] = -1
+        assert np.array_equal(checkpoint.load(path)["x"], arrays["x"])
+
+    # the .npz file can be read by numpy
+    with np.load(str(tmp_path / "c.npz")) as z:
+        assert np.array_equal(z["a.y"], arrays["a.y"])
+
+def test_load_savez(tmp_path):
+    # .npz files written by numpy can be restored too
+    path = str(tmp_path / "c.npz")
+    np.savez(path, x=np.arange(7.0), y=np.arange(3))
+    loaded = checkpoint.load(path)
+    assert np.array_equal(loaded["x"], np.arange(7.0))
+
+    np.savez_compressed(path, x=np.arange(7.0))
+    with pytest.raises(ValueError):
+        checkpoint.load(path)
+    assert np.array_equal(checkpoint.load(path, mmap=False)["x"], np.arange(7.0))
@@ -0,0 +1,161 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.households as households
+import abm.lengnick2013.economy as economy
+import abm.lengnick2013.recorder as recorder
+
+def make_economy(F=10, H=200, seed=0, **kwargs):
+    '''
+    Create an economy in which every household is employed and holds some
+    liquidity.
+    '''
+    f = firms.Firms(F, seed=seed, **kwargs)
+    h = households.Households(H)
+    h.employer = np.arange(H) % F
+    h.m = np.full(H, 10.0)
+    return economy.Economy(f, h, seed=seed)
+
+def test_step():
+    '''
+    Test that a month conserves money and keeps the workforce of each firm
+    equal to the households it employs.
+    '''
+    e = make_economy()
+    f, h = e.firms, e.households
+    total = f.m.sum() + h.m.sum()
+    for t in range(12):
+        e.step()
+        assert np.isclose(f.m.sum() + h.m.sum(), total)
+        assert np.array_equal(f.l, h.employment(f.F))
+    assert e.month == 12
+
+def test_run_reproducible():
+    a = make_economy(seed=3).run(10)
+    b = make_economy(seed=3).run(10)
+    for prop in economy.Economy.FIELDS:
+        assert np.array_equal(getattr(a.firms, prop), getattr(b.firms, prop))
+    assert np.array_equal(a.households.m, b.households.m)
+
+def test_run_iter():
+    '''
+    Test that run_iter yields a snapshot every `every` months, and matches
+    an uninterrupted run.
+    '''
+    e = make_economy(seed=4)
+    months = [s.month for s in e.run_iter(10, every=3)]
+    assert months == [3, 6, 9]
+    assert e.month == 10
+
+    ref = make_economy(seed=4).run(10)
+    assert np.array_equal(e.firms.p, ref.firms.p)
+
+    # early stopping - the run advances only as snapshots are consumed
+    e = make_economy(seed=4)
+    for s in e.run_iter(100):
+        if (s.month == 2):
+            break
+    assert e.month == 2
+
+    with pytest.raises(ValueError):
+        next(make_economy().run_iter(5, every=0))
+
+def test_snapshot():
+    '''
+    Test that snapshots are read-only views of the state by default, and
+    copies on request.
+    '''
+    e = make_economy(inplace=True)
+    e.run(2)
+
+    view = e.snapshot(["p", "households.m"])
+    assert list(view.fields) == ["p", "households.m"]
+    assert np.shares_memory(view["p"], e.firms.p)
+    assert np.shares_memory(view["households.m"], e.households.m)
+    with pytest.raises(ValueError):
+        view["p"][0] = 0
+
+    copy = e.snapshot(copy=True)
+    assert set(copy.fields) == set(economy.Economy.FIELDS)
+    assert not np.shares_memory(copy["p"], e.firms.p)
+    assert copy["p"].flags.writeable
+    old = copy["p"].copy()
+    e.step()
+    # the copy is unchanged, the view follows the in-place state
+    assert np.array_equal(copy["p"], old)
+    assert np.array_equal(view["p"], e.firms.p)
+
+    with pytest.raises(ValueError):
+        e.snapshot(["labor.rng"])
+
+def test_run_recorder(tmp_path):
+    e = make_economy(seed=5)
+    rec = recorder.Recorder(tmp_path, e.firms, 6, fields=["p"], block=4)
+    prices = [s["p"].copy() for s in make_economy(seed=5).run_iter(6)]
+    e.run(6, rec)
+    rec.close()
+    assert np.array_equal(recorder.Recorder.load(tmp_path)["p"], np.array(prices))
+
+def test_checkpoint(tmp_path):
+    '''
+    Test that an economy resumed from a checkpoint is identical to an
+    uninterrupted run.
+    '''
+    expected = make_economy(seed=6).run(8)
+    e = make_economy(seed=6).run(3)
+    for path in (str(tmp_path / "e.npz"), str(tmp_path / "e")):
+        e.save(path)
+        resumed = economy.Economy.load(path)
+        assert resumed.month == 3
+        resumed.run(5)
+        for name in expected.firms.dtypes:
+            assert np.array_equal(getattr(resumed.firms, name), getattr(expected.firms, name))
+        for name in ("w_res", "employer", "m", "c"):
+            assert np.array_equal(getattr(resumed.households, name), getattr(expected.households, name))
+        assert np.array_equal(resumed.goods.network.firm, expected.goods.network.firm)
+
+def test_entry_exit():
+    '''
+    Test that an economy keeps running, consistently, across the entry and
+    the exit of firms.
+    '''
+    e = economy.Economy.create(10, 100, seed=2)
+    f, h = e.firms, e.households
+    e.run(2)
+    ids = e.add_firms(3, w=1.1)
+    assert list(ids) == [10, 11, 12]
+    e.run(2)
+    assert np.array_equal(f.l, h.employment(f.F))
+    assert len(e.goods.demand) == f.F == 13
+
+    removed = e.remove_firms([0, 11])
+    assert not np.isin(h.employer, removed).any()
+    assert not np.isin(e.goods.network.firm, removed).any()
+    total = f.m.sum() + h.m.sum()
+    for t in range(3):
+        e.step()
+        assert np.isclose(f.m.sum() + h.m.sum(), total)
+        assert np.array_equal(f.l, h.employment(f.F))
+        assert np.all(f.l[removed] == 0)
+        assert not np.isin(e.goods.network.firm, removed).any()
+
+    # removed slots are reused
+    assert sorted(e.add_firms(2)) == [0, 11]
+    e.run(2)
+    assert np.array_equal(f.l, h.employment(f.F))
+
+def test_remove_firms_unstaffed():
+    '''
+    Test that households can be relinked to a firm without employees,
+    which the size-weighted draws never choose.
+    '''
+    e = economy.Economy.create(9, 8, seed=1)
+    assert e.firms.l[8] == 0
+    e.remove_firms([0, 1])
+    net = e.goods.network
+    assert not np.isin(net.firm, [0, 1]).any()
+    for h in range(net.H):
+        links = net.firm[net.indptr[h]:net.indptr[h + 1]]
+        assert len(np.unique(links)) == len(links)
+    e.run(2)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from abm.lengnick2013.employment import Employment
+
+def check(index, employer):
+    '''
+    Check that the index holds exactly the employees of every firm.
+    '''
+    F = index.F
+    assert np.array_equal(index.firm, employer)
+    assert np.array_equal(index.count, np.bincount(employer[employer >= 0], minlength=F))
+    assert np.all(index.count <= index.capacity)
+    for f in range(F):
+        assert sorted(index.employees(f)) == sorted(np.flatnonzero(employer == f))
+    employed = np.flatnonzero(employer >= 0)
+    assert np.array_equal(index.members[index.position[employed]], employed)
+    assert np.all(index.position[employer < 0] == -1)
+
+def test_build():
+    employer = np.array([2, -1, 0, 2, 2, 1, -1, 0])
+    index = Employment(employer, 4)
+    check(index, employer)
+    assert list(index.employees(2)) == [0, 3, 4]
+    assert len(index.employees(3)) == 0
+
+def test_add_remove():
+    '''
+    Test random hires and separations against the employer ids, including
+    segments that run out of room.
+    '''
+    rng = np.random.default_rng(0)
+    F, H = 7, 300
+    employer = np.where(rng.random(H) < 0.5, rng.integers(0, F, H), -1)
+    index = Employment(employer, F)
+    for month in range(40):
+        leaving = np.flatnonzero((employer >= 0) & (rng.random(H) < 0.2))
+        index.remove(leaving)
+        employer[leaving] = -1
+        check(index, employer)
+
+        # hires concentrated on one firm
+        hires = np.flatnonzero((employer < 0) & (rng.random(H) < 0.3))
+        firms = np.where(rng.random(len(hires)) < 0.5, month % F, rng.integers(0, F, len(hires)))
+        index.add(hires, firms)
+        employer[hires] = firms
+        check(index, employer)
+
+    # households that are not employed are ignored
+    index.remove(np.flatnonzero(employer < 0))
+    check(index, employer)
+
+def test_pick():
+    '''
+    Test that picks choose distinct employees of each firm, uniformly.
+    '''
+    F = 3
+    employer = np.repeat(np.arange(F), [4, 1, 6])
+    index = Employment(employer, F)
+    rng = np.random.default_rng(1)
+    firms = np.array([0, 2])
+    picked = [index.pick(firms, rng.random(2), exclude=k) for k in range(4)]
+    check(index, employer)
+    picked = np.array(picked)
+    assert sorted(picked[:, 0]) == [0, 1, 2, 3]
+    assert len(set(picked[:, 1])) == 4 and np.all(employer[picked[:, 1]] == 2)
+
+    counts = np.zeros(6)
+    for k in range(6000):
+        counts[index.pick(np.array([2]), rng.random(1))[0] - 5] += 1
+    assert np.all(np.abs(counts / 1000 - 1) < 0.15)
@@ -4,6 +4,8 @@ import traceback
 import numpy as np
 import abm.lengnick2013.firms as firms
 
+from helpers import configure_random_state
+
 def test_set_prop():
 
     # Test Cases:
@@ -85,8 +87,8 @@ def configure_inventory_level(f, x, level):
     """
 
     f.d[x] = 5
-    f.i_phi_lower[x] = 0.4 # 5 * 0.2 = 2
-    f.i_phi_upper[x] = 1.2 # 5 * 1.2 = 6
+    f.set_prop("i_phi_lower", 0.4, id=x) # 5 * 0.2 = 2
+    f.set_prop("i_phi_upper", 1.2, id=x) # 5 * 1.2 = 6
 
     f.i[x] = (level < 0)  * f.d[x] * f.i_phi_lower[x] + \
              (level >= 0) * f.d[x] * f.i_phi_upper[x] + \
@@ -110,7 +112,7 @@ def configure_vacancy_free_level(f, x, level):
             +2: vacancy-free months greather than threshhold
     """
 
-    f.gamma[x] = 5
+    f.set_prop("gamma", 5, id=x)
 
     f.nv[x] = (level == -1) * (f.gamma[x] - 1) + \
               (level == +1) * f.gamma[x] + \
@@ -179,7 +181,7 @@ def test_adjust_wages():
         # configure vacancy-free level (vacancy-free months & threshhold)
         configure_vacancy_free_level(f, 0, vacancy_free_level[x])
         # wage & delta
-        f.delta[0] = wage_delta[x]
+        f.set_prop("delta", wage_delta[x], id=0)
         f.w[0] = wage[x]
 
         try:
@@ -258,22 +260,22 @@ def test_price_change_type():
         # configure inventory level (inventory, demand, & bounds parameters)
         configure_inventory_level(f, 0, inv_levels[x])
         # configure price max change %
-        f.nu[0] = 0.05
+        f.set_prop("nu", 0.05, id=0)
         # configure probability of accepting price change
         # - set to 100% to ensure that price change occurs
-        f.theta[0] = 1
+        f.set_prop("theta", 1, id=0)
         # configure current price and remember for results checking
         f.p[0] = old_p = 1
 
         # configure marginal cost to be equal to current price
         # -- marginal cost: f.w / f.t_lambda
         f.w[0] = 1
-        f.t_lambda[0] = 1
+        f.set_prop("t_lambda", 1, id=0)
 
         # configure wide price bounds so they don't play a role in
         # deteremining the price change
-        f.p_phi_upper[0] = 100 # new price can be 100 times as great as current price
-        f.p_phi_lower[0] = 0   # new price can be zero
+        f.set_prop("p_phi_upper", 100, id=0) # new price can be 100 times as great as current price
+        f.set_prop("p_phi_lower", 0, id=0)   # new price can be zero
 
         # adjust workforce
         f.adjust_prices()
@@ -376,11 +378,11 @@ def test_adjust_prices():
     for x in range(N):
         # configure inventory bounds factors:
         if (x//5 < 5):
-            f.i_phi_lower[x] = i_lower[x//5]
-            f.i_phi_upper[x] = i_upper[x//5]
+            f.set_prop("i_phi_lower", i_lower[x//5], id=x)
+            f.set_prop("i_phi_upper", i_upper[x//5], id=x)
         else: # (x//5 == 5) - cases 6a & 6b (firms 25 & 26)
-            f.i_phi_lower[x] = i_lower[(x%5) * 4] # (25%5 == 0), (26%5 == 1)
-            f.i_phi_upper[x] = i_upper[(x%5) * 4]
+            f.set_prop("i_phi_lower", i_lower[(x%5) * 4], id=x) # (25%5 == 0), (26%5 == 1)
+            f.set_prop("i_phi_upper", i_upper[(x%5) * 4], id=x)
 
         # test inventory bounds
         if (x//5 == 0):
@@ -401,11 +403,11 @@ def test_adjust_prices():
 
         # configure price bounds factors
         if (x//5 < 5):
-            f.p_phi_lower[x] = p_lower[x%5]
-            f.p_phi_upper[x] = p_upper[x%5]
+            f.set_prop("p_phi_lower", p_lower[x%5], id=x)
+            f.set_prop("p_phi_upper", p_upper[x%5], id=x)
         else: # (x//5 == 5) - cases 6a & 6b (firms 25 & 26)
-            f.p_phi_lower[x] = p_lower[2]
-            f.p_phi_upper[x] = p_upper[2]
+            f.set_prop("p_phi_lower", p_lower[2], id=x)
+            f.set_prop("p_phi_upper", p_upper[2], id=x)
 
         # test price bounds
         if (x%5 == 0) and (x//5 < 5): # don't include cases 6a & 6b
@@ -421,9 +423,9 @@ def test_adjust_prices():
 
         # configure price change factor
         if (x//5 < 5):
-            f.nu[x] = p_nu[x%5]
+            f.set_prop("nu", p_nu[x%5], id=x)
         else:  # (x//5 == 5) - cases 6a & 6b (firms 25 & 26)
-            f.nu[x] = p_nu[2]
+            f.set_prop("nu", p_nu[2], id=x)
 
         # test price change factor
         if (x%5 in (0, 2, 4)) or (x//5 == 5): # include cases 6a & 6b
@@ -434,10 +436,10 @@ def test_adjust_prices():
         # configure price change probability
         if (x//5 < 5):
             # - set to 1.0 so price always changes
-            f.theta[x] = 1.0
+            f.set_prop("theta", 1.0, id=x)
         else: # (x//5 == 5) - cases 6a & 6b (firms 25 & 26)
             # - set to 0.0 so price never changes
-            f.theta[x] = 0.0
+            f.set_prop("theta", 0.0, id=x)
 
     # save old prices
     old_p = f.p
@@ -478,4 +480,606 @@ def test_adjust_prices():
             else:
                 assert False # unexpected case
         else:
-            assert False # unexpected case
\ No newline at end of file
+            assert False # unexpected case
+
+def test_step_month():
+    '''
+    Test that the fused monthly step gives the same results as calling
+    adjust_wages(), adjust_workforce() and adjust_prices() in order.
+    '''
+    N = 1000
+
+    f1 = firms.Firms(N)
+    f2 = firms.Firms(N)
+    configure_random_state(f1, 42)
+    configure_random_state(f2, 42)
+
+    for month in range(12):
+        np.random.seed(month)
+        f1.adjust_wages()
+        f1.adjust_workforce()
+        f1.adjust_prices()
+
+        np.random.seed(month)
+        f2.step_month()
+
+        for prop in ("w", "p", "l", "v", "nv"):
+            assert np.array_equal(getattr(f1, prop), getattr(f2, prop))
+
+def test_inplace_mode():
+    '''
+    Test that in-place mode gives the same results as the default mode and
+    writes into the existing state arrays instead of rebinding them.
+    '''
+    N = 1000
+
+    f1 = firms.Firms(N)
+    f2 = firms.Firms(N, inplace=True)
+    configure_random_state(f1, 7)
+    configure_random_state(f2, 7)
+
+    state = {prop: getattr(f2, prop) for prop in ("w", "p", "l", "v", "nv")}
+
+    for month in range(12):
+        np.random.seed(month)
+        f1.step_month()
+        np.random.seed(month)
+        f2.adjust_wages()
+        f2.adjust_workforce()
+        f2.adjust_prices()
+
+        for prop, arr in state.items():
+            assert getattr(f2, prop) is arr
+            assert np.array_equal(getattr(f1, prop), arr)
+
+    # set_prop keeps the state arrays owned by the firms
+    f2.set_prop("w", 1)
+    assert f2.w is state["w"]
+    assert np.array_equal(f2.w, np.ones(N))
+
+def test_replicates():
+    '''
+    Test that each replicate of a replicated set of firms evolves exactly
+    like a single set of firms seeded with that replicate's stream.
+    '''
+    N = 200
+    R = 4
+
+    f = firms.Firms(N, R=R, seed=3)
+    assert f.p.shape == (R, N)
+    assert f.gamma.shape == (R, N)
+
+    # independent single-replicate firms using the spawned streams
+    singles = [firms.Firms(N, seed=s) for s in np.random.SeedSequence(3).spawn(R)]
+    for r, single in enumerate(singles):
+        configure_random_state(single, r)
+    for prop in ("d", "i", "w", "p", "l", "v", "nv"):
+        f.set_prop(prop, np.stack([getattr(single, prop) for single in singles]))
+
+    # set_prop applies an (F,) array or a firm id to every replicate
+    f.set_prop("nu", np.full(N, 0.05))
+    f.set_prop("theta", 0.9, id=0)
+    for single in singles:
+        single.set_prop("nu", np.full(N, 0.05))
+        single.set_prop("theta", 0.9, id=0)
+
+    for month in range(12):
+        f.step_month()
+        for single in singles:
+            single.step_month()
+
+    for r, single in enumerate(singles):
+        for prop in ("w", "p", "l", "v", "nv"):
+            assert np.array_equal(getattr(f, prop)[r], getattr(single, prop))
+
+    # the replicates are not identical to each other
+    assert not np.array_equal(f.p[0], f.p[1])
+
+    with pytest.raises(TypeError):
+        f.set_prop("nu", np.full((R + 1, N), 0.05))
+
+def test_block_draws():
+    '''
+    Test that pre-generating the random draws in blocks of months gives
+    bit-identical results for every block size.
+    '''
+    N = 100
+
+    results = []
+    for block in (None, 1, 2, 5):
+        f = firms.Firms(N, seed=np.random.default_rng(9), block=block, inplace=True)
+        configure_random_state(f, 9)
+        for month in range(4):
+            f.step_month()
+        # partial months consume the draws in call order
+        f.adjust_prices()
+        f.adjust_wages()
+        f.step_month()
+        results.append((f.w.copy(), f.p.copy()))
+
+    for w, p in results[1:]:
+        assert np.array_equal(w, results[0][0])
+        assert np.array_equal(p, results[0][1])
+
+def test_compact_params():
+    '''
+    Test that parameters shared by all firms are stored as a single value
+    and only promoted to per-firm arrays when set for individual firms.
+    '''
+    N = 50
+
+    f1 = firms.Firms(N, seed=4)
+    f2 = firms.Firms(N, seed=4)
+    configure_random_state(f1, 4)
+    configure_random_state(f2, 4)
+
+    # defaults are compact
+    assert f1._nu.ndim == 0
+
+    # a single value for all firms stays compact
+    f1.set_prop("nu", 0.05)
+    assert f1._nu.ndim == 0
+    # setting a single firm promotes the parameter
+    f1.set_prop("theta", 0.5, id=3)
+    assert f1._theta.shape == (N,)
+    # reading the attribute gives a read-only view of the firm shape,
+    # without promoting the parameter
+    assert np.array_equal(f1.delta, np.full(N, 0.019))
+    assert not f1.delta.flags.writeable
+    assert f1._delta.ndim == 0
+
+    f2.set_prop("nu", np.full(N, 0.05))
+    f2.set_prop("theta", 0.5, id=3)
+
+    # both forms give the same results
+    for month in range(6):
+        f1.step_month()
+        f2.step_month()
+    assert np.array_equal(f1.w, f2.w)
+    assert np.array_equal(f1.p, f2.p)
+
+def test_dtype_policy():
+    '''
+    Test that the dtype policy is applied at construction and enforced by
+    set_prop.
+    '''
+    f = firms.Firms(5, dtypes="compact")
+    assert f.p.dtype == np.float32
+    assert f.l.dtype == np.int32
+    assert f.nv.dtype == np.int16
+    assert f.v.dtype == np.uint8
+
+    # values are converted to the policy dtype
+    f.set_prop("p", 2)
+    assert f.p.dtype == np.float32
+    f.set_prop("nv", np.arange(5))
+    assert f.nv.dtype == np.int16
+    f.set_prop("nu", np.full(5, 0.1))
+    assert f.nu.dtype == np.float32
+
+    # real values are rejected for integer properties
+    with pytest.raises(TypeError):
+        f.set_prop("gamma", 1.5)
+    with pytest.raises(TypeError):
+        f.set_prop("l", np.full(5, 1.5))
+
+    # integer values must fit the policy dtype
+    with pytest.raises(OverflowError):
+        f.set_prop("gamma", 100000)
+    with pytest.raises(OverflowError):
+        f.set_prop("nv", np.full(5, 40000))
+    with pytest.raises(OverflowError):
+        f.set_prop("v", -1, id=0)
+    with pytest.raises(OverflowError):
+        f.set_props({"l": np.full(5, 2), "v": np.full(5, 256)})
+    assert np.all(f.l == 1) and np.all(f.v == 0)
+    f.set_prop("nv", np.full(5, 32767))
+    assert np.all(f.nv == 32767)
+
+    # dtypes can be overridden individually
+    f = firms.Firms(5, dtypes={"p": np.float32})
+    assert f.p.dtype == np.float32
+    assert f.w.dtype == np.float64
+
+def test_compact_drift():
+    '''
+    Measure how far compact (single precision) firms drift from the default
+    (double precision) firms over a long run with the same random draws.
+    '''
+    N = 1000
+    T = 600
+
+    f1 = firms.Firms(N, seed=1)
+    f2 = firms.Firms(N, seed=1, dtypes="compact", inplace=True)
+    configure_random_state(f1, 1)
+    for prop in ("d", "i", "w", "p", "l", "v", "nv"):
+        f2.set_prop(prop, getattr(f1, prop).astype(f2.dtypes[prop]))
+
+    for month in range(T):
+        f1.step_month()
+        f2.step_month()
+
+    # the discrete state does not drift
+    assert np.array_equal(f1.l, f2.l)
+    assert np.array_equal(f1.v, f2.v)
+    assert np.array_equal(f1.nv, f2.nv)
+
+    # real values stay within a small relative distance
+    p_drift = np.max(np.abs(f2.p / f1.p - 1))
+    w_drift = np.max(np.abs(f2.w / f1.w - 1))
+    assert p_drift < 1e-4, f"price drift after {T} months: {p_drift:.2e}"
+    assert w_drift < 1e-4, f"wage drift after {T} months: {w_drift:.2e}"
+
+def test_set_props():
+    '''
+    Test bulk updates of several properties for selections of firms.
+    '''
+    N = 10
+    f = firms.Firms(N)
+
+    # boolean mask
+    mask = np.arange(N) % 2 == 0
+    f.set_props({"nu": 0.05, "theta": 0.5}, ids=mask)
+    assert np.array_equal(f.nu, np.where(mask, 0.05, 0.02))
+    assert np.array_equal(f.theta, np.where(mask, 0.5, 0.75))
+
+    # index array with per-firm values
+    f.set_props({"w": [2.0, 3.0, 4.0]}, ids=np.array([1, 3, 5]))
+    assert np.array_equal(f.w[[1, 3, 5]], [2.0, 3.0, 4.0])
+    assert f.w[0] == 1
+
+    # slice
+    f.set_props({"l": 7}, ids=slice(5, None))
+    assert np.array_equal(f.l, [1] * 5 + [7] * 5)
+
+    # numpy integer id and array-like value in set_prop
+    f.set_prop("p", 2.0, id=np.int64(4))
+    assert f.p[4] == 2
+    f.set_prop("d", list(range(N)))
+    assert np.array_equal(f.d, np.arange(N))
+
+    # adopt the caller's array without copying
+    p = np.linspace(1, 2, N)
+    f.set_props({"p": p}, copy=False)
+    assert f.p is p
+
+    # nothing is changed if any update is invalid
+    old_w = f.w.copy()
+    with pytest.raises(TypeError):
+        f.set_props({"w": 9.0, "l": np.ones(3)}, ids=[0, 1])
+    with pytest.raises(AttributeError):
+        f.set_props({"w": 9.0, "foo": 1})
+    assert np.array_equal(f.w, old_w)
+
+    with pytest.raises(IndexError):
+        f.set_props({"w": 9.0}, ids=[0, N])
+
+def test_set_props_replicates():
+    '''
+    Test bulk updates with firm ids and per-replicate masks.
+    '''
+    N = 6
+    R = 3
+    f = firms.Firms(N, R=R, seed=0)
+
+    # firm ids apply to every replicate, values may differ per replicate
+    f.set_props({"w": np.array([[1.5], [2.5], [3.5]])}, ids=[0, 2])
+    assert np.array_equal(f.w[:, 0], [1.5, 2.5, 3.5])
+    assert np.array_equal(f.w[:, 2], [1.5, 2.5, 3.5])
+
+    # a mask of shape (R, F) selects firms per replicate
+    mask = np.zeros((R, N), dtype=bool)
+    mask[1, 4] = True
+    f.set_props({"l": 0}, ids=mask)
+    assert f.l.sum() == R * N - 1
+    assert f.l[1, 4] == 0
+
+def test_check_invariants():
+    '''
+    Test that every violating firm is reported for each invariant, and that
+    the checks are skipped in fast mode.
+    '''
+    N = 10
+    f = firms.Firms(N)
+    assert f.check_invariants() == {}
+
+    f.l[[2, 7]] = -1
+    f.p[4] = -0.5
+    f.v[[1, 3, 5]] = 1
+    f.nv[[3, 5, 6]] = 2
+    f.set_prop("p_phi_lower", 2.0, id=9)
+
+    violations = f.check_invariants(raise_error=False)
+    assert sorted(violations) == ["l", "p", "p_phi", "v_nv"]
+    assert np.array_equal(violations["l"], [2, 7])
+    assert np.array_equal(violations["p"], [4])
+    assert np.array_equal(violations["v_nv"], [3, 5])
+    assert np.array_equal(violations["p_phi"], [9])
+
+    with pytest.raises(firms.InvariantError) as e:
+        f.step_month()
+    assert np.array_equal(e.value.violations["v_nv"], [3, 5])
+
+    # bounds shared by all firms
+    f = firms.Firms(3)
+    f.set_prop("i_phi_lower", 2.0)
+    assert np.array_equal(f.check_invariants(raise_error=False)["i_phi"], [0, 1, 2])
+
+    # replicates report (replicate, firm) pairs
+    f = firms.Firms(4, R=2, seed=0)
+    f.w[1, 2] = -1
+    assert np.array_equal(f.check_invariants(raise_error=False)["w"], [[1, 2]])
+
+    # fast mode skips the checks
+    previous = firms.set_checked(False)
+    try:
+        assert not firms.is_checked()
+        f.step_month()
+    finally:
+        firms.set_checked(previous)
+
+def test_produce():
+    f = firms.Firms(3)
+    f.set_prop("l", np.array([0, 1, 2]))
+    f.set_prop("i", 1.0)
+    f.produce()
+    assert np.array_equal(f.i, [1, 4, 7])
+
+def test_checkpoint(tmp_path):
+    '''
+    Test that a run resumed from a checkpoint is identical to an
+    uninterrupted run, for every storage format and firm configuration.
+    '''
+    configs = [dict(seed=1), dict(seed=2, R=3, block=4), dict(seed=3, inplace=True, dtypes="compact")]
+    for n, kwargs in enumerate(configs):
+        def make():
+            f = firms.Firms(30, **kwargs)
+            configure_random_state(f, n)
+            f.set_prop("nu", np.linspace(0.01, 0.03, 30))
+            return f
+
+        expected = make()
+        for month in range(7):
+            expected.step_month()
+
+        for path in (tmp_path / f"{n}.npz", tmp_path / f"{n}"):
+            for mmap in (True, False):
+                f = make()
+                for month in range(3):
+                    f.step_month()
+                f.save(str(path))
+                g = firms.Firms.load(str(path), mmap=mmap)
+                assert g.dtypes == f.dtypes
+                assert g.inplace == f.inplace
+                assert (g._gamma.ndim == 0) and (g._nu.shape == f.shape)
+                for month in range(4):
+                    g.step_month()
+                for name in f.dtypes:
+                    assert np.array_equal(getattr(g, name), getattr(expected, name))
+
+def test_checkpoint_global_rng(tmp_path):
+    '''
+    Test that a checkpoint of firms drawing from the global generator
+    restores the global generator.
+    '''
+    np.random.seed(5)
+    f = firms.Firms(20)
+    configure_random_state(f, 5)
+    f.step_month()
+    f.save(str(tmp_path / "f.npz"))
+    f.step_month()
+    expected = f.p.copy()
+
+    np.random.seed(6)
+    g = firms.Firms.load(str(tmp_path / "f.npz"))
+    g.step_month()
+    assert np.array_equal(g.p, expected)
+
+def test_chunks():
+    '''
+    Test that chunked updates give the same results as unchunked updates,
+    for every chunk size, draw block and stream.
+    '''
+    F = 53
+    for R, seed, block in ((None, 3, None), (None, 3, 2), (2, 4, 3), (None, None, None), (None, None, 2)):
+        def run(chunk):
+            np.random.seed(9)
+            f = firms.Firms(F, R=R, seed=seed, block=block, chunk=chunk)
+            configure_random_state(f, 2)
+            # chunks update in place - use the policy dtypes
+            f.set_props({name: getattr(f, name) for name in ("i", "d", "w", "p", "l", "v", "nv")})
+            f.set_prop("nu", np.linspace(0.01, 0.03, F))
+            for month in range(5):
+                f.step_month()
+                f.produce()
+            return f
+
+        expected = run(None)
+        for chunk in (1, 8, F, 100):
+            f = run(chunk)
+            for name in f.dtypes:
+                assert np.array_equal(getattr(f, name), getattr(expected, name))
+
+def test_chunk_memory():
+    '''
+    Test that the temporaries of chunked updates do not grow with the number
+    of firms.
+    '''
+    import tracemalloc
+    F = 100000
+    previous = firms.set_checked(False)
+    try:
+        f = firms.Firms(F, seed=1, chunk=1000)
+        tracemalloc.start()
+        f.step_month()
+        f.produce()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        firms.set_checked(previous)
+    # much less than a single float64 array of all firms
+    assert peak < 8 * F / 4
+
+def test_threads():
+    '''
+    Test that threaded updates give the same results as serial updates, for
+    every number of threads, with and without chunks.
+    '''
+    F = 61
+    for R, seed in ((None, 3), (3, 4), (None, None)):
+        def run(**kwargs):
+            np.random.seed(9)
+            f = firms.Firms(F, R=R, seed=seed, **kwargs)
+            configure_random_state(f, 2)
+            f.set_props({name: getattr(f, name) for name in ("i", "d", "w", "p", "l", "v", "nv")})
+            for month in range(3):
+                f.step_month()
+                f.produce()
+                f.adjust_wages()
+                f.adjust_workforce()
+                f.adjust_prices()
+            return f
+
+        expected = run()
+        for kwargs in (dict(threads=1), dict(threads=2), dict(threads=4, chunk=5), dict(threads=8, block=2)):
+            f = run(**kwargs)
+            for name in f.dtypes:
+                assert np.array_equal(getattr(f, name), getattr(expected, name))
+
+def test_not_seekable():
+    '''
+    Test that sliced updates draw up front from generators that can not be
+    advanced, and that such generators are refused with a block.
+    '''
+    def run(**kwargs):
+        f = firms.Firms(61, seed=np.random.Generator(np.random.MT19937(1)), **kwargs)
+        configure_random_state(f, 2)
+        for month in range(3):
+            f.step_month()
+            f.adjust_prices()
+        return f
+
+    expected = run()
+    for kwargs in (dict(chunk=10), dict(threads=2), dict(threads=3, chunk=7)):
+        f = run(**kwargs)
+        for name in f.dtypes:
+            assert np.array_equal(getattr(f, name), getattr(expected, name))
+    with pytest.raises(ValueError):
+        firms.Firms(10, seed=np.random.Generator(np.random.MT19937(1)), block=2)
+
+def test_active_set():
+    '''
+    Test that the active-set updates give the same results as the updates
+    of all firms, whether or not the active firms are few enough to be
+    compacted, with every dtype policy and update mode.
+    '''
+    F = 57
+    for R, seed, kwargs in ((None, 3, {}), (None, None, {}), (None, 3, dict(inplace=True, dtypes="compact")),
+                            (2, 4, dict(block=2)), (None, 3, dict(chunk=8, threads=2))):
+        def run(active):
+            np.random.seed(9)
+            f = firms.Firms(F, R=R, seed=seed, active=active, **kwargs)
+            configure_random_state(f, 2)
+            f.set_props({name: getattr(f, name) for name in ("i", "d", "w", "p", "l", "v", "nv")})
+            f.set_prop("nu", np.linspace(0.01, 0.03, F))
+            f.set_prop("t_lambda", np.linspace(2, 4, F))
+            for month in range(5):
+                f.step_month()
+                f.produce()
+                f.adjust_wages()
+                f.adjust_prices()
+            return f
+
+        expected = run(None)
+        for active in (0, 0.2, 1):
+            f = run(active)
+            for name in f.dtypes:
+                assert np.array_equal(getattr(f, name), getattr(expected, name))
+
+def test_add_remove_firms():
+    '''
+    Test firm entry and exit: removed firms are parked and their slots are
+    reused before the arrays grow, and the arrays grow with amortised
+    reallocation.
+    '''
+    F = 20
+    f = firms.Firms(F, seed=1, inplace=True)
+    configure_random_state(f, 3)
+
+    f.remove_firms([3, 7, 11])
+    assert f.alive.sum() == F - 3
+    assert np.all(f.l[[3, 7, 11]] == 0) and np.all(f.w[[3, 7, 11]] == 0)
+    parked = {name: getattr(f, name)[[3, 7, 11]].copy() for name in ("m", "i", "d", "w", "p", "l", "v", "nv")}
+    for month in range(30):
+        f.step_month()
+        f.produce()
+    for name, value in parked.items():
+        assert np.array_equal(getattr(f, name)[[3, 7, 11]], value)
+
+    # removed firms can not be removed again
+    with pytest.raises(ValueError):
+        f.remove_firms([2, 7])
+    with pytest.raises(IndexError):
+        f.remove_firms(F)
+    assert f.alive[2]
+
+    # new firms reuse the free slots first (last in, first out)
+    w = f.w
+    ids = f.add_firms(2, w=1.5)
+    assert list(ids) == [7, 11]
+    assert (f.F == F) and (f.w is w)
+    assert np.all(f.w[ids] == 1.5) and np.all(f.i[ids] == 5) and f.alive[ids].all()
+
+    # then the arrays grow, doubling their capacity
+    ids = f.add_firms(4, p=[1.0, 2.0, 3.0, 4.0])
+    assert list(ids) == [3, 20, 21, 22]
+    assert f.F == 23 and f.shape == (23,)
+    assert list(f.p[ids]) == [1.0, 2.0, 3.0, 4.0]
+    storage = f.w.base
+    assert storage.shape == (40,)
+    for k in range(17):
+        f.add_firms(1)
+    assert (f.F == 40) and (f.w.base is storage)
+    f.step_month()
+    f.produce()
+    f.check_invariants()
+
+    # parameters set per firm must be provided for new firms
+    f.set_prop("nu", np.linspace(0.01, 0.03, f.F))
+    with pytest.raises(ValueError):
+        f.add_firms(1)
+    with pytest.raises(TypeError):
+        f.add_firms(2, nu=[0.02, 0.02, 0.02])
+    assert f.F == 40
+    ids = f.add_firms(1, nu=0.025)
+    assert f.nu[ids] == 0.025
+
+def test_add_firms_draws(tmp_path):
+    '''
+    Test that runs with firm entry and exit do not depend on the draw
+    block, the update mode or the replicates layout, and resume from a
+    checkpoint.
+    '''
+    def run(path=None, **kwargs):
+        f = firms.Firms(15, seed=5, **kwargs)
+        for month in range(10):
+            if (month == 2):
+                f.remove_firms([1, 4])
+            if (month == 4):
+                f.add_firms(5, d=np.arange(1, 6), i=[0, 0, 9, 9, 9])
+            if (month == 6) and path:
+                f.save(path)
+                f = firms.Firms.load(path)
+            f.step_month()
+            f.produce()
+        return f
+
+    expected = run()
+    assert expected.F == 18
+    for kwargs in (dict(block=4), dict(inplace=True), dict(chunk=4, threads=2), dict(path=str(tmp_path / "f.npz"))):
+        f = run(**kwargs)
+        for name in f.dtypes:
+            assert np.array_equal(getattr(f, name), getattr(expected, name))
+        assert np.array_equal(f.alive, expected.alive)
+    f = run(R=2)
+    assert f.shape == (2, 18)
@@ -0,0 +1,144 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.households as households
+import abm.lengnick2013.goods as goods
+
+def test_random_network():
+    rng = np.random.default_rng(0)
+    for F in (7, 10, 1000):
+        net = goods.TradingNetwork.random(50, F, 7, rng)
+        assert np.array_equal(net.degree, np.full(50, 7))
+        links = net.firm.reshape(50, 7)
+        # links of each household are distinct firms
+        assert np.all(np.sort(links, axis=1)[:, 1:] != np.sort(links, axis=1)[:, :-1])
+        assert np.all((0 <= net.firm) & (net.firm < F))
+
+    with pytest.raises(ValueError):
+        goods.TradingNetwork.random(5, 3, 7, rng)
+
+def test_step_day():
+    '''
+    Test that a trading day conserves goods and money and never sells more
+    than the firms' inventories.
+    '''
+    F = 20
+    H = 500
+    f = firms.Firms(F)
+    h = households.Households(H)
+    market = goods.GoodsMarket(f, h, seed=1)
+
+    f.set_prop("i", np.linspace(0, 30, F))
+    f.set_prop("p", np.linspace(0.5, 1.5, F))
+    h.m = np.full(H, 10.0)
+    h.c = np.full(H, 21.0) # one unit per day
+    old_i, old_hm, old_fm = f.i.copy(), h.m.copy(), f.m.copy()
+
+    market.step_day()
+
+    assert np.all(f.i >= 0)
+    assert np.allclose(old_i - f.i, market.sales)
+    assert np.isclose((old_hm - h.m).sum(), (f.m - old_fm).sum())
+    # demand exceeds the total inventory, so every firm sells out
+    assert np.allclose(f.i, 0)
+    assert market.rationed.any()
+
+def test_rationing():
+    '''
+    Test that a firm that can not meet its demand rations every request in
+    proportion.
+    '''
+    f = firms.Firms(1)
+    h = households.Households(4)
+    net = goods.TradingNetwork(np.arange(5), np.zeros(4, dtype=int), 1)
+    market = goods.GoodsMarket(f, h, network=net, seed=2)
+
+    f.set_prop("i", 5.0)
+    h.m = np.full(4, 100.0)
+    h.c = np.array([1.0, 2.0, 3.0, 4.0]) * market.DAYS
+
+    market.step_day()
+
+    # 10 units requested, 5 available
+    assert np.allclose(h.m, 100 - np.array([0.5, 1.0, 1.5, 2.0]))
+    assert np.all(market.rationed)
+
+def test_step_month():
+    '''
+    Test that the monthly demand is written to the firms.
+    '''
+    F = 10
+    H = 200
+    f = firms.Firms(F)
+    h = households.Households(H)
+    market = goods.GoodsMarket(f, h, seed=3)
+
+    h.m = np.full(H, 50.0)
+    market.step_month()
+
+    assert np.allclose(f.d, market.demand)
+    assert market.demand.sum() > 0
+    assert np.all(market.sales <= market.demand + 1e-9)
+
+def test_rewire_price():
+    '''
+    Test that households only replace their most expensive trading partner,
+    and only with a firm that is cheaper by at least xi.
+    '''
+    F = 30
+    H = 300
+    f = firms.Firms(F)
+    h = households.Households(H)
+    market = goods.GoodsMarket(f, h, seed=4)
+    net = market.network
+
+    f.set_prop("p", np.linspace(1, 2, F))
+    h.psi_price = 1.0
+    h.psi_quant = 0.0
+    old = net.firm.copy().reshape(H, 7)
+
+    market.rewire()
+
+    new = net.firm.reshape(H, 7)
+    changed = old != new
+    assert changed.any()
+    # at most one link per household, and only the most expensive one
+    assert np.all(changed.sum(axis=1) <= 1)
+    rows, cols = np.nonzero(changed)
+    assert np.array_equal(cols, np.argmax(f.p[old], axis=1)[rows])
+    assert np.all(f.p[new[rows, cols]] < f.p[old[rows, cols]] * (1 - h.xi))
+    # links remain distinct
+    s = np.sort(new, axis=1)
+    assert np.all(s[:, 1:] != s[:, :-1])
+
+def test_rewire_quantity():
+    '''
+    Test that only links on which households were rationed are replaced.
+    '''
+    F = 30
+    H = 300
+    f = firms.Firms(F)
+    h = households.Households(H)
+    market = goods.GoodsMarket(f, h, seed=5)
+    net = market.network
+
+    # firm 0 never has inventory
+    f.set_prop("i", 100.0)
+    f.set_prop("i", 0.0, id=0)
+    h.m = np.full(H, 100.0)
+    h.c = np.full(H, 21.0)
+    h.psi_price = 0.0
+    h.psi_quant = 1.0
+
+    market.step_day()
+    rationed = market.rationed.copy()
+    assert np.array_equal(np.flatnonzero(rationed), market.rationed_links())
+    assert np.all(net.firm[rationed] == 0)
+
+    old = net.firm.copy()
+    market.rewire()
+    changed = (old != net.firm)
+    assert not changed[~rationed].any()
+    # a link is kept if the new firm is already a trading partner
+    assert changed[rationed].mean() > 0.5
@@ -0,0 +1,24 @@
+import numpy as np
+import abm.lengnick2013.households as households
+
+def test_adjust_reservation_wages():
+
+    # Case #                    0     1     2
+    # employed (T/F)            F     T     T
+    # wage vs reservation wage  -     >     <
+    # OUTPUT:
+    # reservation wage       *0.9   wage  unchanged
+
+    h = households.Households(3)
+    h.employer = np.array([-1, 0, 1])
+    h.w_res = np.array([1.0, 1.0, 2.0])
+    w = np.array([1.5, 1.5])
+
+    h.adjust_reservation_wages(w)
+
+    assert np.allclose(h.w_res, [0.9, 1.5, 2.0])
+
+def test_employment():
+    h = households.Households(5)
+    h.employer = np.array([2, -1, 0, 2, -1])
+    assert np.array_equal(h.employment(4), [1, 0, 2, 0])
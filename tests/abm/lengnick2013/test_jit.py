@@ -0,0 +1,60 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.jit as jit
+
+from helpers import configure_random_state
+
+@pytest.mark.parametrize("dtypes", ["default", "compact"])
+def test_kernel(dtypes):
+    '''
+    Test that the single-pass kernel (run as Python) matches the NumPy
+    updates given the same draws.
+    '''
+    for R in (None, 2):
+        expected = firms.Firms(40, R=R, seed=1, dtypes=dtypes)
+        f = firms.Firms(40, R=R, seed=1, dtypes=dtypes)
+        # with a parameter that differs between firms
+        nu = np.random.default_rng(2).uniform(0.01, 0.05, f.shape)
+        for g in (expected, f):
+            configure_random_state(g, 2)
+            g.set_prop("nu", nu)
+        expected.remove_firms([3, 17])
+        f.remove_firms([3, 17])
+        draws = firms.Firms(40, R=R, seed=1)._draws
+        u = np.empty((3,) + f.shape)
+        for month in range(6):
+            expected.step_month()
+            for k in range(3):
+                u[k] = draws.next()
+            jit.step_month(f, u, compiled=False)
+            for name in f.dtypes:
+                assert np.array_equal(getattr(f, name), getattr(expected, name))
+
+def test_engine():
+    '''
+    Test that the numba engine matches the NumPy updates (if Numba is
+    installed), and that "auto" falls back to NumPy.
+    '''
+    f = firms.Firms(10, engine="auto")
+    assert f.engine == ("numba" if jit.available() else "numpy")
+    with pytest.raises(ValueError):
+        firms.Firms(10, engine="fortran")
+    if not jit.available():
+        with pytest.raises(ImportError):
+            firms.Firms(10, engine="numba")
+        pytest.skip("Numba is not installed")
+
+    for dtypes in ("default", "compact"):
+        expected = firms.Firms(1000, seed=3, dtypes=dtypes)
+        f = firms.Firms(1000, seed=3, dtypes=dtypes, engine="numba", threads=2)
+        nu = np.random.default_rng(4).uniform(0.01, 0.05, f.shape)
+        for g in (expected, f):
+            configure_random_state(g, 4)
+            g.set_prop("nu", nu)
+        for month in range(12):
+            expected.step_month()
+            f.step_month()
+        for name in f.dtypes:
+            assert np.array_equal(getattr(f, name), getattr(expected, name))
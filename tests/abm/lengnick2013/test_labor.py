@@ -0,0 +1,139 @@
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.households as households
+import abm.lengnick2013.labor as labor
+
+def test_search():
+    '''
+    Test that unemployed households only fill open vacancies paying at
+    least their reservation wage, and that no firm hires more households
+    than it has vacancies.
+    '''
+    F = 50
+    H = 400
+    f = firms.Firms(F)
+    h = households.Households(H)
+    market = labor.LaborMarket(f, h, seed=1)
+
+    f.set_prop("w", np.linspace(0.5, 1.5, F))
+    f.set_prop("v", np.arange(F) % 3)
+    f.set_prop("nv", 0)
+    h.w_res = np.full(H, 1.0)
+    old_v = f.v.copy()
+
+    market.search()
+    market.sync()
+
+    hired = np.bincount(h.employer[h.employer >= 0], minlength=F)
+    assert hired.sum() > 0
+    assert np.all(hired <= old_v)
+    assert np.array_equal(f.v, old_v - hired)
+    # only firms paying at least the reservation wage hire
+    assert np.all(hired[f.w < 1.0] == 0)
+    # the workforce matches the employer ids
+    assert np.array_equal(f.l, hired)
+
+def test_switch_to_better_paid_job():
+    '''
+    Test that employed households only move to firms paying more.
+    '''
+    f = firms.Firms(2)
+    h = households.Households(100)
+    market = labor.LaborMarket(f, h, seed=2)
+
+    f.set_prop("w", np.array([1.0, 2.0]))
+    f.set_prop("v", np.array([100, 100]))
+    h.employer[:] = 1
+    h.pi = 1.0
+
+    market.search()
+    assert np.all(h.employer == 1)
+
+    h.employer[:] = 0
+    market.search()
+    assert np.any(h.employer == 1)
+
+def test_layoffs():
+    '''
+    Test that firms lay off employees down to their workforce.
+    '''
+    F = 4
+    f = firms.Firms(F)
+    h = households.Households(20)
+    market = labor.LaborMarket(f, h, seed=3)
+
+    h.employer = np.repeat(np.arange(F), 5)
+    f.set_prop("l", np.array([5, 4, 0, 6]))
+
+    market.layoffs()
+    assert np.array_equal(h.employment(F), [5, 4, 0, 5])
+
+def test_step():
+    '''
+    Test that the workforce stays consistent with the employer ids over a
+    number of months.
+    '''
+    F = 100
+    H = 2000
+    f = firms.Firms(F, seed=4)
+    h = households.Households(H)
+    market = labor.LaborMarket(f, h, seed=4)
+
+    f.set_prop("i", 0) # every firm opens a vacancy
+    for month in range(5):
+        f.step_month()
+        market.step()
+        assert np.array_equal(f.l, np.bincount(h.employer[h.employer >= 0], minlength=F))
+        f.check_invariants()
+    assert f.l.sum() > 0
+
+def test_notice():
+    '''
+    Test that laid off households work for one more month: with notice a
+    firm that fires an employee every month shrinks one month later than
+    without notice.
+    '''
+    def run(notice, T=6):
+        f = firms.Firms(1, seed=1)
+        h = households.Households(10)
+        h.employer = np.zeros(10, dtype=int)
+        market = labor.LaborMarket(f, h, seed=1, notice=notice)
+        market.sync()
+        path = []
+        for month in range(T):
+            # inventory above its upper bound - fire one employee
+            f.set_props({"i": 1000, "d": 1})
+            f.step_month()
+            market.step()
+            assert np.array_equal(f.l, h.employment(1))
+            path.append(int(f.l[0]))
+        return path
+
+    immediate = run(False)
+    assert immediate == [9, 8, 7, 6, 5, 4]
+    assert run(True) == [10] + immediate[:-1]
+
+def test_step_notice():
+    '''
+    Test that the workforce stays consistent with the employer ids over a
+    number of months, with and without notice.
+    '''
+    F = 60
+    H = 1500
+    for notice in (True, False):
+        f = firms.Firms(F, seed=5)
+        h = households.Households(H)
+        h.employer = np.arange(H) % F
+        market = labor.LaborMarket(f, h, seed=5, notice=notice)
+        market.sync()
+        rng = np.random.default_rng(0)
+        employed = []
+        for month in range(12):
+            # some firms fire, others hire
+            f.set_prop("i", rng.uniform(0, 10, F))
+            f.step_month()
+            market.step()
+            assert np.array_equal(f.l, np.bincount(h.employer[h.employer >= 0], minlength=F))
+            employed.append(f.l.sum())
+            f.check_invariants()
+        assert min(employed) < H
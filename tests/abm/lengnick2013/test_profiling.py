@@ -0,0 +1,77 @@
+from abm.lengnick2013 import profiling
+from abm.lengnick2013.economy import Economy
+from abm.lengnick2013.firms import Firms
+from abm.lengnick2013.profiling import Profile
+
+from helpers import configure_random_state
+
+def test_disabled():
+    assert profiling.active() is None
+    f = Firms(200, seed=7)
+    configure_random_state(f, 3)
+    f.step_month()
+    with Profile() as prof:
+        assert profiling.active() is prof
+    assert profiling.active() is None
+    assert prof.times == {} and prof.counts == {}
+
+def test_counts():
+    f = Firms(200, seed=7)
+    configure_random_state(f, 3)
+    below = f.i < f.i_phi_lower * f.d
+    above = f.i > f.i_phi_upper * f.d
+    inc = (f.v > 0) & below
+    dec = (f.nv >= f.gamma) & ~below
+    fired = above & (f.l > 0)
+    with Profile() as prof:
+        f.step_month()
+    assert prof.counts["wages.up"] == inc.sum()
+    assert prof.counts["wages.down"] == dec.sum()
+    assert prof.counts["workforce.vacancies"] == below.sum()
+    assert prof.counts["workforce.fired"] == fired.sum()
+    assert prof.counts["prices.up"] == below.sum()
+    assert prof.counts["prices.down"] == above.sum()
+    assert prof.counts["prices.accepted"] + prof.counts["prices.rejected"] == (below | above).sum()
+    for name in ("firms.step_month", "firms.wages", "firms.workforce", "firms.prices"):
+        assert prof.calls[name] == 1
+        assert prof.times[name] >= 0
+    assert prof.times["firms.step_month"] >= prof.times["firms.prices"]
+
+def test_sliced():
+    # the counts do not depend on how the firms are split
+    counts = []
+    for options in ({}, {"chunk": 64}, {"threads": 3}):
+        f = Firms(200, seed=7, **options)
+        configure_random_state(f, 3)
+        with Profile() as prof:
+            for t in range(3):
+                f.step_month()
+                f.produce()
+        assert prof.calls["firms.step_month"] == 3
+        assert prof.calls["firms.produce"] == 3
+        counts.append(prof.counts)
+    assert counts[0] == counts[1] == counts[2]
+
+def test_economy():
+    economy = Economy.create(20, 200, seed=1)
+    with Profile() as prof:
+        economy.run(3)
+    for name in ("economy.firms", "economy.labor", "economy.goods", "economy.pay", "firms.step_month"):
+        assert prof.calls[name] == 3
+    assert set(prof.to_dict()["phases"]) == set(prof.times)
+    summary = prof.summary()
+    assert "economy.goods" in summary and "prices.accepted" in summary
+
+    prof.reset()
+    assert prof.times == {} and prof.calls == {} and prof.counts == {}
+
+def test_nested():
+    outer, inner = Profile(), Profile()
+    with outer:
+        with inner:
+            with profiling.phase("x"):
+                pass
+        with profiling.phase("y"):
+            pass
+    assert list(inner.times) == ["x"]
+    assert list(outer.times) == ["y"]
@@ -0,0 +1,54 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.recorder as recorder
+
+def test_record(tmp_path):
+    '''
+    Test that the recorded trajectories match copies of the state, with
+    decimation, downcasting and partial blocks.
+    '''
+    f = firms.Firms(10, seed=0)
+    f.set_prop("d", np.linspace(1, 10, 10))
+    T = 10
+    rec = recorder.Recorder(tmp_path, f, T, fields=("p", "w", "l"),
+                            every={"w": 3}, downcast=True, block=4)
+    history = []
+    for t in range(T):
+        f.step_month()
+        f.produce()
+        rec.record(f)
+        history.append({name: getattr(f, name).copy() for name in rec.fields})
+    rec.close()
+
+    # months 0, 1, ..., 9 for p and l - months 0, 3, 6, 9 for w
+    data = recorder.Recorder.load(tmp_path)
+    assert sorted(data) == ["l", "p", "w"]
+    assert data["p"].shape == (10, 10)
+    assert data["p"].dtype == np.float32
+    assert data["l"].dtype == f.dtypes["l"]
+    assert np.array_equal(data["p"], np.array([h["p"] for h in history], dtype=np.float32))
+    assert np.array_equal(data["l"], np.array([h["l"] for h in history]))
+    assert np.array_equal(data["w"], np.array([history[t]["w"] for t in (0, 3, 6, 9)], dtype=np.float32))
+    assert not data["p"].flags.writeable
+
+    with pytest.raises(ValueError):
+        rec.record(f)
+
+def test_replicates(tmp_path):
+    f = firms.Firms(4, R=3, seed=1)
+    with recorder.Recorder(tmp_path, f, 5, fields=["m"], block=2) as rec:
+        for t in range(5):
+            f.set_prop("m", float(t))
+            rec.record(f)
+    m = recorder.Recorder.load(tmp_path, ["m"])["m"]
+    assert m.shape == (5, 3, 4)
+    assert np.array_equal(m[:, 0, 0], np.arange(5.0))
+
+def test_invalid(tmp_path):
+    f = firms.Firms(4)
+    with pytest.raises(ValueError):
+        recorder.Recorder(tmp_path, f, 5, fields=["x"])
+    with pytest.raises(ValueError):
+        recorder.Recorder(tmp_path, f, 5, every=0)
@@ -0,0 +1,70 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.rng as rng
+
+def test_uniform_stream_blocks():
+    '''
+    Test that the draws do not depend on the number of rows generated at a
+    time, with and without replicates.
+    '''
+    F = 10
+
+    for R in (None, 3):
+        expected = rng.UniformStream(F, R, seed=11)
+        draws = [expected.next().copy() for n in range(7)]
+
+        for rows in (2, 3, 7, 8):
+            stream = rng.UniformStream(F, R, seed=11, rows=rows)
+            for n in range(7):
+                u = stream.next()
+                assert u.shape == ((F,) if R is None else (R, F))
+                assert np.array_equal(u, draws[n])
+
+def test_generators():
+    '''
+    Test that a generator can be used in place of a seed.
+    '''
+    a = rng.generators(5)[0]
+    b = rng.generators(np.random.default_rng(5))[0]
+    assert np.array_equal(a.random(4), b.random(4))
+
+    # replicates get independent streams
+    g = rng.generators(5, R=2)
+    assert len(g) == 2
+    assert not np.array_equal(g[0].random(4), g[1].random(4))
+
+def test_peek_skip():
+    '''
+    Test that peeking at draws ahead does not change the stream, and that
+    the peeked draws are the next draws.
+    '''
+    for R, rows in ((None, 1), (None, 4), (2, 3)):
+        expected = rng.UniformStream(10, R, seed=5, rows=rows)
+        stream = rng.UniformStream(10, R, seed=5, rows=rows)
+        stream.next()
+        expected.next()
+        out = np.empty((3,) + ((4,) if R is None else (R, 4)))
+        stream.peek(3, 2, 6, out)
+        draws = [expected.next().copy() for k in range(3)]
+        for k in range(3):
+            assert np.array_equal(out[k], draws[k][..., 2:6])
+        stream.skip(3)
+        assert np.array_equal(stream.next(), expected.next())
+
+def test_not_seekable():
+    '''
+    Test that a stream whose generators can not be advanced draws
+    sequentially, and refuses what needs to advance them.
+    '''
+    stream = rng.UniformStream(10, seed=np.random.Generator(np.random.MT19937(1)), rows=2)
+    assert not stream.seekable()
+    assert rng.UniformStream(10, seed=1).seekable()
+    stream.next()
+    out = np.empty((2, 4))
+    with pytest.raises(ValueError):
+        stream.peek(2, 0, 4, out)
+    with pytest.raises(ValueError):
+        stream.resize(12)
+    with pytest.raises(ValueError):
+        rng.UniformStream(10, seed=np.random.Generator(np.random.MT19937(1)), span=(2, 5))
@@ -0,0 +1,132 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.firms as firms
+import abm.lengnick2013.households as households
+import abm.lengnick2013.economy as economy
+import abm.lengnick2013.rng as rng
+import abm.lengnick2013.shards as shards
+
+from helpers import configure_random_state
+
+def test_span():
+    '''
+    Test that a span of a stream draws the same numbers as the full stream.
+    '''
+    for R in (None, 2):
+        full = rng.UniformStream(10, R, seed=3, rows=2)
+        parts = [rng.UniformStream(10, R, seed=3, rows=3, span=span) for span in ((0, 4), (4, 9), (9, 10))]
+        for month in range(5):
+            expected = full.next().copy()
+            assert np.array_equal(np.concatenate([p.next() for p in parts], axis=-1), expected)
+
+    with pytest.raises(ValueError):
+        rng.UniformStream(10, span=(2, 5))
+
+def test_shard_count():
+    '''
+    Test that the results do not depend on the number of shards, and match
+    unsharded firms, with and without replicates.
+    '''
+    F = 51
+    for R in (None, 2):
+        expected = firms.Firms(F, R=R, seed=7, inplace=True)
+        configure_random_state(expected, 1)
+        for month in range(4):
+            expected.step_month()
+            expected.produce()
+
+        for n in (1, 3):
+            with shards.ShardedFirms(F, n, R=R, seed=7, block=2) as f:
+                configure_random_state(f, 1)
+                for month in range(4):
+                    f.step_month()
+                    f.produce()
+                for name in f.dtypes:
+                    assert np.array_equal(getattr(f, name), getattr(expected, name))
+
+def test_rebinding():
+    '''
+    Test that properties and parameters set between the monthly updates
+    reach the workers.
+    '''
+    F = 20
+    expected = firms.Firms(F, seed=2, inplace=True)
+    with shards.ShardedFirms(F, 2, seed=2) as f:
+        for g in (expected, f):
+            configure_random_state(g, 3)
+            g.step_month()
+            # a new demand array, a per-firm and a shared parameter
+            g.set_props({"d": np.linspace(1, 10, F), "nu": np.linspace(0.01, 0.05, F), "theta": 0.5})
+            g.step_month()
+            g.adjust_wages()
+            g.adjust_workforce()
+            g.adjust_prices()
+            g.set_prop("nu", 0.03)
+            g.step_month()
+        for name in f.dtypes:
+            assert np.array_equal(getattr(f, name), getattr(expected, name))
+
+        # the invariants are checked on all firms before each update
+        f.set_prop("p", -1.0, id=15)
+        with pytest.raises(firms.InvariantError) as error:
+            f.step_month()
+        assert list(error.value.violations["p"]) == [15]
+
+    # the arrays remain readable after the firms are closed
+    assert f.p[15] == -1
+    with pytest.raises(RuntimeError):
+        f.step_month()
+
+def test_remove_firms():
+    '''
+    Test that removed firms stay parked in the workers, and that new firms
+    can only take the slots of removed firms.
+    '''
+    F = 20
+    expected = firms.Firms(F, seed=3, inplace=True)
+    configure_random_state(expected, 2)
+    expected.remove_firms([4, 15])
+    with shards.ShardedFirms(F, 2, seed=3) as f:
+        configure_random_state(f, 2)
+        f.remove_firms([4, 15])
+        for month in range(5):
+            expected.step_month()
+            f.step_month()
+        for name in f.dtypes:
+            assert np.array_equal(getattr(f, name), getattr(expected, name))
+        assert np.all(f.nv[[4, 15]] == 0)
+
+        assert sorted(f.add_firms(2)) == [4, 15]
+        with pytest.raises(ValueError):
+            f.add_firms(1)
+        assert f.F == F
+        f.step_month()
+
+def test_economy():
+    '''
+    Test that an economy runs the same with sharded and unsharded firms.
+    '''
+    def make(f):
+        h = households.Households(100)
+        h.employer = np.arange(100) % 10
+        h.m = np.full(100, 10.0)
+        return economy.Economy(f, h, seed=4)
+
+    expected = make(firms.Firms(10, seed=5, inplace=True)).run(3)
+    with shards.ShardedFirms(10, 2, seed=5) as f:
+        e = make(f).run(3)
+        assert np.array_equal(e.firms.p, expected.firms.p)
+        assert np.array_equal(e.households.m, expected.households.m)
+
+def test_checkpoint(tmp_path):
+    '''
+    Test that an economy of sharded firms is not checkpointed.
+    '''
+    with shards.ShardedFirms(10, 2, seed=5) as f:
+        h = households.Households(50)
+        h.employer = np.arange(50) % 10
+        e = economy.Economy(f, h, seed=4)
+        with pytest.raises(TypeError):
+            e.save(tmp_path / "ckpt.npz")
+    assert not (tmp_path / "ckpt.npz").exists()
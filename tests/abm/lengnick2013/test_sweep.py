@@ -0,0 +1,64 @@
+import pytest
+
+import numpy as np
+import abm.lengnick2013.sweep as sweep
+
+GRID = {"gamma": [12, 24], "nu": [0.01, 0.02]}
+
+def test_points(tmp_path):
+    s = sweep.Sweep(str(tmp_path), GRID, seeds=2, T=3, F=10, H=50, seed=0)
+    assert s.points == [{"gamma": 12, "nu": 0.01}, {"gamma": 12, "nu": 0.02},
+                        {"gamma": 24, "nu": 0.01}, {"gamma": 24, "nu": 0.02}]
+    assert len(s.pending()) == 8
+    assert np.isnan(s.results()["price_index"]).all()
+
+    # a different sweep can not reuse the results
+    with pytest.raises(ValueError):
+        sweep.Sweep(str(tmp_path), GRID, seeds=3, T=3, F=10, H=50, seed=0)
+
+def test_workers(tmp_path):
+    '''
+    Test that the results do not depend on the number of workers.
+    '''
+    results = []
+    for workers in (0, 2):
+        s = sweep.Sweep(str(tmp_path / str(workers)), GRID, seeds=2, T=4, F=10, H=50, seed=1)
+        assert s.run(workers) == 8
+        results.append(s.results())
+    for name in results[0]:
+        assert np.array_equal(results[0][name], results[1][name])
+    assert results[0]["done"].all()
+    assert not np.isnan(results[0]["price_index"]).any()
+    # different seeds give different runs
+    assert not np.array_equal(results[0]["price_index"][0, 0], results[0]["price_index"][0, 1])
+
+def test_resume(tmp_path):
+    '''
+    Test that running a sweep again only runs the runs not completed yet.
+    '''
+    s = sweep.Sweep(str(tmp_path), GRID, seeds=2, T=4, F=10, H=50)
+    s.run(0)
+    expected = s.results()["mean_wage"].copy()
+
+    # forget two runs
+    done = np.load(str(tmp_path / "done.npy"))
+    done[1] = False
+    np.save(str(tmp_path / "done.npy"), done)
+
+    s = sweep.Sweep(str(tmp_path), GRID, seeds=2, T=4, F=10, H=50)
+    assert s.pending() == [(1, 0), (1, 1)]
+    assert s.run(0) == 2
+    assert s.run(0) == 0
+    assert np.array_equal(s.results()["mean_wage"], expected)
+
+def test_resume_options(tmp_path):
+    '''
+    Test that a sweep whose options change type in JSON can be resumed.
+    '''
+    options = {"chunk": np.int64(4), "liquidity": np.float64(5.0)}
+    s = sweep.Sweep(str(tmp_path), GRID, seeds=1, T=2, F=10, H=50, seed=1, **options)
+    s.run(0)
+    s = sweep.Sweep(str(tmp_path), GRID, seeds=1, T=2, F=10, H=50, seed=1, **options)
+    assert s.pending() == []
+    with pytest.raises(ValueError):
+        sweep.Sweep(str(tmp_path), GRID, seeds=1, T=2, F=10, H=50, seed=1, chunk=8)